@@ -0,0 +1,198 @@
+"""
+    test the ASGI adapter
+"""
+
+import asyncio
+import threading
+import unittest
+
+import zoom
+from zoom.asgi import ASGIApplication
+from zoom.response import JSONResponse, PollResponse, TextResponse
+
+
+INSTANCE = zoom.tools.zoompath('zoom', '_assets', 'web')
+
+
+def echo(request, *rest):
+    return TextResponse(
+        '%s %s %s' % (request.method, request.path, request.body.read().decode('utf8'))
+    )
+
+
+def form(request, *rest):
+    return JSONResponse(request.data, indent=None)
+
+
+def stream(request, *rest):
+    return JSONResponse((n for n in range(5)), indent=None, stream=True)
+
+
+def call(app, path, method='GET', chunks=(), headers=()):
+    """run a request through app, returning what was sent"""
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': True}
+        for chunk in chunks
+    ] + [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    received = []
+    sent = []
+
+    async def receive():
+        message = messages.pop(0)
+        received.append(message)
+        return message
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'host', b'localhost')] + list(headers),
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 1234),
+    }
+    asyncio.run(app(scope, receive, send))
+    return sent, received
+
+
+def body_of(sent):
+    return b''.join(m.get('body', b'') for m in sent[1:])
+
+
+class TestASGI(unittest.TestCase):
+
+    def test_get(self):
+        app = ASGIApplication(INSTANCE, handlers=(echo,))
+        sent, _ = call(app, '/hello')
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-length', b'11'), sent[0]['headers'])
+        self.assertEqual(body_of(sent), b'GET /hello ')
+
+    def test_streamed_request_body(self):
+        app = ASGIApplication(INSTANCE, handlers=(echo,))
+        sent, received = call(app, '/', 'POST', [b'one ', b'two ', b'three'])
+        self.assertEqual(body_of(sent), b'POST / one two three')
+        self.assertEqual(len(received), 4)
+
+    def test_form_body(self):
+        app = ASGIApplication(INSTANCE, handlers=(form,))
+        sent, _ = call(
+            app, '/', 'POST', [b'name=joe&', b'age=40'],
+            headers=[
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', b'15'),
+            ]
+        )
+        self.assertEqual(zoom.jsonz.loads(body_of(sent)), {'name': 'joe', 'age': '40'})
+
+    def test_streamed_response(self):
+        app = ASGIApplication(INSTANCE, handlers=(stream,))
+        sent, _ = call(app, '/')
+        headers = dict(sent[0]['headers'])
+        self.assertNotIn(b'content-length', headers)
+        self.assertEqual(zoom.jsonz.loads(body_of(sent)), [0, 1, 2, 3, 4])
+        self.assertFalse(sent[-1].get('more_body', False))
+
+    def test_poll(self):
+        values = iter([None, None, 'hey'])
+        threads = set()
+
+        def poll():
+            threads.add(threading.current_thread().name)
+            return next(values)
+
+        def poller(request, *rest):
+            return PollResponse(poll, delay=0.01)
+
+        app = ASGIApplication(INSTANCE, handlers=(poller,), workers=1)
+        sent, _ = call(app, '/')
+        self.assertEqual(body_of(sent), b'"hey"')
+        self.assertTrue(all(name.startswith('zoom') for name in threads))
+
+    def test_backpressure(self):
+        release = threading.Event()
+
+        def slow(request, *rest):
+            release.wait(5)
+            return TextResponse('done')
+
+        app = ASGIApplication(
+            INSTANCE, handlers=(slow,), workers=1, queue_timeout=0.1
+        )
+
+        async def both():
+            results = []
+
+            def caller():
+                sent = []
+
+                async def receive():
+                    return {'type': 'http.request', 'body': b''}
+
+                async def send(message):
+                    sent.append(message)
+
+                scope = {
+                    'type': 'http', 'method': 'GET', 'path': '/',
+                    'headers': [(b'host', b'localhost')],
+                }
+                results.append(sent)
+                return app(scope, receive, send)
+
+            first = asyncio.ensure_future(caller())
+            await asyncio.sleep(0.05)
+            await caller()
+            release.set()
+            await first
+            return results
+
+        first, second = asyncio.run(both())
+        self.assertEqual(first[0]['status'], 200)
+        self.assertEqual(second[0]['status'], 503)
+
+    def test_streamed_body_leaves_slot_free(self):
+        handled = threading.Event()
+        waited = []
+
+        def numbers():
+            yield 1
+            waited.append(handled.wait(2))
+            yield 2
+
+        def router(request, *rest):
+            if request.path == '/stream':
+                return JSONResponse(numbers(), indent=None, stream=True)
+            handled.set()
+            return TextResponse('done')
+
+        app = ASGIApplication(INSTANCE, handlers=(router,), workers=1)
+
+        async def request(path):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': path,
+                'headers': [(b'host', b'localhost')],
+            }
+            await app(scope, receive, send)
+            return sent
+
+        async def both():
+            streamed = asyncio.ensure_future(request('/stream'))
+            await asyncio.sleep(0.2)
+            other = await request('/other')
+            return await streamed, other
+
+        streamed, other = asyncio.run(both())
+        self.assertEqual(waited, [True])
+        self.assertEqual(zoom.jsonz.loads(body_of(streamed)), [1, 2])
+        self.assertEqual(body_of(other), b'done')
@@ -4,12 +4,18 @@
 
 import io
 import sys
+import tempfile
+import threading
+import time
 import unittest
 import logging
 import pytest
 
 import zoom
-from zoom.background import BackgroundJobResult, purge_old_job_results
+from zoom.background import (
+    BackgroundJob, BackgroundJobResult, JobPool, JobResults, Scheduler,
+    purge_old_job_results, DEFAULT_JOB_TIMEOUT,
+)
 
 
 class TestBackground(unittest.TestCase):
@@ -88,6 +94,71 @@ class TestBackground(unittest.TestCase):
         site.run_background_jobs()
         self.assertEqual(sorted(sys.modules), sorted(modules_before))
 
+    def test_scheduler_loads_jobs_once(self):
+        instance = zoom.instances.Instance()
+        scheduler = Scheduler(instance)
+        self.assertTrue(scheduler.stale)
+        scheduler.load()
+        self.assertFalse(scheduler.stale)
+        names = [job.qualified_name for job in scheduler.jobs]
+        self.assertIn('localhost/sample:tick', names)
+        self.assertLessEqual(scheduler.wait_time(), scheduler.delay)
+
+    def test_job_executor_options(self):
+        def uow():
+            return 1
+        job = BackgroundJob(uow, 'uow', '* * * * *')
+        self.assertEqual(job.executor, 'process')
+        self.assertEqual(job.timeout, DEFAULT_JOB_TIMEOUT)
+        job = BackgroundJob(uow, 'uow', None, executor='thread', timeout=5)
+        self.assertEqual(job.executor, 'thread')
+        self.assertEqual(job.timeout, 5)
+        with self.assertRaises(ValueError):
+            BackgroundJob(uow, 'uow', None, executor='fiber')
+
+    def test_timed_out_thread_keeps_lease(self):
+        finish = threading.Event()
+
+        def stuck():
+            finish.wait(10)
+
+        site = zoom.system.site
+        job = BackgroundJob(stuck, 'stuck', None, executor='thread', timeout=0.1)
+        job.app = zoom.utils.Bunch(site=site, name='test', path=tempfile.mkdtemp())
+        job.load()
+        job.release()
+
+        pool = JobPool()
+        pool.submit(job)
+        pool.start()
+        time.sleep(0.2)
+        self.assertEqual(pool.poll(), [job])
+        self.assertEqual(job.last_run_status, 'timeout')
+        self.assertEqual(len(pool.stragglers), 1)
+        self.assertFalse(job.acquire())
+
+        finish.set()
+        pool.stragglers[0].task.join()
+        pool.poll()
+        self.assertEqual(pool.stragglers, [])
+        self.assertTrue(job.acquire())
+        job.release()
+
+    def test_job_results_table_checked_once(self):
+        db = zoom.database.setup_test()
+        JobResults(db).zap()
+        get_tables = db.get_tables
+        calls = []
+
+        def counted():
+            calls.append(1)
+            return get_tables()
+
+        db.get_tables = counted
+        for _ in range(3):
+            JobResults(db).zap()
+        self.assertEqual(calls, [])
+
     @pytest.mark.skip
     def test_import_submodules(self):
         site = zoom.sites.Site()
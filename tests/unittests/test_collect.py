@@ -296,6 +296,36 @@ class TestCollect(unittest.TestCase):
         content = self.collect(all='y').content
         assert '52 people shown of 52 people' in content
 
+    def test_index_pages(self):
+        self.collection.store.zap()
+        self.assertIsNone(self.collection.page_size)
+        self.collection.page_size = 10
+        names = ['Person %02d' % n for n in range(25, 0, -1)]
+        for name in names:
+            self.collect('new', **dict(
+                create_button='y',
+                name=name,
+                address='123 Somewhere St',
+                salary=Decimal('40000'),
+            ))
+
+        self.assertEqual(
+            self.collection.ordered_keys(),
+            [r._id for r in sorted(self.collection.store, key=self.collection.order)]
+        )
+        self.assertEqual(
+            self.collection.ordered_keys(5, 3),
+            self.collection.ordered_keys()[5:8]
+        )
+
+        content = self.collect(all='1').content
+        assert '10 people shown of 25 people' in content
+        assert 'Person 01' in content and 'Person 11' not in content
+
+        content = self.collect(all='1', page='3').content
+        assert '5 people shown of 25 people' in content
+        assert 'Person 21' in content and 'Person 20' not in content
+
     def test_basic_search(self):
         self.collection.store.zap()
         self.assert_response(VIEW_EMPTY_LIST)
@@ -323,6 +353,53 @@ class TestCollect(unittest.TestCase):
         assert '0 people found in search of 6 people' in content
 
 
+    def test_basic_search_index(self):
+        self.collection.store.zap()
+        self.collect('new', **dict(
+            create_button='y',
+            name='Joe Zzzzz',
+            address='123 Somewhere St',
+            salary=Decimal('40000'),
+        ))
+        engine = self.collection.search_engine(self.collection)
+        index = engine.index()
+        self.assertIs(engine.index(), index)
+        self.assertEqual([r.name for r in engine.search('zzz some')], ['Joe Zzzzz'])
+
+        # changes made through the collection update the index in place
+        self.collect('new', **dict(
+            create_button='y',
+            name='Sally Zzzzz',
+            address='123 Special St',
+            salary=Decimal('40000'),
+        ))
+        self.assertIs(engine.index(), index)
+        self.assertEqual(len(engine.search('zzzzz')), 2)
+
+        # changes signalled by another process cause a rebuild
+        zoom.collect.search_changed(self.collection.store)
+        self.assertIsNot(engine.index(), index)
+        self.assertEqual(len(engine.search('zzzzz')), 2)
+
+    def test_basic_search_unindexed_saves(self):
+        store = self.collection.store
+        store.zap()
+        self.db(
+            'delete from attributes where kind=%s',
+            zoom.collect.SEARCH_VERSION_KIND
+        )
+        zoom.collect._local_search_indexes.clear()
+        self.collect('new', **dict(
+            create_button='y',
+            name='Joe Zzzzz',
+            address='123 Somewhere St',
+            salary=Decimal('40000'),
+        ))
+        self.assertEqual(zoom.collect.get_search_version(store)[1], None)
+        engine = self.collection.search_engine(self.collection)
+        self.assertEqual(len(engine.search('zzzzz')), 1)
+        self.assertIsNotNone(zoom.collect.get_search_version(store)[1])
+
     def test_indexed_search(self):
         self.collection.store.zap()
         self.assert_response(VIEW_EMPTY_LIST)
@@ -363,6 +440,108 @@ class TestCollect(unittest.TestCase):
         content = self.collect(q='Zzzz').content
         assert '0 people found in search of 5 people' in content
 
+    def test_indexed_search_ranking_and_resume(self):
+        self.collection.store.zap()
+        self.collection.search_engine = zoom.collect.IndexedCollectionSearch
+        for name in ['Ann Smithers', 'Bob Smith', 'Smith Smithson']:
+            self.collect('new', **dict(
+                create_button='y',
+                name=name,
+                address='1 Main St',
+                salary=Decimal('40000'),
+            ))
+        engine = self.collection.search_engine(self.collection)
+
+        # prefix and infix matches, most occurrences first
+        keys, total = engine.find('smith')
+        self.assertEqual(total, 3)
+        self.assertEqual(engine.search('smith')[0].name, 'Smith Smithson')
+        self.assertEqual([r.name for r in engine.search('thers')], ['Ann Smithers'])
+        self.assertEqual(engine.find('smith', offset=1, limit=1)[0], keys[1:2])
+
+        # reindex in steps, picking up where it left off
+        engine.zap()
+        engine.batch_size = 1
+        self.assertFalse(engine.reindex(limit=2))
+        self.assertEqual(engine.find('smith')[1], 2)
+        self.assertTrue(engine.reindex())
+        self.assertEqual(engine.find('smith')[1], 3)
+        self.assertTrue(engine.reindex())
+        self.assertEqual(engine.find('smith')[1], 3)
+
+    def test_token_index_cleanup(self):
+        index = zoom.collect.TokenIndex(self.db, 'test_tokens')
+        index.zap()
+        trigram_count = 'select count(*) from search_trigrams where kind=%s'
+
+        index.insert([(1, ['alpha beta']), (2, ['beta gamma'])])
+        before = self.db(trigram_count, 'test_tokens').first()[0]
+        index.replace([(1, ['beta'])])
+        self.assertLess(self.db(trigram_count, 'test_tokens').first()[0], before)
+        self.assertEqual(index.find('lph'), ([], 0))
+        self.assertEqual(index.find('eta')[1], 2)
+        index.delete([1, 2])
+        self.assertEqual(self.db(trigram_count, 'test_tokens').first()[0], 0)
+
+        # short terms match many tokens without listing them
+        index.chunk_size = 10
+        index.insert([(n, ['x%04d' % n]) for n in range(1, 1500)])
+        self.assertEqual(index.find('x', offset=5, limit=3), ([6, 7, 8], 1499))
+        index.delete(list(range(1, 1500)))
+        self.assertEqual(index.keys(), set())
+
+    def test_indexed_search_queued_updates(self):
+        self.collection.store.zap()
+        self.collection.search_engine = zoom.collect.IndexedCollectionSearch
+        engine = self.collection.search_engine(self.collection)
+        engine.zap()
+
+        self.collect('new', **dict(
+            create_button='y',
+            name='Joe Zzzzz',
+            address='123 Somewhere St',
+            salary=Decimal('40000'),
+        ))
+        self.assertEqual(engine.pending(), 1)
+        self.assertEqual(engine.tokens.find('zzzzz'), ([], 0))
+
+        self.assertEqual(zoom.collect.update_search_indexes(self.db), 1)
+        self.assertEqual(engine.staleness()[0], 0)
+        self.assertEqual(len(engine.tokens.find('zzzzz')[0]), 1)
+
+        # searches apply pending updates before looking up tokens
+        self.collect('delete', 'joe-zzzzz', **{'confirm': 'no'})
+        self.assertEqual(engine.search('zzzzz'), [])
+        self.assertFalse(engine.stale)
+
+        # drift between the index and the store is repaired
+        self.collect('new', **dict(
+            create_button='y',
+            name='Sally Zzzzz',
+            address='123 Special St',
+            salary=Decimal('40000'),
+        ))
+        engine.topic.clear()
+        engine.tokens.insert([(9999, ['ghost'])])
+        self.assertEqual(engine.check(), 2)
+        self.assertEqual([r.name for r in engine.search('zzzzz')], ['Sally Zzzzz'])
+        self.assertEqual(engine.search('ghost'), [])
+
+        # the background check removes tokens of deleted records
+        engine.tokens.insert([(9998, ['phantom'])])
+        self.assertEqual(zoom.collect.check_search_indexes(self.db), 1)
+        self.assertEqual(engine.tokens.find('phantom'), ([], 0))
+
+        # searches only catch up on a few queued updates
+        engine.catch_up_limit = 1
+        for key in (9996, 9997):
+            engine.update(key, ['queued'])
+        engine.find('queued')
+        self.assertTrue(engine.stale)
+        self.assertEqual(engine.pending(), 1)
+        engine.apply_pending()
+        engine.tokens.delete([9996, 9997])
+
     def test_insert(self):
         self.collection.store.zap()
         self.assert_response(VIEW_EMPTY_LIST)
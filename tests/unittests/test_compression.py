@@ -0,0 +1,64 @@
+"""
+    test response compression
+"""
+
+import gzip
+import unittest
+import zlib
+from http.cookies import SimpleCookie
+
+from zoom.compression import (
+    available_codings, compress_chunks, compress_response, handler
+)
+from zoom.response import HTMLResponse, JSONResponse, PNGResponse
+from zoom.utils import Bunch
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_streamed(self):
+        response = JSONResponse(list(range(100000)), stream=True)
+        response.cookie = SimpleCookie()
+        response.cookie['token'] = 'yes'
+        status, headers, doc = compress_response(response, 'gzip').as_wsgi()
+        headers = dict(headers)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertNotIn('Content-length', headers)
+        self.assertIn('Set-Cookie', headers)
+        chunks = list(doc)
+        self.assertGreater(len(chunks), 1)
+        expected = JSONResponse(list(range(100000))).as_wsgi()[2]
+        self.assertEqual(gzip.decompress(b''.join(chunks)), expected)
+
+    def test_chunks_flushed(self):
+        decompressors = dict(gzip=lambda: zlib.decompressobj(31).decompress)
+        if 'br' in available_codings():
+            import brotli
+            decompressors['br'] = lambda: brotli.Decompressor().process
+        for coding, decompressor in decompressors.items():
+            chunks = compress_chunks(iter([b'one', b'two']), coding, 6)
+            decompress = decompressor()
+            self.assertEqual(decompress(next(chunks)), b'one')
+            self.assertEqual(decompress(next(chunks)), b'two')
+
+    def test_skips_compressed_media(self):
+        response = PNGResponse(b'x' * 5000)
+        self.assertIs(compress_response(response, 'gzip, br'), response)
+        self.assertNotIn('Vary', response.headers)
+
+    def test_not_accepted(self):
+        response = HTMLResponse('x' * 5000)
+        request = Bunch(env={}, site=None)
+        status, headers, doc = handler(request, lambda request: response).as_wsgi()
+        self.assertEqual(doc, b'x' * 5000)
+        self.assertEqual(dict(headers)['Vary'], 'Accept-Encoding')
+
+    def test_site_settings(self):
+        site = Bunch(compression=dict(enabled=True, min_size=10000))
+        request = Bunch(env={'HTTP_ACCEPT_ENCODING': 'gzip'}, site=site)
+        response = handler(request, lambda request: HTMLResponse('x' * 5000))
+        self.assertNotIn('Content-Encoding', response.headers)
+        site.compression['enabled'] = False
+        response = handler(request, lambda request: HTMLResponse('x' * 20000))
+        self.assertNotIn('Vary', response.headers)
@@ -178,6 +178,18 @@ class DatabaseTests(object):
         value = db('select * from dzdb_test_table limit 1').value
         self.assertEqual(value, '1234')
 
+    def test_stream(self):
+        db = self.db
+        db("""create table dzdb_test_table (ID CHAR(10), AMOUNT
+           NUMERIC(10,2), NOTES TEXT)""")
+        db.execute_many(
+            'insert into dzdb_test_table values (%s, %s, %s)',
+            [(str(n), n, 'notes %s' % n) for n in range(2500)]
+        )
+        result = db.stream('select ID from dzdb_test_table order by AMOUNT')
+        self.assertEqual(len(list(result)), 2500)
+        self.assertEqual(db('select count(*) from dzdb_test_table').value, 2500)
+
     def test_map(self):
 
         class Greeting(zoom.Record):
@@ -649,6 +661,18 @@ class TestMySQLDatabase(unittest.TestCase, DatabaseTests):
         from pymysql.err import OperationalError
         self.assertRaises(OperationalError, lambda: connect_custom_port(3307))
 
+    def test_stream_unbuffered(self):
+        import pymysql.cursors
+        result = self.db.stream('select id from test_table order by id')
+        self.assertIsInstance(result.cursor, pymysql.cursors.SSCursor)
+        connection = result.cursor.connection
+        self.assertIsNot(connection, self.db.cursor().connection)
+        rows = iter(result)
+        self.assertEqual(next(rows), ('1',))
+        self.assertEqual(self.db('select count(*) from test_table').value, 3)
+        self.assertEqual(list(rows), [('2',), ('3',)])
+        self.assertFalse(connection.open)
+
     def test_get_column_names(self):
         db = self.db
         db('create table dzdb_test_table (ID CHAR(10), AMOUNT NUMERIC(10,2), DTADD date, NOTES TEXT)')
@@ -6,9 +6,13 @@
 
 import unittest
 import datetime
+import math
 from decimal import Decimal
 
-from zoom.jsonz import loads, dumps
+import json
+
+import zoom.jsonz
+from zoom.jsonz import loads, dumps, iterencode
 
 class TestConvert(unittest.TestCase):
 
@@ -72,3 +76,42 @@ class TestConvert(unittest.TestCase):
     def test_error(self):
         d = [Decimal('22.32'), self]
         self.assertRaises(TypeError, dumps, d)
+
+    def test_codecs_agree(self):
+        d = [
+            datetime.datetime(2020, 1, 1, 2, 2, 2, 3),
+            datetime.date(2020, 1, 1),
+            Decimal('22.32'),
+            b'123',
+            dict(name='caf\xe9', amount=Decimal('1.5'), n=2 ** 70),
+        ]
+        text = dumps(d)
+        self.assertTrue(text.isascii())
+        self.assertEqual(loads(text), d)
+        self.assertEqual(
+            json.loads(text, object_hook=zoom.jsonz.dhandler),
+            d
+        )
+
+    def test_same_text_as_json(self):
+        d = dict(a=1, b=[1.5, None, 'x'], c=dict(d=True))
+        self.assertEqual(dumps(d), json.dumps(d))
+        self.assertEqual(dumps(d, sort_keys=True), json.dumps(d, sort_keys=True))
+        compact = dict(separators=(',', ':'))
+        self.assertEqual(dumps(d, **compact), json.dumps(d, **compact))
+
+    def test_non_finite_floats(self):
+        for value in (float('inf'), float('-inf')):
+            self.assertEqual(loads(dumps(value)), value)
+            self.assertEqual(loads(dumps([value], separators=(',', ':'))), [value])
+        self.assertTrue(math.isnan(loads(dumps(float('nan')))))
+
+    def test_iterencode(self):
+        rows = ([n, Decimal(n)] for n in range(2500))
+        chunks = list(iterencode(rows, batch_size=100))
+        self.assertTrue(all(isinstance(c, bytes) for c in chunks))
+        self.assertEqual(
+            loads(b''.join(chunks)),
+            [[n, Decimal(n)] for n in range(2500)]
+        )
+        self.assertEqual(b''.join(iterencode([])), b'[]')
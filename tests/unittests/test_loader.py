@@ -0,0 +1,85 @@
+"""
+    test the app module loader
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+import zoom
+from zoom.context import captured_stdout
+from zoom.database import Database
+from zoom.loader import app_context, load_module, resolve
+
+
+APPS = zoom.tools.zoompath('tests', 'unittests', 'apps')
+
+
+class TestLoader(unittest.TestCase):
+
+    def test_same_named_modules(self):
+        model1 = load_module('model', os.path.join(APPS, 'test1', 'model.py'))
+        model2 = load_module('model', os.path.join(APPS, 'test2', 'model.py'))
+        self.assertEqual(model1.app(), 'Testing test1 module import: text for test1')
+        self.assertEqual(model2.app(), 'Testing test2 module import: text for test2')
+        self.assertNotIn('model', sys.modules)
+        self.assertNotIn('module1', sys.modules)
+
+    def test_resolve(self):
+        path = os.path.join(APPS, 'test1')
+        with app_context(path):
+            self.assertEqual(resolve('model.py'), os.path.join(path, 'model.py'))
+            self.assertEqual(resolve('/tmp/x'), '/tmp/x')
+        self.assertEqual(resolve('model.py'), 'model.py')
+
+    def test_keep_loaded_modules(self):
+        pathname = os.path.join(APPS, 'test1', 'model.py')
+        self.assertIsNot(
+            load_module('model', pathname), load_module('model', pathname)
+        )
+        zoom.loader.reload_modules = False
+        try:
+            self.assertIs(
+                load_module('model', pathname), load_module('model', pathname)
+            )
+        finally:
+            zoom.loader.reload_modules = True
+
+    def test_concurrent_apps(self):
+        cwd = os.getcwd()
+        path = list(sys.path)
+        errors = []
+        expected = {
+            'test1': 'Testing test1 module import: text for test1',
+            'test2': 'Testing test2 module import: text for test2',
+        }
+
+        def hit(n):
+            name = 'test%s' % (n % 2 + 1)
+            app_path = os.path.join(APPS, name)
+            try:
+                for i in range(20):
+                    with captured_stdout() as output, app_context(app_path):
+                        zoom.system.database_debug = bool(n % 2)
+                        model = load_module('model', resolve('model.py'))
+                        print(name, i)
+                        result = model.app()
+                        if result != expected[name]:
+                            errors.append((name, result))
+                        if output.getvalue() != '%s %s\n' % (name, i):
+                            errors.append((name, output.getvalue()))
+                        if Database(None).debug != bool(n % 2):
+                            errors.append((name, 'debug'))
+            except Exception as error:  # pragma: no cover
+                errors.append((name, error))
+
+        threads = [threading.Thread(target=hit, args=(n,)) for n in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(sys.path, path)
@@ -13,7 +13,12 @@ from zoom.sites import Site
 from zoom.session import Session
 from zoom.middleware import (
     check_csrf,
-    display_errors
+    classify,
+    compile_handlers,
+    display_errors,
+    handle,
+    record_layer_times,
+    serve_fast_routes,
 )
 
 logger = logging.getLogger(__name__)
@@ -62,8 +67,12 @@ def throw(request):
 def forbid(request):
     raise zoom.exceptions.UnauthorizedException('forbidden!')
 
+def malformed(request):
+    raise zoom.exceptions.BadRequestException('malformed!')
+
 server_error = '500 Internal Server Error'
 forbidden = '403 Forbidden'
+bad_request = '400 Bad Request'
 
 class TestDisplayError(unittest.TestCase):
 
@@ -103,6 +112,12 @@ class TestDisplayError(unittest.TestCase):
         self.assertEqual(response.status, forbidden)
         self.assertTrue(isinstance(response, zoom.response.HTMLResponse))
 
+    def test_bad_request(self):
+        zoom.system.user.is_admin = False
+        response = display_errors(self.request, malformed)
+        self.assertEqual(response.status, bad_request)
+        self.assertTrue(isinstance(response, zoom.response.HTMLResponse))
+
     def test_error_status_500_json(self):
         zoom.system.user.is_admin = True
         self.request.env = dict(HTTP_ACCEPT='application/json') # mock
@@ -114,3 +129,98 @@ class TestDisplayError(unittest.TestCase):
             "status": "500 Internal Server Error"
             }
         )
+
+
+class TestFastRoutes(unittest.TestCase):
+    """test the static and health check fast path"""
+
+    def setUp(self):
+        self.site_handler = zoom.sites.handler
+        self.site_loads = []
+
+        def site_handler(request, *rest):
+            self.site_loads.append(request.path)
+            return self.site_handler(request, *rest)
+
+        zoom.sites.handler = site_handler
+
+    def tearDown(self):
+        zoom.sites.handler = self.site_handler
+
+    def test_classify(self):
+        self.assertEqual(classify('/static/zoom/zoom.js'), 'static')
+        self.assertEqual(classify('/themes/default/css/style.css'), 'theme')
+        self.assertEqual(classify('/ping/'), 'health')
+        self.assertEqual(classify('/pinger'), 'app')
+        self.assertEqual(classify('/'), 'app')
+
+    def test_health_check_skips_site(self):
+        request = zoom.request.build('http://localhost/ping')
+        response = handle(request)
+        self.assertEqual(response.status, '200 OK')
+        self.assertEqual(zoom.jsonz.loads(response.content), dict(status='OK'))
+        self.assertEqual(self.site_loads, [])
+
+    def test_health_check_missing_site(self):
+        request = zoom.request.build('http://localhost/ping')
+        request.site_path = '/nonexistent/site'
+        response = serve_fast_routes(request, noop)
+        self.assertEqual(response.status, '404 Not Found')
+
+    def test_static_skips_site(self):
+        request = zoom.request.build('http://localhost/static/zoom/zoom.js')
+        response = handle(request)
+        self.assertIsInstance(response, zoom.response.JavascriptResponse)
+        self.assertEqual(self.site_loads, [])
+
+    def test_theme_asset_skips_site(self):
+        url = 'http://localhost/themes/default/css/style.css'
+        request = zoom.request.build(url)
+        response = handle(request)
+        self.assertIsInstance(response, zoom.response.CSSResponse)
+        self.assertEqual(self.site_loads, [])
+        self.assertFalse(hasattr(request.site, 'db'))
+
+
+class TestCompiledChain(unittest.TestCase):
+    """test the compiled middleware chain"""
+
+    def test_legacy_handlers(self):
+        calls = []
+
+        def outer(request, handler, *rest):
+            calls.append('outer')
+            return handler(request, *rest)
+
+        def inner(request, next_handler, *rest):
+            calls.append('inner')
+            return next_handler(request, *rest).upper()
+
+        def app(request):
+            calls.append('app')
+            return request.path
+
+        chain = compile_handlers([outer, inner, app])
+        request = zoom.utils.Bunch(path='/home')
+        self.assertEqual(chain(request), '/HOME')
+        self.assertEqual(chain(request), '/HOME')
+        self.assertEqual(calls, ['outer', 'inner', 'app'] * 2)
+
+    def test_validation(self):
+        self.assertRaises(ValueError, compile_handlers, [])
+        self.assertRaises(TypeError, compile_handlers, [None, noop])
+        self.assertRaises(TypeError, compile_handlers, [lambda request: 1, noop])
+        self.assertRaises(TypeError, compile_handlers, [check_csrf, lambda: 1])
+
+    def test_timing_hooks(self):
+        request = zoom.request.build('http://localhost/static/zoom/zoom.js')
+        zoom.middleware.layer_hooks.append(record_layer_times)
+        try:
+            handle(request)
+        finally:
+            zoom.middleware.layer_hooks.remove(record_layer_times)
+        names = [name for name, _ in request.layer_times]
+        self.assertEqual(names[0], 'zoom.middleware.serve_fast_routes')
+        self.assertEqual(names[-1], 'zoom.middleware.trap_errors')
+        times = [elapsed for _, elapsed in request.layer_times]
+        self.assertEqual(times, sorted(times))
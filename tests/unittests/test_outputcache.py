@@ -0,0 +1,153 @@
+"""
+    test the output cache
+"""
+
+import os
+import tempfile
+import unittest
+
+import zoom
+from zoom.database import setup_test
+from zoom.outputcache import (
+    DiskBackend, cached_output, clear, depends_on, handler, invalidate
+)
+from zoom.profiler import SystemTimer
+from zoom.response import HTMLResponse
+from zoom.store import EntityStore
+from zoom.utils import Bunch
+
+
+class Article(zoom.store.Entity):
+    pass
+
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = dict(pages=True, page_ttl=60, backend='memory')
+        self.site = Bunch(name='localhost', theme='default', output_cache=self.settings)
+        self.renders = []
+        self.content = '<h1>Welcome</h1>'
+        clear()
+
+    def tearDown(self):
+        zoom.system.request = zoom.system.site = None
+        clear()
+
+    def request(self, path='/about', method='GET', authenticated=False):
+        request = Bunch(
+            method=method,
+            path=path,
+            query='',
+            site=self.site,
+            user=Bunch(is_authenticated=authenticated),
+            session=Bunch(csrf_token='token1234'),
+            profiler=SystemTimer(),
+        )
+        zoom.system.request = request
+        zoom.system.site = self.site
+        return request
+
+    def app(self, request, *rest):
+        self.renders.append(request.path)
+        return HTMLResponse(self.content)
+
+    def get(self, *args, **kwargs):
+        status, headers, doc = handler(self.request(*args, **kwargs), self.app).as_wsgi()
+        return doc
+
+    def test_anonymous_pages(self):
+        self.assertEqual(self.get(), b'<h1>Welcome</h1>')
+        self.assertEqual(self.get(), b'<h1>Welcome</h1>')
+        self.assertEqual(self.get('/contact'), b'<h1>Welcome</h1>')
+        self.assertEqual(self.renders, ['/about', '/contact'])
+
+        self.get(method='POST')
+        self.get(authenticated=True)
+        self.assertEqual(len(self.renders), 4)
+
+    def test_disabled(self):
+        self.settings['pages'] = False
+        self.get()
+        self.get()
+        self.assertEqual(len(self.renders), 2)
+
+    def test_session_content_not_cached(self):
+        self.content = '<form><input name="csrf_token" value="token1234"></form>'
+        self.get()
+        self.get()
+        self.assertEqual(len(self.renders), 2)
+
+    def test_disk_backend(self):
+        self.settings.update(backend='disk', path=tempfile.mkdtemp())
+        self.get()
+        self.assertEqual(self.get(), b'<h1>Welcome</h1>')
+        self.assertEqual(len(self.renders), 1)
+
+    def test_disk_backend_sweep(self):
+        path = tempfile.mkdtemp()
+        cache = DiskBackend(path, max_entries=10, sweep_interval=3)
+        cache.set('old', 'stale', -1)
+        cache.set('a', 1, 60)
+        self.assertEqual(len(os.listdir(path)), 3)
+        cache.set('b', 2, 60)
+        names = [os.path.basename(cache.entry_file(key)) for key in 'ab']
+        self.assertEqual(sorted(os.listdir(path)), sorted(names + ['tags']))
+
+    def test_store_invalidation(self):
+        db = setup_test()
+        articles = EntityStore(db, Article)
+
+        @cached_output(tags=['article'])
+        def headlines():
+            return ', '.join(a.title for a in articles)
+
+        def app(request, *rest):
+            self.renders.append(request.path)
+            return HTMLResponse(headlines())
+
+        articles.put(Article(title='First'))
+        self.assertEqual(handler(self.request(), app).content, 'First')
+        self.assertEqual(handler(self.request(), app).content, b'First')
+        self.assertEqual(len(self.renders), 1)
+
+        articles.put(Article(title='Second'))
+        self.assertEqual(handler(self.request(), app).content, 'First, Second')
+        self.assertEqual(len(self.renders), 2)
+
+    def test_disk_invalidation_from_another_process(self):
+        path = tempfile.mkdtemp()
+        self.settings.update(backend='disk', path=path)
+
+        def app(request, *rest):
+            self.renders.append(request.path)
+            depends_on('article')
+            return HTMLResponse(self.content)
+
+        handler(self.request(), app)
+        handler(self.request(), app)
+        self.assertEqual(len(self.renders), 1)
+
+        # a process that has not cached anything yet changes the store
+        zoom.outputcache._backends.clear()
+        zoom.system.site = self.site
+        invalidate('article')
+        handler(self.request(), app)
+        self.assertEqual(len(self.renders), 2)
+
+        # kinds that no entry depends on leave no tag files behind
+        invalidate('unrelated')
+        self.assertEqual(len(os.listdir(os.path.join(path, 'tags'))), 1)
+
+    def test_depends_on(self):
+
+        def app(request, *rest):
+            self.renders.append(request.path)
+            depends_on('article')
+            return HTMLResponse('news')
+
+        handler(self.request(), app)
+        handler(self.request(), app)
+        zoom.outputcache.invalidate('article')
+        handler(self.request(), app)
+        self.assertEqual(len(self.renders), 2)
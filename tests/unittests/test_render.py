@@ -0,0 +1,78 @@
+"""
+    test the render handler
+"""
+
+import unittest
+
+import zoom
+from zoom.profiler import SystemTimer
+from zoom.render import handler, not_modified
+from zoom.response import HTMLResponse, NotModifiedResponse
+from zoom.utils import Bunch
+
+
+def make_request(etags=False, if_none_match=None, method='GET'):
+    env = {}
+    if if_none_match:
+        env['HTTP_IF_NONE_MATCH'] = if_none_match
+    return Bunch(
+        method=method,
+        env=env,
+        path='/dashboard',
+        query='',
+        helpers=lambda: {},
+        site=Bunch(etags=etags, theme='default', helpers=lambda: {}),
+        user=Bunch(username='admin', helpers=lambda: {}),
+        session=Bunch(csrf_token='1234'),
+        profiler=SystemTimer(),
+    )
+
+
+class TestETags(unittest.TestCase):
+
+    def setUp(self):
+        zoom.system.providers = []
+        self.renders = []
+
+    def tearDown(self):
+        zoom.system.request = None
+
+    def page(self, request, *rest):
+        self.renders.append(1)
+        return HTMLResponse('<h1>Dashboard</h1>')
+
+    def test_off_by_default(self):
+        response = handler(make_request(), self.page)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_content_etag(self):
+        response = handler(make_request(etags=True), self.page)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+        response = handler(make_request(True, etag), self.page)
+        self.assertIsInstance(response, NotModifiedResponse)
+        self.assertEqual(response.status, '304 Not Modified')
+
+        response = handler(make_request(True, etag, method='POST'), self.page)
+        self.assertEqual(response.status, '200 OK')
+
+    def test_version_etag(self):
+
+        def versioned(request, *rest):
+            return not_modified(42) or self.page(request)
+
+        request = zoom.system.request = make_request()
+        etag = handler(request, versioned).headers['ETag']
+        self.assertEqual(len(self.renders), 1)
+
+        request = zoom.system.request = make_request(if_none_match=etag)
+        response = handler(request, versioned)
+        self.assertEqual(response.status, '304 Not Modified')
+        self.assertEqual(len(self.renders), 1)
+
+        request = zoom.system.request = make_request(if_none_match=etag)
+        request.user.username = 'someone'
+        self.assertEqual(handler(request, versioned).status, '200 OK')
+        self.assertEqual(len(self.renders), 2)
@@ -2,13 +2,14 @@
     Test the request module
 """
 
-import cgi
 import io
 import json
 import sys
 import unittest
 
-from zoom.request import Request, cgi_to_dict
+from zoom.exceptions import BadRequestException, RequestTooLargeException
+from zoom.formdata import FileUpload
+from zoom.request import Request
 
 
 class TestCGIRequest(unittest.TestCase):
@@ -158,75 +159,74 @@ class TestCGIRequest(unittest.TestCase):
         result = {}
         self.assertEqual(request.data, result)
 
-    def test_cgi_to_dict_with_files(self):
-        fs1 = cgi.FieldStorage()
-        fs2 = cgi.FieldStorage()
-        fs_file1 = cgi.FieldStorage()
-        fs_file2 = cgi.FieldStorage()
-        fs_file3 = cgi.FieldStorage()
-        fs_csrf = cgi.FieldStorage()
-
-        fs_file1.name = fs_file2.name = fs_file3.name = 'files'
-        fs_file1.filename, fs_file1.value = 'test1.txt', b'this is binary'
-        fs_file2.filename, fs_file2.value = 'test2.txt', b'this is also binary'
-        fs_file3.filename, fs_file3.value = 'test3.txt', b'and more binary'
-        fs_csrf.name, fs_csrf.value = 'csrf_token', 'testcsrftoken2039239'
-        fs1.list = [fs_csrf, fs_file1, fs_file2, fs_file3]
-
-        result = cgi_to_dict(fs1)
-        self.assertEqual(
-            result,
-            {
-                'files': [fs_file1, fs_file2, fs_file3],
-                'csrf_token': 'testcsrftoken2039239',
-            }
-        )
-        fs2.list = [fs_csrf, fs_file1]
-        result = cgi_to_dict(fs2)
-        self.assertEqual(
-            result,
-            {
-                'files': fs_file1,
-                'csrf_token': 'testcsrftoken2039239',
-            }
-        )
-
-    def test_cgi_to_dict_without_files(self):
-        fs1 = cgi.FieldStorage()
-        fs2 = cgi.FieldStorage()
-        fs_item1 = cgi.FieldStorage()
-        fs_item2 = cgi.FieldStorage()
-        fs_item3 = cgi.FieldStorage()
-        fs_csrf = cgi.FieldStorage()
-        fs_item1.name = fs_item2.name = fs_item3.name = 'other'
-        fs_item1.value = b'this is binary'
-        fs_item2.value = b'this is also binary'
-        fs_item3.value = b'and more binary'
-        fs_csrf.name, fs_csrf.value = 'csrf_token', 'testcsrftoken2039239'
-        fs1.list = [fs_csrf, fs_item1, fs_item2, fs_item3]
-
-        result = cgi_to_dict(fs1)
-        self.assertEqual(
-            result,
-            {
-                'other': [
-                    b'this is binary',
-                    b'this is also binary',
-                    b'and more binary'
-                ],
-                'csrf_token': 'testcsrftoken2039239',
-            }
-        )
-        fs2.list = [fs_csrf, fs_item1]
-        result = cgi_to_dict(fs2)
+    def multipart_request(self, parts, **limits):
+        lines = []
+        for name, filename, value in parts:
+            disposition = 'form-data; name="%s"' % name
+            if filename is not None:
+                disposition += '; filename="%s"' % filename
+            lines.extend([
+                b'--BOUNDARY',
+                b'Content-Disposition: ' + disposition.encode('utf8'),
+                b'',
+                value,
+            ])
+        payload = b'\r\n'.join(lines + [b'--BOUNDARY--', b''])
+        self.env['REQUEST_METHOD'] = 'POST'
+        self.env['CONTENT_TYPE'] = 'multipart/form-data; boundary=BOUNDARY'
+        self.env['CONTENT_LENGTH'] = str(len(payload))
+        request = self.get_post_request(io.BytesIO(payload))
+        request.form_limits = limits
+        return request
+
+    def test_multipart(self):
+        content = b'line one\r\n--BOUNDAR\r\nline two' * 10000
+        request = self.multipart_request([
+            ('csrf_token', None, b'1234'),
+            ('name', None, 'Zoë'.encode('utf8')),
+            ('files', 'a.txt', content),
+            ('files', 'b.txt', b''),
+            ('empty', '', b''),
+        ], spool_size=1000)
+        data = request.data
+        self.assertEqual(data['csrf_token'], '1234')
+        self.assertEqual(data['name'], 'Zoë')
+        self.assertEqual(data['empty'], b'')
+        first, second = data['files']
+        self.assertIsInstance(first, FileUpload)
+        self.assertEqual(first.filename, 'a.txt')
+        self.assertEqual(first.size, len(content))
+        self.assertTrue(first.file._rolled)
+        self.assertEqual(first.value, content)
+        self.assertEqual(first.file.read(), content)
+        self.assertEqual(second.value, b'')
+
+    def test_multipart_limits(self):
+        parts = [('name', None, b'x' * 100), ('photo', 'me.png', b'y' * 1000)]
         self.assertEqual(
-            result,
-            {
-                'other': b'this is binary',
-                'csrf_token': 'testcsrftoken2039239',
-            }
+            self.multipart_request(parts, max_field_size=100).data['name'],
+            'x' * 100
         )
-
+        with self.assertRaises(RequestTooLargeException):
+            self.multipart_request(parts, max_field_size=99).data
+        with self.assertRaises(RequestTooLargeException):
+            self.multipart_request(parts, max_file_size=999).data
+        with self.assertRaises(RequestTooLargeException):
+            self.multipart_request(parts, max_body_size=1000).data
+
+    def test_urlencoded_field_limit(self):
+        self.env['REQUEST_METHOD'] = 'POST'
+        self.set_payload('short=1&long=' + 'x' * 200)
+        request = Request(self.env)
+        request.form_limits = dict(max_field_size=100)
+        with self.assertRaises(RequestTooLargeException):
+            request.data
+
+    def test_multipart_missing_boundary(self):
+        request = self.multipart_request([('name', None, b'joe')])
+        self.env['CONTENT_TYPE'] = 'multipart/form-data'
+        with self.assertRaises(BadRequestException):
+            request.data
 
 
 class TestWSGIRequest(TestCGIRequest):
@@ -0,0 +1,114 @@
+"""
+    test the server
+"""
+
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+import unittest
+import urllib.request
+
+import zoom
+from zoom.database import database
+from zoom.response import CSVResponse, FileResponse
+from zoom.server import PreforkServer, WSGIApplication
+
+
+INSTANCE = zoom.tools.zoompath('zoom', '_assets', 'web')
+
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-type', 'text/plain')])
+    return [str(os.getpid()).encode('utf8')]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = PreforkServer(app, port=0, workers=2, max_requests=2)
+        context = multiprocessing.get_context('fork')
+        self.master = context.Process(target=self.server.run)
+        self.master.start()
+
+    def tearDown(self):
+        if self.master.is_alive():
+            self.master.terminate()
+            self.master.join(10)
+        self.server.server.server_close()
+
+    def get(self):
+        url = 'http://localhost:{}/'.format(self.server.port)
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return int(response.read())
+
+    def test_workers(self):
+        pids = [self.get() for _ in range(10)]
+        self.assertNotIn(self.master.pid, pids)
+        self.assertNotIn(os.getpid(), pids)
+        # each worker is retired after serving two requests
+        self.assertGreaterEqual(len(set(pids)), 5)
+
+    def test_reload_and_stop(self):
+        before = self.get()
+        os.kill(self.master.pid, signal.SIGHUP)
+        time.sleep(0.5)
+        after = {self.get() for _ in range(2)}
+        self.assertNotIn(before, after)
+        self.master.terminate()
+        self.master.join(10)
+        self.assertEqual(self.master.exitcode, 0)
+
+
+class TestStreamedResponses(unittest.TestCase):
+
+    def call(self, handler, **environ):
+        environ = dict(
+            REQUEST_METHOD='GET',
+            PATH_INFO='/',
+            HTTP_HOST='localhost',
+            **{'wsgi.version': (1, 0)},
+            **environ
+        )
+        started = []
+        app = WSGIApplication(INSTANCE, handlers=(handler,), reload=False)
+        body = app(environ, lambda status, headers: started.append(headers))
+        return dict(started[0]), body
+
+    def test_file_response(self):
+        wrapped = []
+
+        def file_wrapper(file, size):
+            wrapped.append(file)
+            return iter(lambda: file.read(size), b'')
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x' * 100000)
+            f.flush()
+            headers, body = self.call(
+                lambda request, *rest: FileResponse(f.name),
+                **{'wsgi.file_wrapper': file_wrapper}
+            )
+            self.assertEqual(headers['Content-length'], '100000')
+            self.assertEqual(len(wrapped), 1)
+            self.assertEqual(b''.join(body), b'x' * 100000)
+
+    def test_csv_from_result(self):
+        db = database('sqlite3', database=':memory:')
+        db('create table numbers (n integer, name varchar(10))')
+        for n in range(20000):
+            db('insert into numbers values (%s, %s)', n, 'n%s' % n)
+
+        def handler(request, *rest):
+            return CSVResponse(db.stream('select * from numbers order by n'))
+
+        headers, body = self.call(handler)
+        self.assertNotIn('Content-length', headers)
+        self.assertEqual(headers['Content-type'], 'text/csv;charset=utf-8')
+        chunks = list(body)
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).decode('utf8').splitlines()
+        self.assertEqual(lines[:2], ['n,name', '0,n0'])
+        self.assertEqual(len(lines), 20001)
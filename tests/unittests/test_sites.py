@@ -89,6 +89,22 @@ class TestSite(unittest.TestCase):
         self.assertIn("deprecated", log_contents.lower())  # Adjust to match actual message
 
 
+    def test_site_cache(self):
+        request = zoom.request.build('http://localhost')
+        self.assertIsNot(
+            zoom.sites.get_request_site(request),
+            zoom.sites.get_request_site(request),
+        )
+        zoom.sites.site_cache = {}
+        try:
+            site = zoom.sites.get_request_site(request)
+            apps = site.apps
+            self.assertIs(zoom.sites.get_request_site(request), site)
+            self.assertIsNot(site.apps, apps)
+        finally:
+            zoom.sites.site_cache = None
+
+
 class TestSiteDatabase(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,57 @@
+"""
+    test the tables module
+"""
+
+import unittest
+
+import zoom
+from zoom.records import Record, RecordStore
+from zoom.tables import RecordSource, parse_query
+
+
+class Person(Record):
+    pass
+
+
+class TestRecordSource(unittest.TestCase):
+
+    def setUp(self):
+        self.db = zoom.database.database('sqlite3', database=':memory:')
+        self.db("""
+            create table person (
+                id integer primary key autoincrement,
+                name varchar(100),
+                age integer
+            )
+        """)
+        self.people = RecordStore(self.db, Person)
+        for name, age in [('Sam', 25), ('Sally', 55), ('Bob', 40)]:
+            self.people.put(Person(name=name, age=age))
+
+    def tearDown(self):
+        self.db.close()
+
+    def fetch(self, **data):
+        source = RecordSource(self.people)
+        return source.fetch(parse_query(data), ['id', 'name', 'age'])
+
+    def test_sorted(self):
+        records, total, filtered = self.fetch(**{
+            'sort[0][field]': 'age', 'sort[0][dir]': 'desc',
+        })
+        self.assertEqual([r.name for r in records], ['Sally', 'Bob', 'Sam'])
+        self.assertEqual((total, filtered), (3, 3))
+
+    def test_paged(self):
+        records, _, _ = self.fetch(**{
+            'page': '2', 'size': '2', 'sort[0][field]': 'name',
+        })
+        self.assertEqual([r.name for r in records], ['Sam'])
+
+    def test_no_matches(self):
+        records, total, filtered = self.fetch(**{
+            'filter[0][field]': 'name',
+            'filter[0][type]': 'like',
+            'filter[0][value]': 'nobody',
+        })
+        self.assertEqual((records, total, filtered), ([], 3, 0))
@@ -0,0 +1,20 @@
+"""
+    admin background jobs
+
+    Keeps the search indexes of indexed collections up to date.
+"""
+
+import zoom
+from zoom.background import cron
+
+
+@cron('* * * * *')
+def update_search_indexes():
+    """apply queued search index updates"""
+    return zoom.collect.update_search_indexes()
+
+
+@cron('17 * * * *')
+def check_search_indexes():
+    """remove search index tokens of records that no longer exist"""
+    return zoom.collect.check_search_indexes()
@@ -4,6 +4,8 @@
 
 import zoom
 
+MAX_RESULTS_PAGE = 500
+
 
 def timespan(time1, time2):
     if time1 and time2:
@@ -11,6 +13,32 @@ def timespan(time1, time2):
     return ''
 
 
+def seconds(value):
+    if value is None:
+        return ''
+    return '{:0.3f}s'.format(value)
+
+
+def percent(value):
+    if value is None:
+        return ''
+    return '{:0.1f}%'.format(value * 100)
+
+
+def bounded(value, default, lower, upper):
+    try:
+        return min(max(int(value), lower), upper)
+    except (TypeError, ValueError):
+        return default
+
+
+def status(placeholder):
+    lease = placeholder.get('lease')
+    if lease and lease > zoom.tools.now():
+        return 'running'
+    return 'ready'
+
+
 class BackgroundController(zoom.Controller):
 
     def index(self):
@@ -20,49 +48,103 @@ class BackgroundController(zoom.Controller):
         if zoom.system.user.is_admin:
             actions.append(('Clear Placeholders', 'jobs/clear'))
 
-        jobs = zoom.sites.Site(zoom.system.site.path).background_jobs
-        lookup = {
-            job.qualified_name: job
-            for job in zoom.store_of(zoom.background.BackgroundJobPlaceholder)
+        # the scheduler records the jobs it runs in their placeholders,
+        # so the job modules don't have to be imported to list them
+        site = zoom.system.site
+        jobs = sorted(
+            zoom.store_of(zoom.background.BackgroundJobPlaceholder).find(
+                site=site.name
+            ),
+            key=lambda job: job.qualified_name,
+        )
+        stats = {
+            record.job: record
+            for record in zoom.background.get_job_results().stats(site.name)
         }
+        missing = zoom.utils.Record(
+            average=None, p50=None, p95=None, failure_rate=None
+        )
 
         when = zoom.helpers.when
 
         labels = (
             'Name', 'Status', 'Trigger', 'Next Run', 'Last Run',
-            'Elapsed', 'Last Run Status'
+            'Elapsed', 'Last Run Status', 'Median', '95th Percentile',
+            'Failure Rate',
         )
 
+        def name(job):
+            return job.get('job_name') or job.qualified_name.split('/', 1)[-1]
+
         content = zoom.browse(
             (
                 (
-                    job.name,
-                    job.status,
-                    job.trigger,
-                    when(job.next_run),
-                    when(
-                        lookup.get(job.qualified_name) and
-                        lookup.get(job.qualified_name).last_run
-                    ) or 'never',
-                    timespan(
-                        lookup.get(job.qualified_name).last_finished
-                        if job.qualified_name in lookup else None,
-                        lookup[job.qualified_name].last_run
-                        if job.qualified_name in lookup else None,
-                    ),
-                    lookup[job.qualified_name].last_run_status
-                    if job.qualified_name in lookup and
-                    lookup[job.qualified_name].last_run_status
-                    else '-'
+                    name(job),
+                    status(job),
+                    job.get('schedule') or 'No schedule (always runs)',
+                    when(zoom.background.next_run(
+                        job.get('schedule'),
+                        job.get('last_finished') or job.get('created'),
+                    )),
+                    when(job.get('last_run')) or 'never',
+                    timespan(job.get('last_finished'), job.get('last_run')),
+                    job.get('last_run_status') or '-',
+                    seconds(stats.get(name(job), missing).p50),
+                    seconds(stats.get(name(job), missing).p95),
+                    percent(stats.get(name(job), missing).failure_rate),
                 )
                 for job in jobs
             ),
             labels=labels,
         )
+        content += zoom.link_to('Recent results', 'jobs/results')
 
         title = 'Jobs'
         return zoom.page(content, title=title,actions=actions)
 
+    def results(self, n=0, limit=50, job=None):
+        """Returns a page of recent background job results"""
+
+        site = zoom.system.site
+        n = bounded(n, 0, 0, 10 ** 6)
+        limit = bounded(limit, 50, 1, MAX_RESULTS_PAGE)
+        job_results = zoom.background.get_job_results()
+        results = job_results.find(site.name, job, limit, n * limit)
+
+        when = zoom.helpers.when
+
+        labels = (
+            'Job', 'Started', 'Waited', 'Ran', 'Status', 'Result'
+        )
+        content = zoom.browse(
+            (
+                (
+                    zoom.link_to(result.job_name, 'results', job=result.job_name),
+                    when(result.start_time),
+                    seconds(result.wait_time),
+                    seconds(result.run_time),
+                    result.run_status,
+                    zoom.html.pre(zoom.tools.websafe(result.runtime_error))
+                    if result.runtime_error
+                    else zoom.tools.websafe(repr(result.return_value)),
+                )
+                for result in results
+            ),
+            labels=labels,
+        )
+
+        params = dict(limit=limit)
+        if job:
+            params['job'] = job
+        pager = []
+        if n:
+            pager.append(zoom.link_to('Newer', 'results', n=n - 1, **params))
+        if n * limit + limit < job_results.count(site.name, job):
+            pager.append(zoom.link_to('Older', 'results', n=n + 1, **params))
+        content += ' '.join(pager)
+
+        return zoom.page(content, title='Job Results', subtitle=job or '')
+
     @zoom.authorize('administrators')
     def clear(self):
         zoom.store_of(zoom.background.BackgroundJobPlaceholder).zap()
@@ -3,7 +3,6 @@
 import os
 
 from uuid import UUID, uuid4
-from cgi import FieldStorage
 
 from zoom import Page, Record, system as context, store, redirect_to, \
     html, authorize, dispatch, load as load_app_asset, requires as requires_lib
@@ -11,6 +10,7 @@ from zoom.mvc import View
 from zoom.render import render as render_template
 from zoom.helpers import abs_url_for
 from zoom.buckets import FileBucket
+from zoom.formdata import FileUpload
 from zoom.response import Response
 from zoom.logging import log_activity
 
@@ -241,10 +241,10 @@ class FileSetController(View):
     @authorize('managers')
     def upload(self, *route, **req_data):
         """Handle a file upload."""
-        # Read the FieldStorage.
+        # Read the FileUpload.
         file_desc = req_data['file']
         file_mimetype = req_data['mimetype']
-        if not isinstance(file_desc, FieldStorage):
+        if not isinstance(file_desc, FileUpload):
             # Python is dangerous when the type is incorrectly assumed.
             return Response(b'invalid request body', status='400 Bad Request')
 
@@ -8,10 +8,12 @@ import zoom
 import zoom.fields as f
 
 from zoom.context import context
+from zoom.loader import resolve
 from zoom.fields import (Fields, TextField, MemoField, MarkdownEditField)
 from zoom.validators import required, MinimumLength
 from zoom.helpers import link_to
-from zoom.utils import id_for
+from zoom.outputcache import cached_output
+from zoom.utils import id_for, kind
 from zoom.tools import load_content
 from zoom.store import EntityStore
 from zoom.render import render
@@ -65,6 +67,7 @@ def get_pages():
     return PageStore(context.site.db, PageCollection)
 
 
+@cached_output(tags=[kind(PageCollection())], anonymous_only=True)
 def load_page(path):
     """Load a page given it's path"""
 
@@ -73,7 +76,7 @@ def load_page(path):
         return markdown(render(page.body))
 
     filename = os.path.splitext(path or 'index.html')[0] + '.md'
-    if os.path.exists(filename):
+    if os.path.exists(resolve(filename)):
         return load_content(filename)
 
     logger = logging.getLogger(__name__)
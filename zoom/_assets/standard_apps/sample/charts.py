@@ -12,10 +12,10 @@ class ChartSampleView(View):
 
     def index(self):
         db = zoom.system.site.db
-        data = db('select id, app, path, status, user_id, address from log where timestamp > %s', datetime.date.today())
-
-        my_pivot_table = PivotTable(
-            data=data,
+        my_pivot_table = PivotTable.query(
+            db,
+            'select id, app, path, status, user_id, address from log where timestamp > %s',
+            datetime.date.today(),
             rows=['status', 'app'],
             columns=['user_id', 'path'],
             renderer_name='Heatmap',
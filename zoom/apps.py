@@ -1,20 +1,18 @@
 """ zoom.apps handles requests by locating and calling a suitable app """
 
 import configparser
-import importlib
 import logging
 import os
-import sys
 import urllib
 
 import zoom
 import zoom.components.apps
 from zoom.components import as_menu
-from zoom.database import Database
 import zoom.html as html
 from zoom.utils import existing
 from zoom.users import Users
 from zoom.background import load_app_background_jobs
+from zoom.loader import app_context, load_module, resolve
 
 
 DEFAULT_SYSTEM_APPS = ['register', 'profile', 'settings', 'login', 'logout']
@@ -30,41 +28,12 @@ DEFAULT_SETTINGS = dict(
     tags='',
     keywords='',
     in_development=False,
+    etags=False,
 )
 
 logger = logging.getLogger(__name__)
 
 
-class app_context:
-    """App Context Manager"""
-
-    def __init__(self, path):
-        self.path = path
-        self.save_dir = os.getcwd()
-
-    def __enter__(self):
-        sys.path.insert(0, self.path)
-        os.chdir(self.path)
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        os.chdir(self.save_dir)
-        sys.path.remove(self.path)
-
-
-def load_module(module, filename):
-    """Dynamically load a module"""
-
-    pathname = os.path.realpath(filename)
-    if os.path.exists(pathname):
-        if module in sys.modules:
-            del sys.modules[module]
-        path = os.path.dirname(pathname)
-        with app_context(path):
-            importlib.invalidate_caches()
-            m = importlib.import_module(module)
-            return m
-
-
 class App(object):
     """A Zoom application
 
@@ -91,7 +60,9 @@ class App(object):
             """test if callable and return it or None"""
             return callable(method) and method
 
-        isfile = os.path.isfile
+        def isfile(pathname):
+            return os.path.isfile(resolve(pathname))
+
         logger.debug('app called with route %r', route)
 
         if len(route) > 1:
@@ -119,7 +90,7 @@ class App(object):
 
         filename = '{}.py'.format(module)
         if isfile(filename):
-            source = load_module(module, os.path.realpath(filename))
+            source = load_module(module, resolve(filename))
             main = if_callable(getattr(source, 'main', None))
             app = if_callable(getattr(source, 'app', None))
             view = if_callable(getattr(source, 'view', None))
@@ -192,6 +163,7 @@ class AppProxy:
         self.icon = get('icon')
         self.as_icon = self.get_icon_view()
         self.in_development = get('in_development')
+        self.etags = get('etags') in zoom.utils.POSITIVE
 
         self._templates_paths = None
 
@@ -493,14 +465,14 @@ def handle(request):
         request.app = app
         zoom.render.add_helpers(helpers(request))
 
-        saved_database_debug_setting = Database.debug
+        saved_database_debug_setting = zoom.system.database_debug
         try:
-            Database.debug = request.site.monitor_app_database
+            zoom.system.database_debug = request.site.monitor_app_database
             request.profiler.add('system ready')
             result = app.run(request)
             request.profiler.add('app finished')
         finally:
-            Database.debug = saved_database_debug_setting
+            zoom.system.database_debug = saved_database_debug_setting
         return result
 
     site = request.site
@@ -804,8 +776,12 @@ def config_menu(request):
 
 
 def helpers(request):
-    """return a dict of app helpers"""
+    """return a dict of app helpers
+
+    The menus are only built if the page uses them.
+    """
     app = request.app
+    lazy = zoom.render.lazy
     return dict(
         app_title=app.title,
         app_url=request.app.url,
@@ -814,12 +790,12 @@ def helpers(request):
         app_class=zoom.utils.id_for(request.app.name.strip()),
         app_description=request.app.description,
         app_keywords=request.app.keywords,
-        system_menu_items=system_menu_items(request),
-        system_menu=system_menu(request),
-        main_menu_items=main_menu_items(request),
-        main_menu=main_menu(request),
-        apps_menu=apps_menu(request),
-        config_menu=config_menu(request),
+        system_menu_items=lazy(lambda: system_menu_items(request)),
+        system_menu=lazy(lambda: system_menu(request)),
+        main_menu_items=lazy(lambda: main_menu_items(request)),
+        main_menu=lazy(lambda: main_menu(request)),
+        apps_menu=lazy(lambda: apps_menu(request)),
+        config_menu=lazy(lambda: config_menu(request)),
         page_name=len(request.route) > 1 and request.route[1] or '',
     )
 
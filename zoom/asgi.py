@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+    zoom.asgi
+
+    runs an instance of Zoom under an ASGI server.
+
+    The middleware stack is synchronous, so each request is handled in a
+    bounded pool of threads.  When every thread is busy new requests
+    wait for one to free up, for up to queue_timeout seconds, and are
+    then turned away with a 503.
+
+    Request bodies are read from the client as the app reads them rather
+    than up front, streamed responses are sent a chunk at a time and
+    PollResponses wait on the event loop rather than in a thread, so
+    long polling clients don't tie up the pool.  Once a request has
+    released its thread, the work left (advancing streamed bodies and
+    checking polls) runs in a second pool of the same size, so it never
+    competes with queued requests for the first.
+
+    To serve an instance with uvicorn, for example, create a module with
+
+        import zoom.asgi
+        application = zoom.asgi.ASGIApplication('/work/web')
+
+    and run `uvicorn mymodule:application`.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+
+from zoom.request import Request
+from zoom.response import PollResponse, iter_file
+import zoom.middleware as middleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_TIMEOUT = 30
+
+_end = object()
+
+
+class ReceiveStream(object):
+    """file like access to an ASGI request body
+
+    Used from a worker thread, it pulls body messages from the event
+    loop only as the data is needed.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.more = True
+
+    def _fill(self):
+        """receive the next body message"""
+        message = asyncio.run_coroutine_threadsafe(
+            self.receive(), self.loop
+        ).result()
+        if message['type'] == 'http.request':
+            self.buffer += message.get('body', b'')
+            self.more = message.get('more_body', False)
+        else:
+            self.more = False
+
+    def read(self, size=-1):
+        """read up to size bytes, or everything that's left"""
+        while self.more and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self.buffer)
+        result, self.buffer = self.buffer[:size], self.buffer[size:]
+        return result
+
+    def readline(self, size=-1):
+        """read a line, or up to size bytes of it"""
+        while self.more and b'\n' not in self.buffer and (
+                size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        if size is not None and 0 <= size < end:
+            end = size
+        result, self.buffer = self.buffer[:end], self.buffer[end:]
+        return result
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def build_environ(scope, body):
+    """build a WSGI style environment from an ASGI scope
+
+    Repeated headers are joined with commas, except for cookies, which
+    HTTP/2 clients may send as separate headers and which are joined
+    with semicolons.
+
+    >>> environ = build_environ(dict(method='GET', path='/', headers=[
+    ...     (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+    ...     (b'accept', b'text/html'), (b'accept', b'*/*'),
+    ... ]), None)
+    >>> environ['HTTP_COOKIE'], environ['HTTP_ACCEPT']
+    ('a=1; b=2', 'text/html,*/*')
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': None,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+def encode_headers(headers):
+    return [
+        (name.lower().encode('latin-1'), str(value).encode('latin-1'))
+        for name, value in headers
+    ]
+
+
+class ASGIApplication(object):
+    """an ASGI Application wrapper
+
+    >>> app = ASGIApplication(workers=2)
+    >>> app.workers
+    2
+    """
+
+    def __init__(self, instance='.', handlers=None, username=None,
+                 workers=None, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.instance = instance
+        self.handlers = handlers
+        self.username = username
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix='zoom'
+        )
+        self.streamers = ThreadPoolExecutor(
+            self.workers, thread_name_prefix='zoom-stream'
+        )
+        self.slots = None
+
+    def handle(self, environ):
+        """handle a request in a worker thread"""
+        start_time = timer()
+        request = Request(environ, self.instance, start_time, self.username)
+        request.reload_modules = False
+        return middleware.handle(request, self.handlers)
+
+    async def run(self, function, *args):
+        """run function in the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def stream(self, function, *args):
+        """run function in the pool used once a request has no slot"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.streamers, function, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise NotImplementedError(
+                'unsupported ASGI scope type %r' % scope['type']
+            )
+
+    async def lifespan(self, receive, send):
+        """handle server startup and shutdown"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                self.streamers.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        """handle an HTTP request"""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning('no worker available for %s', scope['path'])
+            await self.send_response(
+                send, '503 Service Unavailable', [('Retry-After', '1')],
+                b'Service Unavailable', scope,
+            )
+            return
+
+        try:
+            body = ReceiveStream(receive, asyncio.get_running_loop())
+            environ = build_environ(scope, body)
+            response = await self.run(self.handle, environ)
+            if not isinstance(response, PollResponse):
+                status, headers, content = await self.run(response.as_wsgi)
+        finally:
+            self.slots.release()
+
+        if isinstance(response, PollResponse):
+            response = await self.poll(response)
+            status, headers, content = await self.stream(response.as_wsgi)
+
+        await self.send_response(send, status, headers, content, scope)
+
+    async def poll(self, response):
+        """wait for a PollResponse value without holding a worker"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + response.timeout
+        while True:
+            value = await self.stream(response.poll)
+            if value is not None or loop.time() >= deadline:
+                return response.result(value)
+            await asyncio.sleep(response.delay)
+
+    async def send_response(self, send, status, headers, content, scope):
+        """send a response, a chunk at a time if it is streamed"""
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split()[0]),
+            'headers': encode_headers(headers),
+        })
+        if scope['method'] == 'HEAD':
+            close = getattr(content, 'close', None)
+            if close:
+                close()
+            content = b''
+        elif hasattr(content, 'read'):
+            content = iter_file(content)
+
+        if isinstance(content, (bytes, bytearray)):
+            await send({'type': 'http.response.body', 'body': bytes(content)})
+            return
+
+        if hasattr(content, '__aiter__'):
+            async for chunk in content:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        else:
+            chunks = iter(content)
+            try:
+                while True:
+                    # sync iterables may do blocking work to produce
+                    # each chunk so they are advanced in a thread, but
+                    # not one of the request slots released in http()
+                    chunk = await self.stream(next, chunks, _end)
+                    if chunk is _end:
+                        break
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            finally:
+                close = getattr(content, 'close', None)
+                if close:
+                    close()
+        await send({'type': 'http.response.body', 'body': b''})
@@ -10,27 +10,51 @@
     jobs.  Those jobs are then registered in the BackgroundJob entity store
     where they are visible via the /admin/jobs dashboard.
 
+    When running continuously, the Scheduler loads the jobs once, keeps
+    them ordered by the time they are next due and rescans the apps only
+    when a background.py module changes.
+
 """
 
 import os
 import sys
+import time
+import heapq
 import logging
 import inspect
 import hashlib
-import importlib
+import itertools
+import threading
 import traceback
+import weakref
+import collections
+import multiprocessing
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from croniter import croniter
 
 import zoom
 from zoom.store import Entity, store_of
+from zoom.loader import app_context, load_module
+from zoom.queues import stamp
 
 logger = logging.getLogger(__name__)
 
+EXECUTORS = ('process', 'thread')
+DEFAULT_EXECUTOR = 'process'
+DEFAULT_JOB_TIMEOUT = 60 * 60
+DEFAULT_JOBS_PER_SITE = 2
+LEASE_MARGIN = 60
+JOB_RESULTS_KEPT = 100
+POLL_INTERVAL = 0.1
+NEVER = datetime(1900, 1, 1)
+
+forking = 'fork' in multiprocessing.get_all_start_methods()
+
 # Registrars. Note these will not work unless the module is imported
 # in a call to load_app_background_jobs.
 _job_set = None
+_job_set_lock = threading.Lock()
 
 class BackgroundJobPlaceholder(Entity):
     """Background Job"""
@@ -40,14 +64,32 @@ class BackgroundJobPlaceholder(Entity):
         return self._id
 
 
+def next_run(schedule, last_run=None):
+    """Return the time a job with schedule is next due
+
+    >>> next_run('0 * * * *', datetime(2020, 1, 1, 10, 30))
+    datetime.datetime(2020, 1, 1, 11, 0)
+    """
+    if not schedule:
+        return datetime.now()
+    return croniter(schedule, last_run or datetime.now()).get_next(datetime)
+
+
 class BackgroundJob:
 
-    def __init__(self, uow, uow_source, schedule):
+    def __init__(
+            self, uow, uow_source, schedule,
+            executor=DEFAULT_EXECUTOR, timeout=None
+        ):
+        if executor not in EXECUTORS:
+            raise ValueError('unknown executor %r' % executor)
         self.job_id = None
         self.created = None
         self.uow = uow
         self.uow_source = uow_source
         self.schedule = schedule
+        self.executor = executor
+        self.timeout = timeout or DEFAULT_JOB_TIMEOUT
         self.app = None
         self.last_run = None
         self.last_finished = None
@@ -79,10 +121,7 @@ class BackgroundJob:
 
     @property
     def next_run(self):
-        if not self.schedule:
-            return datetime.now()
-        last_run = self.last_finished or self.created or datetime.now()
-        return croniter(self.schedule, last_run).get_next(datetime)
+        return next_run(self.schedule, self.last_finished or self.created)
 
     @property
     def uow_signature(self):
@@ -99,12 +138,21 @@ class BackgroundJob:
             self.last_finished = record.last_finished
             self.last_run_result = record.last_run_result
             self.last_run_status = record.last_run_status
+            if (
+                    record.get('job_name') != self.name or
+                    record.get('schedule') != self.schedule
+                ):
+                # keep the job list shown by the admin app current
+                record.update(job_name=self.name, schedule=self.schedule)
+                store.put(record)
         else:
             self.created = zoom.tools.now()
             self.job_id = store.put(
                 BackgroundJobPlaceholder(
                     qualified_name=self.qualified_name,
                     site=self.app.site.name,
+                    job_name=self.name,
+                    schedule=self.schedule,
                     created=self.created,
                     last_run=self.last_run,
                     last_run_result=self.last_run_result,
@@ -112,7 +160,8 @@ class BackgroundJob:
                 )
             )
 
-    def save(self):
+    def save(self, release=True):
+        """Save the job state, releasing the lease unless told not to"""
         store = store_of(BackgroundJobPlaceholder)
         record = store.first(qualified_name=self.qualified_name)
 
@@ -125,24 +174,90 @@ class BackgroundJob:
             last_run_result=self.last_run_result,
             last_run_status=self.last_run_status,
         )
+        if release:
+            record.update(lease=NEVER)
         store.put(record)
 
+    def acquire(self):
+        """Acquire the lease that prevents overlapping runs of this job
+
+        The lease is held in the job placeholder record and expires after
+        the job timeout, so a crashed scheduler cannot block a job
+        forever.  It is released by save().  Returns True if the lease
+        was acquired.
+        """
+        def decoded(value):
+            if type(value) is bytes:
+                return value.decode('utf8')
+            return value
+
+        db = zoom.get_db()
+        kind = store_of(BackgroundJobPlaceholder).kind
+        current = zoom.tools.now()
+        expires = current + timedelta(seconds=self.timeout + LEASE_MARGIN)
+
+        cmd = 'select value from attributes where row_id=%s and attribute=%s'
+        lease = db(cmd, self.job_id, 'lease').value
+        if lease is None:
+            lease = stamp(NEVER)
+            db(
+                'insert into attributes ('
+                '    kind, row_id, attribute, datatype, value'
+                ') values (%s,%s,%s,%s,%s)',
+                kind, self.job_id, 'lease', 'datetime.datetime', lease
+            )
+        lease = decoded(lease)
+
+        if lease > stamp(current):
+            return False
+
+        db(
+            'update attributes set value=%s '
+            'where row_id=%s and attribute=%s and value=%s',
+            stamp(expires), self.job_id, 'lease', lease
+        )
+        return db.rowcount > 0
+
+    def renew(self):
+        """Extend the lease held by this job for another timeout period"""
+        expires = zoom.tools.now() + timedelta(
+            seconds=self.timeout + LEASE_MARGIN
+        )
+        zoom.get_db()(
+            'update attributes set value=%s where row_id=%s and attribute=%s',
+            stamp(expires), self.job_id, 'lease'
+        )
+
+    def release(self):
+        """Release the lease held by this job"""
+        zoom.get_db()(
+            'update attributes set value=%s where row_id=%s and attribute=%s',
+            stamp(NEVER), self.job_id, 'lease'
+        )
+
     def __repr__(self):
         return '<BackgroundJob name="%s" schedule="%s">'%(
             self.uow.__name__, self.schedule
         )
 
 
-def cron(schedule):
+def cron(schedule, executor=DEFAULT_EXECUTOR, timeout=None):
     """decorator to schedule a job to be run in the background
 
     Use to decorate a function in background.py in any app to have
     that function be executed on the specified cron schedule,
+
+    Jobs run in a separate process by default.  I/O bound jobs can
+    use executor='thread' to run in a thread instead.  Jobs that run
+    longer than timeout seconds are stopped.  Threads can't be stopped,
+    so a thread job that times out is recorded as such but keeps its
+    lease, and is not run again, until the thread actually finishes.
     """
     def register(job_fn):
         if _job_set is not None:
             _job_set.append(BackgroundJob(
-                job_fn, inspect.getsource(job_fn), schedule
+                job_fn, inspect.getsource(job_fn), schedule,
+                executor=executor, timeout=timeout,
             ))
         return job_fn
     return register
@@ -172,42 +287,25 @@ def load_app_background_jobs(app):
         return list()
 
     # Initialize the job registrar storage. This is extended by registration
-    # functions when initialized like this.
-    _job_set = list()
-
-    # Add CWD to import path so we can import background modules after we chdir
-    # into app directories.
-    sys.path.insert(0, app.path)
-    # Remove any existing background module from sys.modules (probably this
-    # module), to prevent that cache from trapping the import we're about to
-    # do.
-    if 'background' in sys.modules:
-        del sys.modules['background']
-
-    # Pop the CWD and chdir to the app directory.
-    base_dir = os.getcwd()
-    os.chdir(app.path)
-    try:
-
-        # Import the background module from the app. This has the side effect of
-        # allowing the job registrars to populate _job_set.
-        importlib.import_module('background', app.path)
-
-    except BaseException:
-        logger.error('unable to load background job %r', app.path)
-        return set()
+    # functions when initialized like this.  Apps are loaded one at a time
+    # since the storage is shared.
+    with _job_set_lock:
+        _job_set = list()
+        try:
 
-    finally:
-        # Return to our previous CWD.
-        os.chdir(base_dir)
+            # Import the background module from the app. This has the side
+            # effect of allowing the job registrars to populate _job_set.
+            load_module('background', background_module_path)
 
-        # Remove our modification from the import path.
-        sys.path.remove(app.path)
+        except BaseException:
+            logger.error('unable to load background job %r', app.path)
+            _job_set = None
+            return set()
 
-    # Un-initialize the _job_set global to prevent weird behaviour in the case
-    # of app code importing symbols from their background.py modules.
-    job_set = _job_set
-    _job_set = None
+        # Un-initialize the _job_set global to prevent weird behaviour in the
+        # case of app code importing symbols from their background.py modules.
+        job_set = _job_set
+        _job_set = None
 
     # Annotate each collected job with it's parent app.
     for job in job_set: # pylint: disable=not-an-iterable
@@ -219,15 +317,25 @@ def load_app_background_jobs(app):
 class BackgroundJobResult(Entity):
     """
     job_qualified_name = None
-    timestamp = None
-    elapsed_time = None
+    job_site = None
+    job_name = None
+    queued_time = None
+    start_time = None
+    finish_time = None
+    wait_time = None
+    run_time = None
+    run_status = None
     return_value = None
     runtime_error = None
     """
 
     @property
-    def timestamp_dt(self):
-        return datetime.fromisoformat(self.timestamp)
+    def timestamp(self):
+        return self.start_time
+
+    @property
+    def elapsed_time(self):
+        return self.run_time or 0
 
     def describe(self, as_html=False):
         return_desc = None
@@ -253,24 +361,310 @@ class BackgroundJobResult(Entity):
         return ' '.join((return_desc, timing_desc))
 
 
+# databases whose results table is known to exist, by cache key
+_results_tables = set()
+_local_results_tables = weakref.WeakSet()
+
+
+class JobResults:
+    """Background job results
+
+    Results are stored in a dedicated table indexed by site, job and
+    start time.  Only the most recent `keep` results are retained for
+    each job, so the table works as a ring buffer per job.  The table is
+    created on first use; whether it exists is checked once per process
+    for each database.
+
+        >>> from zoom.database import setup_test
+        >>> results = JobResults(setup_test(), keep=2)
+        >>> results.zap()
+        >>> t = datetime(2020, 1, 1, 12, 0, 0)
+        >>> for n in range(3):
+        ...     _ = results.put(BackgroundJobResult(
+        ...         job_site='localhost',
+        ...         job_name='sample:tick',
+        ...         queued_time=t,
+        ...         start_time=t + timedelta(minutes=n),
+        ...         finish_time=t + timedelta(minutes=n, seconds=1),
+        ...         wait_time=0.0,
+        ...         run_time=float(n + 1),
+        ...         run_status=n and 'success' or 'failed',
+        ...         return_value=n,
+        ...         runtime_error='',
+        ...     ))
+        >>> results.count(site='localhost')
+        2
+        >>> [r.return_value for r in results.find(site='localhost')]
+        [2, 1]
+        >>> [r.return_value for r in results.find(limit=1, offset=1)]
+        [1]
+        >>> results.find()[0].job_qualified_name
+        'localhost/sample:tick'
+        >>> stats = results.stats(site='localhost')
+        >>> [(r.job, r.runs, r.failures, r.p50, r.p95) for r in stats]
+        [('sample:tick', 2, 0, 2.0, 3.0)]
+        >>> stats = results._stats(*results._where('localhost', None))
+        >>> [(r.job, r.runs, r.failures, r.p50, r.p95) for r in stats]
+        [('sample:tick', 2, 0, 2.0, 3.0)]
+        >>> results.zap()
+    """
+
+    table = 'background_job_results'
+
+    def __init__(self, db, keep=JOB_RESULTS_KEPT):
+        self.db = db
+        self.keep = keep
+        key = db.cache_key()
+        checked = _local_results_tables if key is db else _results_tables
+        if key not in checked:
+            if self.table not in db.get_tables():
+                self.create_table()
+            checked.add(key)
+
+    def create_table(self):
+        """create the results table and its index"""
+        sqlite = isinstance(self.db, zoom.database.Sqlite3Database)
+        self.db("""
+            create table if not exists {table} (
+                {id},
+                site varchar(100) not null,
+                job varchar(200) not null,
+                queued_time {datetime},
+                start_time {datetime},
+                finish_time {datetime},
+                wait_time double,
+                run_time double,
+                status varchar(20),
+                return_value text,
+                runtime_error text
+            )
+            """.format(
+                table=self.table,
+                id=(
+                    'id integer primary key autoincrement' if sqlite else
+                    'id int unsigned not null auto_increment primary key'
+                ),
+                datetime=sqlite and 'timestamp' or 'datetime',
+            ))
+        self.db("""
+            create index {table}_key on {table} (site, job, start_time)
+            """.format(table=self.table))
+
+    def put(self, result):
+        """store a job result, discarding results beyond the limit"""
+        try:
+            return_value = zoom.jsonz.dumps(result.get('return_value'))
+        except TypeError:
+            return_value = zoom.jsonz.dumps(repr(result.get('return_value')))
+        cmd = """
+            insert into {} (
+                site, job, queued_time, start_time, finish_time,
+                wait_time, run_time, status, return_value, runtime_error
+            ) values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """.format(self.table)
+        result_id = self.db(
+            cmd,
+            result.job_site,
+            result.job_name,
+            result.queued_time,
+            result.start_time,
+            result.finish_time,
+            result.wait_time,
+            result.run_time,
+            result.run_status,
+            return_value,
+            result.runtime_error,
+        )
+        self.trim(result.job_site, result.job_name)
+        return result_id
+
+    def trim(self, site, job):
+        """discard all but the most recent results for a job"""
+        cmd = """
+            select start_time from {}
+            where site=%s and job=%s
+            order by start_time desc
+            limit 1 offset %s
+            """.format(self.table)
+        cutoff = self.db(cmd, site, job, self.keep).value
+        if cutoff is not None:
+            cmd = 'delete from {} where site=%s and job=%s and start_time<=%s'
+            self.db(cmd.format(self.table), site, job, cutoff)
+
+    def _where(self, site, job):
+        clauses, params = [], []
+        if site is not None:
+            clauses.append('site=%s')
+            params.append(site)
+        if job is not None:
+            clauses.append('job=%s')
+            params.append(job)
+        where = clauses and 'where ' + ' and '.join(clauses) or ''
+        return where, params
+
+    def find(self, site=None, job=None, limit=50, offset=0):
+        """return a page of results, most recent first"""
+
+        def as_result(row):
+            result = BackgroundJobResult(row)
+            result.update(
+                job_qualified_name='{}/{}'.format(row['site'], row['job']),
+                job_site=row['site'],
+                job_name=row['job'],
+                run_status=row['status'],
+                return_value=(
+                    row['return_value'] and
+                    zoom.jsonz.loads(row['return_value'])
+                ),
+            )
+            for key in ('site', 'job', 'status'):
+                del result[key]
+            return result
+
+        where, params = self._where(site, job)
+        cmd = """
+            select * from {table}
+            {where}
+            order by start_time desc, id desc
+            limit {limit} offset {offset}
+            """.format(
+                table=self.table,
+                where=where,
+                limit=int(limit),
+                offset=int(offset),
+            )
+        return list(self.db(cmd, *params).map(as_result))
+
+    def count(self, site=None, job=None):
+        """return the number of results stored"""
+        where, params = self._where(site, job)
+        cmd = 'select count(*) from {} {}'.format(self.table, where)
+        return self.db(cmd, *params).value
+
+    def stats(self, site=None):
+        """return run statistics for each job
+
+        Calculates the number of runs, failures, failure rate and the
+        median and 95th percentile run times (nearest rank) of the
+        retained results of each job.
+        """
+        where, params = self._where(site, None)
+        cmd = """
+            select
+                site,
+                job,
+                count(*) as runs,
+                sum(case when status='success' then 0 else 1 end) as failures,
+                avg(run_time) as average,
+                min(case when run_rank * 100 >= n * 50 then run_time end) as p50,
+                min(case when run_rank * 100 >= n * 95 then run_time end) as p95
+            from (
+                select
+                    site,
+                    job,
+                    status,
+                    run_time,
+                    row_number() over (
+                        partition by site, job order by run_time
+                    ) as run_rank,
+                    count(*) over (partition by site, job) as n
+                from {table}
+                {where}
+            ) ranked
+            group by site, job
+            order by site, job
+            """.format(table=self.table, where=where)
+
+        def as_stats(row):
+            record = zoom.utils.Record(row)
+            record.failures = int(record.failures)
+            record.failure_rate = record.runs and record.failures / record.runs
+            return record
+
+        if not self.db.supports('window_functions'):
+            return self._stats(where, params)
+
+        return list(self.db(cmd, *params).map(as_stats))
+
+    def _stats(self, where, params):
+        """calculate run statistics without window functions
+
+        Used for databases that don't support window functions, such as
+        MySQL before 8.0.  Only the retained results are read, so this
+        stays cheap.
+        """
+        cmd = """
+            select site, job, status, run_time
+            from {table}
+            {where}
+            order by site, job, run_time
+            """.format(table=self.table, where=where)
+
+        def nearest_rank(times, percentile):
+            n = len(times)
+            for rank, value in enumerate(times, 1):
+                if rank * 100 >= n * percentile:
+                    return value
+
+        result = []
+        rows = self.db(cmd, *params)
+        for (site, job), group in itertools.groupby(rows, lambda a: a[:2]):
+            group = list(group)
+            times = [row[3] for row in group if row[3] is not None]
+            failures = sum(1 for row in group if row[2] != 'success')
+            runs = len(group)
+            result.append(zoom.utils.Record(
+                site=site,
+                job=job,
+                runs=runs,
+                failures=failures,
+                failure_rate=runs and failures / runs,
+                average=times and sum(times) / len(times) or None,
+                p50=nearest_rank(times, 50),
+                p95=nearest_rank(times, 95),
+            ))
+        return result
+
+    def zap(self):
+        """delete all results"""
+        self.db('delete from {}'.format(self.table))
+
+
+def get_job_results(db=None):
+    """Return the job results store for the current site"""
+    return JobResults(db or zoom.get_db())
+
+
 def purge_old_job_results():
-    """Purge old background job results"""
+    """Purge old background job results
 
-    cmd = """
-    delete from attributes
-    where kind = 'background_job_result' and row_id not in (
-        select row_id from (
-            select distinct row_id from attributes
-            where kind = 'background_job_result'
-            order by row_id desc
-            limit 100  -- keep this many result records
-        ) foo
-    )
+    Trims the results of every job to the retention limit, and purges
+    all but the most recent results stored as entities by earlier
+    versions.
     """
 
     logger.info('purging old background job results')
     db = zoom.get_db()
-    db(cmd)
+
+    results = JobResults(db)
+    cmd = 'select distinct site, job from {}'.format(results.table)
+    for site, job in db(cmd):
+        results.trim(site, job)
+
+    cmd = """
+        select distinct row_id from attributes
+        where kind = 'background_job_result'
+        order by row_id desc
+        limit 1 offset 99
+    """
+    cutoff = db(cmd).value
+    if cutoff is not None:
+        cmd = """
+            delete from attributes
+            where kind = 'background_job_result' and row_id < %s
+        """
+        db(cmd, cutoff)
+
     logger.debug('finished purging old background job results')
 
 
@@ -289,7 +683,268 @@ def reset_modules():
         init_modules = list(sys.modules.keys())
 
 
-def run_background_jobs(app):
+def perform(job):
+    """Run the unit of work of a job with safety, returning the outcome"""
+
+    logger.info('running background job %s', job.qualified_name)
+    start_time = zoom.tools.now()
+
+    return_value = runtime_error = str()
+    try:
+        return_value = job.uow()
+        logger.debug('\treturned: %s', return_value)
+        status = 'success'
+    except BaseException as ex:
+        runtime_error = ''.join(traceback.format_exception(
+            ex.__class__, ex, ex.__traceback__
+        ))
+        logger.critical(
+            '\tjob %s failed!\n%s',
+            job.qualified_name,
+            runtime_error.join(('='*10 + '\n',)*2)
+        )
+        status = 'failed'
+        return_value = None
+
+    return status, return_value, runtime_error, start_time, zoom.tools.now()
+
+
+def run_in_process(job, connection):
+    """Run a job in a forked worker process
+
+    The worker opens its own site (and database connection) rather than
+    sharing the connection inherited from the scheduler.
+    """
+    site = zoom.sites.Site(job.app.site.path)
+    site.activate()
+    with app_context(job.app.path):
+        outcome = perform(job)
+    try:
+        connection.send(outcome)
+    except Exception:
+        status, return_value, runtime_error, start_time, finish_time = outcome
+        connection.send(
+            (status, repr(return_value), runtime_error, start_time, finish_time)
+        )
+
+
+def run_in_thread(job, outcome):
+    """Run a job in a worker thread"""
+    site = zoom.sites.Site(job.app.site.path)
+    site.activate()
+    try:
+        with app_context(job.app.path):
+            outcome.append(perform(job))
+    finally:
+        site.db.close()
+
+
+class Worker:
+    """A job running in a worker process or thread"""
+
+    def __init__(self, job, queued_time):
+        self.job = job
+        self.queued_time = queued_time
+        self.start_time = zoom.tools.now()
+        self.deadline = time.time() + job.timeout
+        self.outcome = []
+        self.receiver = None
+
+        if job.executor == 'process' and forking:
+            self.receiver, sender = multiprocessing.Pipe(duplex=False)
+            self.task = multiprocessing.get_context('fork').Process(
+                target=run_in_process,
+                args=(job, sender),
+                name=job.qualified_name,
+            )
+        else:
+            self.task = threading.Thread(
+                target=run_in_thread,
+                args=(job, self.outcome),
+                name=job.qualified_name,
+                daemon=True,
+            )
+        self.task.start()
+
+    @property
+    def site_name(self):
+        return self.job.app.site.name
+
+    def collect(self):
+        """Return the outcome if the job has finished, otherwise None"""
+        if self.receiver is not None:
+            alive = self.task.is_alive()
+            if self.receiver.poll():
+                outcome = self.receiver.recv()
+                self.task.join()
+                return outcome
+            if not alive:
+                return self.lost('worker process exited unexpectedly')
+        elif self.outcome:
+            return self.outcome[0]
+        elif not self.task.is_alive():
+            return self.lost('worker thread exited unexpectedly')
+
+        if time.time() > self.deadline:
+            if self.receiver is not None:
+                self.task.terminate()
+                self.task.join()
+            logger.critical(
+                '\tjob %s timed out after %s seconds',
+                self.job.qualified_name,
+                self.job.timeout,
+            )
+            return self.lost(
+                'timed out after %s seconds' % self.job.timeout,
+                status='timeout',
+            )
+
+    def lost(self, reason, status='failed'):
+        """Return the outcome of a job that did not report back"""
+        return status, None, reason + '\n', self.start_time, zoom.tools.now()
+
+    @property
+    def running(self):
+        """True if the worker is still running the job"""
+        return self.task.is_alive()
+
+
+def record_result(job, outcome, queued_time, release=True):
+    """Record the outcome of a job run"""
+    status, return_value, runtime_error, start_time, finish_time = outcome
+
+    job.app.site.activate()
+
+    job.last_run = start_time
+    job.last_run_result = return_value
+    job.last_run_status = status
+    job.last_finished = finish_time
+    job.save(release=release)
+
+    get_job_results().put(BackgroundJobResult(
+        job_qualified_name=job.qualified_name,
+        job_site=job.app.site.name,
+        job_name=job.name,
+        queued_time=queued_time,
+        start_time=start_time,
+        finish_time=finish_time,
+        wait_time=max((start_time - queued_time).total_seconds(), 0),
+        run_time=(finish_time - start_time).total_seconds(),
+        return_value=return_value,
+        run_status=status,
+        runtime_error=runtime_error
+    ))
+
+
+class JobPool:
+    """Bounded pool of workers running background jobs
+
+    Runs at most `workers` jobs at once, and at most `per_site` jobs
+    at once for any one site.  A job is skipped if a previous run of
+    the same job still holds its lease.
+
+    Worker threads that time out can't be stopped, so they are kept as
+    stragglers.  Their leases are renewed while they keep running and
+    released once they finish, so the job is not started again while
+    the old run is still going.
+    """
+
+    def __init__(self, workers=None, per_site=DEFAULT_JOBS_PER_SITE):
+        self.workers = workers or os.cpu_count() or 1
+        self.per_site = per_site
+        self.pending = collections.deque()
+        self.running = []
+        self.stragglers = []
+
+    def __len__(self):
+        return len(self.pending) + len(self.running)
+
+    def submit(self, job):
+        """Queue a job to be run when a worker is available"""
+        self.pending.append((job, zoom.tools.now()))
+
+    def start(self):
+        """Start as many pending jobs as the limits allow
+
+        Returns the jobs that were skipped because they are still running.
+        """
+        skipped = []
+        waiting = collections.deque()
+        site_load = collections.Counter(w.site_name for w in self.running)
+
+        while self.pending and len(self.running) < self.workers:
+            job, queued_time = self.pending.popleft()
+            site_name = job.app.site.name
+            if site_load[site_name] >= self.per_site:
+                waiting.append((job, queued_time))
+                continue
+            job.app.site.activate()
+            if not job.acquire():
+                logger.warning(
+                    'skipping job %s, previous run still in progress',
+                    job.qualified_name,
+                )
+                skipped.append(job)
+                continue
+            self.running.append(Worker(job, queued_time))
+            site_load[site_name] += 1
+
+        waiting.extend(self.pending)
+        self.pending = waiting
+        return skipped
+
+    def poll(self):
+        """Collect finished jobs and start pending ones
+
+        Returns the jobs that finished or were skipped.
+        """
+        done = []
+        for worker in list(self.running):
+            outcome = worker.collect()
+            if outcome is not None:
+                self.running.remove(worker)
+                straggling = worker.running
+                record_result(
+                    worker.job, outcome, worker.queued_time,
+                    release=not straggling,
+                )
+                if straggling:
+                    worker.renew_at = 0
+                    self.stragglers.append(worker)
+                done.append(worker.job)
+        self.check_stragglers()
+        return done + self.start()
+
+    def check_stragglers(self):
+        """Hold the leases of timed out threads until they finish"""
+        for worker in list(self.stragglers):
+            job = worker.job
+            if not worker.running:
+                self.stragglers.remove(worker)
+                job.app.site.activate()
+                job.release()
+                logger.warning('timed out job %s has finished', job.qualified_name)
+            elif time.time() > worker.renew_at:
+                job.app.site.activate()
+                job.renew()
+                worker.renew_at = time.time() + job.timeout / 2
+
+    def drain(self):
+        """Run all submitted jobs to completion"""
+        done = []
+        while self:
+            done.extend(self.poll())
+            if self:
+                time.sleep(POLL_INTERVAL)
+        return done
+
+
+def run_background_jobs(app, pool=None):
+    """Run the background jobs of an app that are due
+
+    Due jobs are submitted to the pool if one is provided, otherwise
+    they are run to completion before returning.
+    """
 
     reset_modules()
 
@@ -306,7 +961,10 @@ def run_background_jobs(app):
         app.name
     )
     tick_time = datetime.now()
-    failed = succeeded = total = 0
+    draining = pool is None
+    if draining:
+        pool = JobPool()
+    total = 0
 
     for job in jobs_list:
 
@@ -316,67 +974,145 @@ def run_background_jobs(app):
             if tick_time < job.next_run:
                 continue
 
-        # Execute the job.
-        logger.info('running background job %s', job.qualified_name)
-        start_time = zoom.tools.now()
+        pool.submit(job)
+        total += 1
 
-        # Run the jobs unit of work with safety.
-        return_value = runtime_error = str()
-        try:
+    logger.debug('submitted %d jobs', total)
 
-            save_cwd = os.getcwd()
-            os.chdir(app.path)
-            try:
-                try:
-                    return_value = job.uow()
-                finally:
-                    # re-activate the site in case the background
-                    # job has activated a different site
-                    site.activate()
-            finally:
-                os.chdir(save_cwd)
-
-            logger.debug('\treturned: %s', return_value)
-            status = 'success'
-            succeeded += 1
-        except BaseException as ex:
-            runtime_error = ''.join(traceback.format_exception(
-                ex.__class__, ex, ex.__traceback__
-            ))
-            logger.critical(
-                '\tjob %s failed!\n%s',
-                job.qualified_name,
-                runtime_error.join(('='*10 + '\n',)*2)
-            )
-            status = 'failed'
-            return_value = None
-            failed += 1
-        total += 1
+    if draining:
+        pool.drain()
 
-        finish_time = zoom.tools.now()
-
-        job.last_run = start_time
-        job.last_run_result = return_value
-        job.last_run_status = status
-        job.last_finished = finish_time
-        job.save()
-
-        job_log = store_of(BackgroundJobResult)
-        job_log.put(BackgroundJobResult(
-            job_qualified_name=job.qualified_name,
-            job_site=job.app.site.name,
-            job_name=job.name,
-            start_time=start_time,
-            finish_time=finish_time,
-            return_value=return_value,
-            run_status=status,
-            runtime_error=runtime_error
-        ))
 
-    logger.debug('ran %d jobs (%d succeeded, %d failed)', \
-            total, succeeded, failed)
+def modified_time(path):
+    """Return the modification time of a path or None if it is missing"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class Scheduler:
+    """Long running background job scheduler
+
+    Rather than rescanning every site and app on every tick, the
+    scheduler loads the job definitions of an instance once and keeps
+    them in a heap ordered by the time each job is next due.  It sleeps
+    until the next job is due and reloads the job definitions only when
+    a background.py module or an apps directory changes.
+
+    Jobs with no schedule are run every `delay` seconds.  Due jobs are
+    run in parallel by a JobPool.
+    """
+
+    def __init__(
+            self, instance, delay=1, workers=None,
+            per_site=DEFAULT_JOBS_PER_SITE
+        ):
+        self.instance = instance
+        self.delay = delay
+        self.sites = []
+        self.heap = []
+        self.loaded = set()
+        self.signature = None
+        self.watched = []
+        self.counter = itertools.count()
+        self.pool = JobPool(workers, per_site)
+
+    @property
+    def jobs(self):
+        """the currently scheduled jobs in the order they are due"""
+        return [job for _, _, job in sorted(self.heap, key=lambda a: a[:2])]
+
+    def fingerprint(self):
+        """the modification times of the files that define the jobs
+
+        Only the apps directories and the background.py files found when
+        the jobs were loaded are checked, so a tick costs a few stat
+        calls rather than a scan of every app.  Adding or removing an app
+        changes the modification time of its apps directory.
+        """
+        return [(path, modified_time(path)) for path in self.watched]
+
+    @property
+    def stale(self):
+        """True if the job definitions need to be reloaded"""
+        return self.signature is None or self.fingerprint() != self.signature
+
+    def load(self):
+        """Load the job definitions for all sites of the instance"""
+        reset_modules()
+        self.sites = list(self.instance.get_sites(skip_fails=True).values())
+        self.heap = []
+        self.loaded = set()
+        self.watched = []
+        join = os.path.join
+        for site in self.sites:
+            site.activate()
+            for apps_path in site.apps_paths:
+                self.watched.append(os.path.realpath(join(site.path, apps_path)))
+            for app in site.apps:
+                self.watched.append(join(app.path, 'background.py'))
+                for job in app.background_jobs:
+                    job.load()
+                    self.loaded.add(job)
+                    self.schedule(job)
+        self.signature = self.fingerprint()
+        logger.debug(
+            'scheduler loaded %d jobs for %d sites',
+            len(self.heap),
+            len(self.sites),
+        )
+
+    def schedule(self, job, ran=False):
+        """Add a job to the heap at the time it is next due"""
+        if job.schedule:
+            due = job.next_run
+        else:
+            due = datetime.now()
+        if ran:
+            # never come back sooner than the delay, which also keeps
+            # jobs skipped because they are still running from spinning
+            due = max(due, datetime.now() + timedelta(seconds=self.delay))
+        heapq.heappush(self.heap, (due, next(self.counter), job))
+
+    def run_pending(self):
+        """Submit the jobs that are due, returning the number submitted"""
+        tick_time = datetime.now()
+        n = 0
+        while self.heap and self.heap[0][0] <= tick_time:
+            _, _, job = heapq.heappop(self.heap)
+            self.pool.submit(job)
+            n += 1
+        for job in self.pool.poll():
+            if job in self.loaded:
+                self.schedule(job, ran=True)
+        return n
+
+    def wait_time(self):
+        """the number of seconds until the next job is due"""
+        delay = self.pool and POLL_INTERVAL or self.delay
+        if not self.heap:
+            return delay
+        due = (self.heap[0][0] - datetime.now()).total_seconds()
+        return max(0, min(due, delay))
+
+    def run(self, timeout=None):
+        """Run jobs as they come due
+
+        Runs until the timeout (in seconds) has elapsed or forever if no
+        timeout is provided.
+        """
+        start_time = time.time()
+        while True:
+            if self.stale:
+                self.load()
+            self.run_pending()
+            if timeout is not None and time.time() - start_time >= timeout:
+                break
+            time.sleep(self.wait_time())
 
 
 # Runtime inspection.
-def read_job_log():
-    return store_of(BackgroundJobResult).all()
+def read_job_log(site=None, job=None, limit=50, offset=0):
+    """Return a page of background job results, most recent first"""
+    return get_job_results().find(site, job, limit, offset)
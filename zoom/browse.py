@@ -4,6 +4,8 @@
 
 import datetime
 from decimal import Decimal
+import itertools
+import json
 import uuid
 
 import zoom
@@ -14,27 +16,46 @@ from zoom.utils import (
 
 
 def is_homogeneous(values):
-    """Return True if values have the same type"""
-    if len(values) <= 1:
-        return True
-    for n, value in enumerate(values):
+    """Return True if values have the same type
+
+    Each value that is not None sets a type that every truthy value
+    after it has to be an instance of.  Rather than rescan the rest of
+    the values from every position this keeps the (usually one) distinct
+    types seen so far, so it makes a single pass over the values.
+
+    >>> is_homogeneous([1, 2, None, 3])
+    True
+    >>> is_homogeneous([1, 2, 'three'])
+    False
+    >>> is_homogeneous(['one', 0, None])
+    True
+    >>> is_homogeneous([1, True])
+    True
+    >>> is_homogeneous(iter([True, 1]))
+    False
+    """
+    seen = []
+    for value in values:
+        if value and not all(isinstance(value, t) for t in seen):
+            return False
         if value is not None:
-            rest = values[n:]
-            col_type = type(value)
-            for other in rest:
-                if other and not isinstance(other, col_type):
-                    return False
+            value_type = type(value)
+            if value_type not in seen:
+                seen.append(value_type)
     return True
 
 
 def get_format(label, values):
-    """Return a suitable format string and alignment for columns"""
+    """Return a suitable format string and alignment for columns
+
+    >>> get_format('amount', [None, 1, 2])
+    ('{:,}', 'right')
+    >>> get_format('name', [None, None])
+    ('{}', 'left')
+    """
     alignment = 'left'
-    first_non_null = list(
-        map(type, [a for a in values if a is not None])
-    )[:1]
-    if first_non_null:
-        data_type = first_non_null[0]
+    data_type = next((type(a) for a in values if a is not None), None)
+    if data_type is not None:
         if label in ['id', '_id', 'userid']:
             return '{}', 'left'
         elif label.endswith(' ID'):
@@ -51,29 +72,124 @@ def get_format(label, values):
 
 
 def calculate_styling(columns, labels, items):
-    """Return calculated styling based on data content"""
-    # print(columns)
+    """Return calculated styling based on data content
+
+    >>> calculate_styling(['name', 'amount'], ['Name', 'Amount'], [
+    ...     ['one', 1],
+    ...     ['two', 'two'],
+    ... ])
+    [('{}', 'left'), ('{}', 'left')]
+    >>> calculate_styling(['name', 'amount'], ['Name', 'Amount'], [
+    ...     ['one', 1],
+    ...     ['two', 2],
+    ... ])
+    [('{}', 'left'), ('{:,}', 'right')]
+    """
     formats = []
-    rows = items
-    for col in range(len(columns)):
-        values = [row[col] for row in rows]
+    for col, values in enumerate(zip(*items)):
         if is_homogeneous(values):
             formats.append(get_format(labels[col], values))
         else:
             formats.append(('{}', 'left'))
+    if not formats:
+        formats = [get_format(label, []) for label in labels[:len(columns)]]
     return formats
 
 
+def getcol(item, index):
+    """Return the value of a column of an item"""
+    if isinstance(item, dict):
+        return item.get(index, None)
+    elif isinstance(item, (tuple, list)):
+        return item[index]
+    else:
+        return getattr(item, index)
+
+
+def value_formatter(fmt):
+    """Return a function that formats a value with a format string
+
+    >>> formatted = value_formatter('{:,}')
+    >>> formatted(1234)
+    '1,234'
+    >>> formatted('x')
+    "'x'"
+    """
+    format_value = fmt.format
+
+    def formatted(item):
+        try:
+            return format_value(item)
+        except BaseException:
+            return repr(item)
+
+    return formatted
+
+
+def cell_formatter(fmt):
+    """Return a function that formats a value as a table cell
+
+    >>> cell = cell_formatter('{:,}')
+    >>> cell(1234)
+    '<td nowrap>1,234</td>'
+    """
+    formatted = value_formatter(fmt)
+
+    def cell(item):
+        value = formatted(item)
+        if len(value) < 80:
+            return '<td nowrap>%s</td>' % value
+        return '<td>%s</td>' % value
+
+    return cell
+
+
 def browse(data, **kwargs):
-    """browse data"""
+    """browse data
+
+    >>> zoom.system.parts = zoom.Component()
+    >>> print(browse([dict(name='Pat', amount=1234)], table_id='t'))
+    <div class="baselist">
+    <BLANKLINE>
+    <table id="t">
+    <thead><tr>
+    <th>name</th>
+    <th>amount</th>
+    </tr></thead>
+    <tbody>
+    <tr id="row-1">
+    <td nowrap>Pat</td>
+    <td nowrap>1,234</td>
+    </tr>
+    </tbody>
+    </table>
+    <BLANKLINE>
+    </div>
+    """
+    return '\n'.join(iter_browse(data, **kwargs))
 
-    def getcol(item, index):
-        if isinstance(item, dict):
-            return item.get(index, None)
-        elif isinstance(item, (tuple, list)):
-            return item[index]
-        else:
-            return getattr(item, index)
+
+def iter_browse(data, **kwargs):
+    """browse data incrementally
+
+    Returns an iterator over the parts of the browse table so large
+    results can be streamed to the client rather than built up as one
+    string.  Column formats are worked out before the first part is
+    returned, from all of the rows or, if a sample size is given, from
+    the first rows only, in which case the remaining rows are consumed
+    from data as they are rendered.
+
+    If a url is given along with sortable, only the table shell is
+    rendered and DataTables fetches the rows from the url a page at a
+    time, sorted and filtered on the server (see zoom.tables).  The
+    labels or columns have to be given in that case.
+
+    >>> zoom.system.parts = zoom.Component()
+    >>> rows = ((n, n * 1000) for n in range(3))
+    >>> parts = iter_browse(rows, labels=['N', 'Amount'], sample=1)
+    >>> '<td nowrap>2,000</td>' in parts
+    True
+    """
 
     labels = kwargs.get('labels')
     fields = kwargs.get('fields')
@@ -84,8 +200,18 @@ def browse(data, **kwargs):
     footer = kwargs.get('footer', '')
     sortable = kwargs.get('sortable', False)
     table_id = kwargs.get('table_id', 'x'+uuid.uuid4().hex)
-
-    items = list(data)
+    sample = kwargs.get('sample')
+    url = sortable and kwargs.get('url')
+
+    if url:
+        items = []
+        remaining = iter(())
+    elif sample is None:
+        items = list(data)
+        remaining = iter(())
+    else:
+        remaining = iter(data)
+        items = list(itertools.islice(remaining, sample))
 
     if labels:
         if not columns:
@@ -135,7 +261,9 @@ def browse(data, **kwargs):
             else:
                 if len(items):
                     raise Exception('%s' % hasattr(items[0],'__len__'))
-                return '<div class="baselist"><table><tbody><tr><td>None</td></th></tbody></table></div>'
+                return iter([
+                    '<div class="baselist"><table><tbody><tr><td>None</td></th></tbody></table></div>'
+                ])
 
     columns = list(columns)
     labels = list(labels)
@@ -146,6 +274,7 @@ def browse(data, **kwargs):
     if fields:
         invisible_labels = []
         lookup = fields.as_dict()
+        getters = []
 
         for n, col in enumerate(columns):
 
@@ -156,6 +285,7 @@ def browse(data, **kwargs):
                 if visible:
                     alignments.append(field.alignment)
                     formatters.append(str)
+                    getters.append(field)
             else:
                 better_label = None
                 visible = True
@@ -163,6 +293,7 @@ def browse(data, **kwargs):
                 formatter, alignment = get_format(col, values)
                 alignments.append(alignment)
                 formatters.append(formatter)
+                getters.append(col)
 
             if better_label:
                 if n > len(labels):
@@ -177,19 +308,24 @@ def browse(data, **kwargs):
         for n in reversed(invisible_labels):
             del labels[n]
 
-        alist = []
-        for item in items:
-            fields.initialize(item)
-            flookup = fields.display_value()
-            row = [
-                flookup.get(col, getcol(item, col))
-                for col in columns
-                if col not in invisible
-            ]
-            alist.append(row)
+        def get_row(item):
+            # only the fields being displayed are initialized for each row
+            row = []
+            for getter in getters:
+                if isinstance(getter, str):
+                    row.append(getcol(item, getter))
+                else:
+                    if item:
+                        getter.initialize(item)
+                    row.append(getter.display_value())
+            return row
+
     else:
-        alist = [[getcol(item, col) for col in columns] for item in items]
-        styling = calculate_styling(columns, labels, alist)
+        def get_row(item):
+            return [getcol(item, col) for col in columns]
+
+        items = [get_row(item) for item in items]
+        styling = calculate_styling(columns, labels, items)
         formatters = [s[0] for s in styling]
         alignments = [s[1] for s in styling]
 
@@ -212,40 +348,6 @@ def browse(data, **kwargs):
 
     css = alignment_css
 
-    t = []
-    if labels:
-        t.append('<thead><tr>')
-
-        colnum = 0
-        for label in labels:
-            colnum += 1
-            t.append('<th>%s</th>' % label)
-
-        t.append('</tr></thead>')
-
-    t.append('<tbody>')
-
-    count = 0
-    for row in alist:
-        count += 1
-        t.append('<tr id="row-%s">' % (count))
-
-        for n, item in enumerate(row):
-            try:
-                value = formatters[n].format(item)
-            except BaseException:
-                value = repr(item)
-            wrapping = len(value) < 80 and ' nowrap' or ''
-            cell_tpl = '<td{}>%s</td>'.format(wrapping)
-            t.append(cell_tpl % value)
-
-        t.append('</tr>')
-
-    t.append('</tbody>')
-
-    if not count:
-        t.append('<tr><td colspan=%s>None</td></tr>' % len(labels))
-
     if not header:
         if title:
             header = '<div class="title">%s</div>' % title
@@ -255,7 +357,28 @@ def browse(data, **kwargs):
     header_body = header and ('<div class="header">%s</div>' % header) or ''
     footer_body = footer and ('<div class="footer">%s</div>' % footer) or ''
 
-    if sortable:
+    if url:
+        zoom.requires('datatables')
+        js = """
+            $('#{}').DataTable( {{
+            "serverSide": true,
+            "processing": true,
+            "ajax": {},
+            "pageLength": {},
+            "lengthMenu": [[25, 50, 100, 500], [25, 50, 100, 500]],
+            "dom": '<if>rt<lp><"clear">',
+            "oLanguage": {{
+            "sSearch": "Filter"
+            }}
+        }} );
+        """.format(table_id, json.dumps(url), kwargs.get('page_size', 25))
+        css += """
+        .dataTables_filter label {
+            font-weight: normal;
+        }
+        """
+        zoom.Component(css=css, js=js).render()
+    elif sortable:
         zoom.requires('datatables')
         js = """
             $('#{}').DataTable( {{
@@ -276,14 +399,41 @@ def browse(data, **kwargs):
     else:
         zoom.Component(css=css).render()
 
-    table_tag = '<table id="{}">'.format(table_id)
+    cells = [cell_formatter(f) for f in formatters]
 
-    result = '\n'.join(
-        ['<div class="baselist">'] +
-        [header_body] +
-        [table_tag] + t + ['</table>'] +
-        [footer_body] +
-        ['</div>']
-    )
+    if fields:
+        rows = map(get_row, itertools.chain(items, remaining))
+    else:
+        rows = itertools.chain(items, map(get_row, remaining))
+
+    def render():
+        yield '<div class="baselist">'
+        yield header_body
+        yield '<table id="{}">'.format(table_id)
+
+        if labels:
+            yield '<thead><tr>'
+            for label in labels:
+                yield '<th>%s</th>' % label
+            yield '</tr></thead>'
+
+        yield '<tbody>'
+
+        count = 0
+        for row in rows:
+            count += 1
+            yield '<tr id="row-%s">' % count
+            for cell, item in zip(cells, row):
+                yield cell(item)
+            yield '</tr>'
+
+        yield '</tbody>'
+
+        if not count and not url:
+            yield '<tr><td colspan=%s>None</td></tr>' % len(labels)
+
+        yield '</table>'
+        yield footer_body
+        yield '</div>'
 
-    return result
+    return render()
@@ -1,4 +1,3 @@
-
 import json
 
 from decimal import Decimal
@@ -6,6 +5,27 @@ from uuid import uuid4
 
 import zoom
 
+RAW_ROWS_LIMIT = 10000
+
+# aggregator: (measures computed on the server, pivottable.js aggregator
+# that combines them correctly for cells and totals)
+AGGREGATORS = {
+    'Count': (['Count'], 'Integer Sum'),
+    'Sum': (['Sum'], 'Sum'),
+    'Integer Sum': (['Sum'], 'Integer Sum'),
+    'Average': (['Sum', 'Count'], 'Sum over Sum'),
+    'Minimum': (['Minimum'], 'Minimum'),
+    'Maximum': (['Maximum'], 'Maximum'),
+}
+
+SQL_MEASURES = {
+    'Count': 'count(*)',
+    'Sum': 'sum({})',
+    'Minimum': 'min({})',
+    'Maximum': 'max({})',
+}
+
+
 def dumps(data, *args, **kwargs):
     """Dump data to json"""
 
@@ -20,50 +40,233 @@ def dumps(data, *args, **kwargs):
     return json.dumps(data, default=handler, *args, **kwargs)
 
 
+def nvl(value):
+    """Change None value to a string for JS"""
+    return 'None' if value is None else value
+
+
+class Cube(object):
+    """Aggregates rows in a single pass
+
+    Rows are hashed on their dimension values and the measures needed
+    for the aggregator are accumulated for each combination.
+
+    >>> cube = Cube(['app'], 'elapsed', 'Average')
+    >>> for row in [('a', 1), ('a', 3), ('b', 5), ('b', None)]:
+    ...     cube.add(row, ['app', 'elapsed'])
+    >>> cube.records()
+    [{'app': 'a', 'Sum': 4, 'Count': 2}, {'app': 'b', 'Sum': 5, 'Count': 1}]
+    """
+
+    def __init__(self, dimensions, value, aggregator_name):
+        if aggregator_name not in AGGREGATORS:
+            raise ValueError('unsupported aggregator %r' % aggregator_name)
+        self.dimensions = list(dimensions)
+        self.value = value
+        self.measures = AGGREGATORS[aggregator_name][0]
+        self.counts_rows = aggregator_name == 'Count'
+        self.cells = {}
+        self.positions = None
+
+    def add(self, row, names):
+        """add a row with the given column names"""
+        if self.positions is None:
+            self.positions = [names.index(d) for d in self.dimensions]
+            self.value_position = (
+                names.index(self.value) if self.value in names else None
+            )
+        key = tuple(row[i] for i in self.positions)
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = dict(
+                Count=0, Sum=0, Minimum=None, Maximum=None
+            )
+        if self.counts_rows:
+            cell['Count'] += 1
+            return
+        if self.value_position is None:
+            return
+        value = row[self.value_position]
+        if value is None:
+            return
+        cell['Count'] += 1
+        cell['Sum'] += value
+        if cell['Minimum'] is None or value < cell['Minimum']:
+            cell['Minimum'] = value
+        if cell['Maximum'] is None or value > cell['Maximum']:
+            cell['Maximum'] = value
+
+    def records(self):
+        """return the aggregated cube as a list of dicts"""
+        return [
+            dict(
+                dict(zip(self.dimensions, map(nvl, key))),
+                **{m: cell[m] for m in self.measures}
+            )
+            for key, cell in self.cells.items()
+        ]
+
+
+def quoted(name):
+    return '`%s`' % name.replace('`', '``')
+
+
+def aggregate_query(sql, dimensions, value, aggregator_name):
+    """Return a query that aggregates the rows of another query
+
+    >>> print(aggregate_query('select * from log', ['app'], 'elapsed', 'Average'))
+    select `app`, sum(`elapsed`) as `Sum`, count(`elapsed`) as `Count` from (select * from log) q group by `app`
+    """
+    if aggregator_name not in AGGREGATORS:
+        raise ValueError('unsupported aggregator %r' % aggregator_name)
+    measures = AGGREGATORS[aggregator_name][0]
+    columns = [quoted(d) for d in dimensions]
+    for measure in measures:
+        if measure == 'Count' and aggregator_name != 'Count':
+            expression = 'count({})'
+        else:
+            expression = SQL_MEASURES[measure]
+        columns.append('%s as %s' % (
+            expression.format(value and quoted(value)), quoted(measure)
+        ))
+    cmd = 'select %s from (%s) q' % (', '.join(columns), sql)
+    if dimensions:
+        cmd += ' group by ' + ', '.join(quoted(d) for d in dimensions)
+    return cmd
+
+
 class PivotTable(zoom.DynamicComponent):
     """
         Pivot Table
         See documentation on options:
         https://github.com/nicolaskruchten/pivottable/wiki/Parameters#options-object-for-pivotui
+
+        Up to `threshold` raw rows are sent to the browser, where they
+        can be pivoted freely.  Larger data sets are aggregated on the
+        server by the requested rows, columns and aggregator and only the
+        resulting cube is sent.  Use `aggregate` to force either mode and
+        PivotTable.query to have the database do the aggregation.
     """
 
     def __init__(self, data, rows=[], columns=[], values=[],
                  aggregator_name='Count',
                  renderer_name='Table', row_order='key_a_to_z',
                  col_order='key_a_to_z', show_ui=True,
-                 uid=uuid4().hex, *args, **kwargs):
+                 uid=uuid4().hex, aggregate=None, threshold=RAW_ROWS_LIMIT,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.data = self.prepare_data(data)
         self.rows = rows
         self.columns = columns
         self.values = values
         self.aggregator_name = aggregator_name
+        self.aggregate = aggregate
+        self.threshold = threshold
         self.renderer_name = renderer_name
         self.row_order = row_order
         self.col_order = col_order
         self.show_ui = 'true' if show_ui else 'false'
         self.selector = uid
+        self.data = self.prepare_data(data)
+
+    @classmethod
+    def query(cls, db, sql, *args, **kwargs):
+        """Pivot the result of a query, aggregating in the database
+
+        >>> db = zoom.database.database('sqlite3', database=':memory:')
+        >>> db('create table log (app text, status text, elapsed int)')
+        >>> ids = [
+        ...     db('insert into log values (%s, %s, %s)', app, 'C', n)
+        ...     for n, app in enumerate('aabbb')
+        ... ]
+        >>> table = PivotTable.query(
+        ...     db, 'select * from log', rows=['app'], columns=['status'],
+        ...     values=['elapsed'], aggregator_name='Sum', threshold=2,
+        ... )
+        >>> json.loads(table.data)
+        [{'app': 'a', 'status': 'C', 'Sum': 1}, {'app': 'b', 'status': 'C', 'Sum': 9}]
+        """
+        threshold = kwargs.get('threshold', RAW_ROWS_LIMIT)
+        aggregate = kwargs.pop('aggregate', None)
+        if aggregate is None:
+            count = db('select count(*) from (%s) q' % sql, *args).first()[0]
+            aggregate = count > threshold
+        if not aggregate:
+            return cls(db(sql, *args), aggregate=False, **kwargs)
+        dimensions = kwargs.get('rows', []) + kwargs.get('columns', [])
+        values = kwargs.get('values', [])
+        cmd = aggregate_query(
+            sql, dimensions, values and values[0],
+            kwargs.get('aggregator_name', 'Count'),
+        )
+        table = cls([], aggregate=False, **kwargs)
+        result = db(cmd, *args)
+        names = [col[0] for col in result.cursor.description]
+        table.data = dumps([
+            dict(zip(names, map(nvl, row))) for row in result
+        ])
+        table.use_cube()
+        return table
+
+    def use_cube(self):
+        """Have pivottable.js combine the measures of an aggregated cube"""
+        measures, aggregator_name = AGGREGATORS[self.aggregator_name]
+        self.values = measures
+        self.aggregator_name = aggregator_name
 
     def prepare_data(self, data):
-        """ Prepare the data for the pivottable library."""
-
-        if hasattr(data, 'cursor'):
-            # Result Object
-            fields = list(col[0] for col in data.cursor.description)
-            records = (list(data))
-            data = [dict(zip(fields, row)) for row in records]
-            # Change None value to a string for JS
-            for _dict in data:
-                for k, v in _dict.items():
-                    if v is None:
-                        _dict[k] = 'None'
-        return dumps(data)
+        """ Prepare the data for the pivottable library.
+
+        Rows are read once.  They are kept as they are until there are
+        more than threshold of them, at which point they are aggregated
+        instead.
+        """
+
+        if not hasattr(data, 'cursor'):
+            return dumps(data)
+
+        # Result Object
+        fields = list(col[0] for col in data.cursor.description)
+        aggregate = (
+            self.aggregate is not False and
+            self.aggregator_name in AGGREGATORS
+        )
+        if aggregate and self.aggregate:
+            limit = -1
+        else:
+            limit = self.threshold
+
+        raw = []
+        cube = None
+        for row in data:
+            if cube is not None:
+                cube.add(row, fields)
+            elif not aggregate or len(raw) < limit:
+                raw.append(row)
+            else:
+                cube = Cube(
+                    self.rows + self.columns,
+                    self.values and self.values[0],
+                    self.aggregator_name,
+                )
+                for buffered in raw:
+                    cube.add(buffered, fields)
+                cube.add(row, fields)
+                raw = None
+
+        if cube is not None:
+            self.use_cube()
+            return dumps(cube.records())
+
+        return dumps([dict(zip(fields, map(nvl, row))) for row in raw])
+
 
 class PivotWidget(zoom.DynamicComponent):
     """
     Pivot Widget
 
+    Renders a PivotTable, whether it holds raw rows or an aggregated
+    cube, with the pivottable.js library.
     """
     def format(self, chart):
         """Format a Chart"""
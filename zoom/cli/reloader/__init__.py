@@ -8,6 +8,7 @@ import flask
 import zoom
 import zoom.request
 import zoom.middleware
+import zoom.response
 
 
 class CustomBlueprint(flask.Blueprint):
@@ -77,6 +78,8 @@ def setup():
 def get_response(value):
     response = value.as_wsgi()
     status, headers, body = response
+    if hasattr(body, 'read'):
+        body = zoom.response.iter_file(body)
     return flask.make_response(
         body, status, headers
     )
@@ -10,15 +10,20 @@ Options:
   -t, --timeout=<val>         The amount of time to run background jobs for
                               before stopping. A value of 0 is identical to
                               specifying --repeat. In seconds.
-  -d, --delay=<val>           When running jobs repeatedly, the delay between
-                              ticks. Defaults to 1 second.
+  -d, --delay=<val>           When running jobs repeatedly, the longest time
+                              to sleep between checks for due jobs and
+                              changed background modules. Defaults to 1
+                              second.
+
+When running repeatedly, jobs are loaded once and run by a persistent
+scheduler that reloads them only when a background.py module changes.
 """
 
-import time
 import logging
 
 from docopt import docopt
 
+from zoom.background import Scheduler
 from zoom.instances import Instance
 from zoom.cli.common import LOGGING_OPTIONS, setup_logging
 from zoom.cli.utils import resolve_path_with_context, describe_options, \
@@ -64,26 +69,12 @@ def run():
             timeout, delay
         )
 
-    # Mark start.
-    start_time = time.time()
     try:
-        while True:
-
+        if only_once and not indefinite:
             instance.run_background_jobs()
-
-            # Check whether we're done.
-            if not indefinite and only_once:
-                break
-            elapsed_time = time.time() - start_time
-            if not indefinite and elapsed_time >= timeout:
-                break
-
-            # Sleep the delay in 1 second intervals to allow nice SIGINT
-            # pickup.
-            sleep_time = 0
-            while sleep_time < delay:
-                time.sleep(1)
-                sleep_time += 1
+        else:
+            scheduler = Scheduler(instance, delay=delay)
+            scheduler.run(timeout=None if indefinite else timeout)
 
     except KeyboardInterrupt:
         print('\rstopped')
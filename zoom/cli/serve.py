@@ -1,4 +1,4 @@
-"""serve: Serve an instance for development.
+"""serve: Serve an instance.
 
 Usage: zoom serve [options] [<instance>]
 
@@ -9,6 +9,12 @@ Options:
   -n, --noop                  Use special debugging middleware stack.
   -u, --user=<val>            The user to run as.
   -r, --reloader              Whether to use the reloader.
+  -P, --prefork               Serve with a pre-forking multi-process server
+                              for production use.  Send it SIGHUP to reload.
+  -w, --workers=<val>         The number of worker processes to prefork.
+                              Defaults to the number of CPUs.
+  -m, --max-requests=<val>    The number of requests a worker serves before it
+                              is replaced.  Defaults to 1000.
 
 Parameters:
   instance                    The Zoom instance directory. Defaults to the
@@ -19,7 +25,7 @@ from docopt import docopt
 
 import zoom
 from zoom import middleware
-from zoom.server import WSGIApplication
+from zoom.server import WSGIApplication, run_prefork
 from zoom.cli.common import LOGGING_OPTIONS, setup_logging
 from zoom.cli.utils import (
     describe_options, finish
@@ -50,9 +56,28 @@ def serve(_arguments=None):
     except ValueError:
         finish(True, 'Invalid port %s'%port)
 
+    prefork = arguments.get('--prefork')
+    try:
+        workers = int(arguments.get('--workers') or 0) or None
+        max_requests = arguments.get('--max-requests')
+        max_requests = None if max_requests is None else int(max_requests)
+    except ValueError:
+        finish(True, 'Invalid number of workers or requests')
+
     # Create the application.
     if arguments['--verbose']:
         print('Serving Zoom instance at %r' % instance_path)
+    if prefork:
+        try:
+            run_prefork(
+                port, instance_path, handlers, user, workers, max_requests
+            )
+        except (PermissionError, OSError) as err:
+            finish(True, (
+                '%s: is port %s in use?\n'
+                'Use -p or --port to specify another port'
+            )%(err.__class__.__name__, port))
+        return
     app = WSGIApplication(instance=instance_path, handlers=handlers, username=user)
     try:
         # Run.
@@ -2,11 +2,16 @@
     zoom.collect
 """
 
+import collections
 import io
 import logging
 import os
+import time
+import uuid
+import weakref
 
 import zoom
+import zoom.queues
 from zoom.browse import browse
 from zoom.buckets import Bucket
 from zoom.context import context
@@ -130,24 +135,33 @@ class CollectionView(View):
         ] or []
 
         logger = logging.getLogger(__name__)
+        more = False
+        try:
+            page_number = max(int(kwargs.get('page') or 1), 1)
+        except ValueError:
+            page_number = 1
         if q:
             title = 'Selected ' + c.title
-            records = c.search(q)
+            items = self._prepare(c.search(q))
         else:
             has_many_records = c.has_many_records
             logger.debug('has many records: %r', has_many_records)
             if has_many_records and not kwargs.get('all'):
                 title = 'Most Recently Updated ' + c.title
-                records = self._get_recent(15)
+                items = self._prepare(self._get_recent(15))
                 actions.append(('Show All', c.url + '?all=1'))
             else:
                 title = c.title
-                records = c.store
+                items, more = self._get_page(page_number)
+                if page_number > 1:
+                    actions.append(('Previous', zoom.helpers.url_for(
+                        c.url, all=1, page=page_number - 1
+                    )))
+                if more:
+                    actions.append(('Next', zoom.helpers.url_for(
+                        c.url, all=1, page=page_number + 1
+                    )))
 
-        authorized = (i for i in records if user.can('read', i))
-        filtered = c.filter and filter(c.filter, authorized) or authorized
-        items = sorted(filtered, key=c.order, reverse=c.is_reversed())
-        items = c.sorter and c.sorter(items) or items
         num_items = len(items)
 
         if num_items != 1:
@@ -163,15 +177,15 @@ class CollectionView(View):
             footer = '{:,} {} found in search of {:,} {}'.format(
                 num_items,
                 footer_name,
-                len(c.store),
+                c.record_count,
                 c.title.lower(),
             )
         else:
-            if has_many_records:
+            if has_many_records or more or page_number > 1:
                 footer = '{:,} {} shown of {:,} {}'.format(
                     num_items,
                     footer_name,
-                    len(c.store),
+                    c.record_count,
                     c.title.lower(),
                 )
             else:
@@ -188,6 +202,55 @@ class CollectionView(View):
 
         return page(content, title=title, actions=actions, search=q)
 
+    def _prepare(self, records):
+        """Return the readable records in display order"""
+        c = self.collection
+        user = c.user
+        authorized = (i for i in records if user.can('read', i))
+        filtered = c.filter and filter(c.filter, authorized) or authorized
+        items = sorted(filtered, key=c.order, reverse=c.is_reversed())
+        return c.sorter and c.sorter(items) or items
+
+    def _get_page(self, number):
+        """Return a page of readable records and whether there are more
+
+        Collections show all of their records unless they set a
+        page_size.  When the collection is sorted by name the store
+        returns the keys in order a batch at a time, so records are
+        loaded, authorized and filtered only until the page is full.
+        Otherwise every record is loaded and sorted first.
+        """
+        c = self.collection
+        size = c.page_size
+        if not size:
+            return self._prepare(c.store), False
+
+        start = (number - 1) * size
+        wanted = start + size + 1
+        keys = c.ordered_keys(0, wanted)
+        if keys is None:
+            items = self._prepare(c.store)
+            return items[start:start + size], len(items) > start + size
+
+        user = c.user
+        items = []
+        offset = 0
+        while keys:
+            records = {record._id: record for record in c.store.get(keys)}
+            for key in keys:
+                record = records.get(key)
+                if (
+                        record is not None and
+                        user.can('read', record) and
+                        (not c.filter or c.filter(record))
+                ):
+                    items.append(record)
+            if len(items) >= wanted or len(keys) < wanted:
+                break
+            offset += len(keys)
+            keys = c.ordered_keys(offset, wanted)
+        return items[start:start + size], len(items) > start + size
+
     def clear(self):
         """Clear the search"""
         return redirect_to('/' + '/'.join(self.collection.request.route[:-1]))
@@ -581,8 +644,130 @@ class CollectionController(Controller):
         return page('complete!', title='Reindex')
 
 
+SEARCH_VERSION_KIND = 'system_search_version'
+SEARCH_INDEX_MAX_AGE = 300
+
+_search_indexes = {}
+_local_search_indexes = weakref.WeakKeyDictionary()
+
+
+def get_search_version(store):
+    """Return a value that changes when a collection store changes
+
+    Combines the version recorded by search_changed with the highest
+    key in the store so that records added outside of a collection are
+    noticed as well.
+    """
+    db = store.db
+    if isinstance(store, EntityStore):
+        newest = 'select max(row_id) from attributes where kind=%s'
+        args = [store.kind]
+    else:
+        newest = 'select max(`{}`) from `{}`'.format(store.key, store.kind)
+        args = []
+    cmd = """
+        select
+            ({}),
+            (select max(value) from attributes where kind=%s and attribute=%s)
+    """.format(newest)
+    return tuple(db(cmd, *(args + [SEARCH_VERSION_KIND, store.kind])).first())
+
+
+def search_changed(store, create=True):
+    """Record that the records of a collection store have changed
+
+    Invalidates the search indexes for the store in every other process
+    using the database.  The version is only recorded once an index has
+    been built for the store, so with create=False nothing is written
+    for stores that have never been searched.
+    """
+    db = store.db
+    token = uuid.uuid4().hex
+    db(
+        'update attributes set value=%s where kind=%s and attribute=%s',
+        token, SEARCH_VERSION_KIND, store.kind
+    )
+    if create and not db.rowcount:
+        db(
+            'insert into attributes ('
+            '    kind, row_id, attribute, datatype, value'
+            ') values (%s,%s,%s,%s,%s)',
+            SEARCH_VERSION_KIND, 0, store.kind, 'str', token
+        )
+
+
+class SearchIndex(object):
+    """In memory search index
+
+    Keeps the searchable text of each record along with postings of the
+    records that contain each token.  Search terms never contain white
+    space, so a term is found in a record's text exactly when it is found
+    in one of the record's tokens, and only the distinct tokens need to
+    be scanned for each search.
+
+    >>> index = SearchIndex()
+    >>> index.put(1, 'joe zzzzz;123 somewhere st')
+    >>> index.put(2, 'sally;123 special st')
+    >>> index.find(['123', 'st'])
+    [1, 2]
+    >>> index.find(['zzz', 'st;'])
+    []
+    >>> index.find(['st;12'])
+    []
+    >>> index.find(['zzzzz;1'])
+    [1]
+    >>> index.delete(1)
+    >>> index.find(['123'])
+    [2]
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.created = time.time()
+        self.texts = {}
+        self.postings = {}
+
+    def put(self, key, text):
+        """index the text of a record"""
+        self.delete(key)
+        self.texts[key] = text
+        for token in set(text.split()):
+            self.postings.setdefault(token, set()).add(key)
+
+    def delete(self, key):
+        """remove a record from the index"""
+        text = self.texts.pop(key, None)
+        if text is not None:
+            for token in set(text.split()):
+                keys = self.postings.get(token)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.postings[token]
+
+    def find(self, terms):
+        """return the sorted keys of records containing every term"""
+        found = None
+        for term in sorted(terms, key=len, reverse=True):
+            keys = set()
+            for token, postings in self.postings.items():
+                if term in token:
+                    keys |= postings
+            found = keys if found is None else found & keys
+            if not found:
+                return []
+        return sorted(found or [])
+
+
 class RawSearch(object):
-    """Raw Data Search"""
+    """Raw Data Search
+
+    Searches are answered from an in memory index of the searchable
+    text of each record.  The index is built the first time the
+    collection is searched, kept up to date by the add, update and
+    delete hooks, and rebuilt if the store is changed by another
+    process.
+    """
 
     def __init__(self, collection):
         self.collection = collection
@@ -593,62 +778,125 @@ class RawSearch(object):
             self.collection.name
         )
 
+    def searchable(self, record):
+        """Return the searchable text of a record"""
+        return ';'.join([
+            str(value).lower()
+            for key, value in record.items()
+            if not key.startswith('_')
+        ])
+
+    def _cache(self):
+        """Return the index cache and key for the collection store"""
+        store = self.collection.store
+        db = getattr(store, 'db', None)
+        if db is None or not getattr(store, 'kind', None):
+            return None, None
+        key = db.cache_key()
+        cache = _local_search_indexes if key is db else _search_indexes
+        return cache.setdefault(key, {}), (self.__class__.__name__, store.kind)
+
+    def index(self):
+        """Return the search index, building it if needed"""
+        cache, key = self._cache()
+        if cache is None:
+            return None
+        store = self.collection.store
+        version = get_search_version(store)
+        index = cache.get(key)
+        if (
+                index is None or index.version != version or
+                time.time() - index.created > SEARCH_INDEX_MAX_AGE
+        ):
+            if version[1] is None:
+                # start recording changes now that the store is indexed
+                search_changed(store)
+                version = get_search_version(store)
+            index = SearchIndex(version)
+            for record in store:
+                index.put(record._id, self.searchable(record))
+            cache[key] = index
+            logger = logging.getLogger(__name__)
+            logger.debug(
+                'indexed %s %s records', len(index.texts), store.kind
+            )
+        return index
+
+    def changed(self, key, record=None):
+        """Apply a change to the index and tell other processes
+
+        Stores that have never been indexed cost a single update that
+        writes nothing.
+        """
+        cache, cache_key = self._cache()
+        if cache is None:
+            return
+        store = self.collection.store
+        index = cache.get(cache_key)
+        if index is None:
+            search_changed(store, create=False)
+            return
+        # the change itself can move the highest key so only the version
+        # recorded by search_changed tells whether the index is current
+        current = get_search_version(store)[1] == index.version[1]
+        search_changed(store, create=False)
+        if current:
+            if record is None:
+                index.delete(key)
+            else:
+                index.put(key, self.searchable(record))
+            index.version = get_search_version(store)
+        else:
+            cache.pop(cache_key, None)
+
     def search(self, text):
         """Return records that match raw search text"""
 
-        def matches(item, terms):
-            """match a search by field values"""
-            v = ';'.join([
-                str(value).lower()
-                for key, value in item.items()
-                if not key.startswith('_')
-            ])
-            return terms and not any(t not in v for t in terms)
-
         terms = text and [t.lower() for t in text.split()]
+        if not terms:
+            return []
+
+        index = self.index()
+        if index is None:
+            return [
+                record for record in self.collection.store
+                if not any(t not in self.searchable(record) for t in terms)
+            ]
 
-        return [
-            record for record in self.collection.store
-            if matches(record, terms)
-        ]
+        keys = index.find(terms)
+        records = self.collection.store.get(keys)
+        return sorted(records, key=lambda record: record._id)
 
     def add(self, key, values):
         """Add record values to index"""
-        pass
+        self.changed(key, self.collection.store.get(key))
 
     def update(self, key, values):
         """Update indexed record values"""
-        pass
+        self.changed(key, self.collection.store.get(key))
 
     def delete(self, key):
         """Delete indexed record values"""
-        pass
+        self.changed(key)
 
     def reindex(self):   # pragma: no cover
+        """Discard the index so it is rebuilt by the next search"""
+        cache, key = self._cache()
+        if cache is not None:
+            cache.pop(key, None)
         zoom.alerts.warning('%s does not use indexing' % self.__class__.__name__)
 
 
 class BasicSearch(RawSearch):
-    """Provides basic unindexed field aware search capability"""
-
-    def search(self, text):
-        """Return records that match search text"""
-
-        def matches(item, terms):
-            """match a search by field values"""
-            fields.initialize(item)
-            v = ';'.join(
-                map(str, fields.as_searchable())
-            ).lower()
-            return terms and not any(t not in v for t in terms)
+    """Provides basic field aware search capability"""
 
+    def searchable(self, record):
+        """Return the searchable text of a record"""
         fields = self.collection.fields
-        terms = text and [t.lower() for t in text.split()]
-
-        return [
-            record for record in self.collection.store
-            if matches(record, terms)
-        ]
+        fields.initialize(record)
+        return ';'.join(
+            map(str, fields.as_searchable())
+        ).lower()
 
 
 def as_tokens(values, max_len=20):
@@ -664,9 +912,415 @@ def as_tokens(values, max_len=20):
     return tokens
 
 
+def token_counts(values, max_len=20):
+    """Return the tokens in values along with how often they occur
+
+    >>> sorted(token_counts(['a test', 'A Test of tests']).items())
+    [('a', 2), ('of', 1), ('test', 2), ('tests', 1)]
+    """
+    return collections.Counter(
+        t[:max_len] for v in values
+        for t in str(v).lower().split()
+    )
+
+
+def trigrams(token):
+    """Return the trigrams of a token
+
+    >>> sorted(trigrams('tests'))
+    ['est', 'sts', 'tes']
+    >>> trigrams('ab')
+    set()
+    """
+    return set(token[i:i+3] for i in range(len(token) - 2))
+
+
+def chunked(items, size):
+    """Return items in lists of at most size items
+
+    >>> list(chunked([1, 2, 3, 4, 5], 2))
+    [[1, 2], [3, 4], [5]]
+    """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def upper_bound(prefix):
+    """Return the smallest string greater than all strings with prefix
+
+    >>> upper_bound('abc')
+    'abd'
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+SEARCH_INDEX_TOPIC = 'search_index'
+
+
+def search_index_topic(db, kind):
+    """Return the queue topic for index updates to a kind of record"""
+    return zoom.queues.Queues(db).topic(SEARCH_INDEX_TOPIC + '.' + kind, -1)
+
+
+class SearchIndexState(Record):
+    """Progress of a collection reindex and of queued index updates"""
+
+
+class TokenIndex(object):
+    """Token index for one kind of record
+
+    Tokens are kept in the search_tokens table, one row per distinct
+    token in each record along with the number of times it occurs, and
+    indexed on (kind, token, row_id).  Terms are matched as prefixes by
+    scanning a range of that index.  Matches inside tokens are found
+    through the search_trigrams table which maps each three character
+    sequence to the tokens that contain it.
+    """
+
+    max_token_len = 20
+    use_trigrams = True
+    chunk_size = 500
+
+    def __init__(self, db, kind):
+        self.db = db
+        self.kind = kind
+        tables = db.get_tables()
+        if 'search_tokens' not in tables:
+            self.create_tables('tokens' in tables)
+
+    def create_tables(self, migrate=False):
+        """Create the index tables
+
+        Tokens from the original unindexed tokens table are carried over
+        so existing collections keep working without a reindex.
+        """
+        db = self.db
+        sqlite = isinstance(db, zoom.database.Sqlite3Database)
+        db("""
+            create table if not exists search_tokens (
+                kind varchar(100) not null,
+                token varchar({size}) not null,
+                row_id int unsigned not null,
+                frequency int not null
+            )
+            """.format(size=self.max_token_len))
+        db("""
+            create index search_tokens_token
+            on search_tokens (kind, token, row_id)
+            """)
+        db("""
+            create index search_tokens_row on search_tokens (kind, row_id)
+            """)
+        db("""
+            create table if not exists search_trigrams (
+                kind varchar(100) not null,
+                trigram {char}(3) not null,
+                token varchar({size}) not null,
+                primary key (kind, trigram, token)
+            )
+            """.format(
+                size=self.max_token_len,
+                char=sqlite and 'varchar' or 'char'
+            ))
+        if migrate:
+            db("""
+                insert into search_tokens
+                select kind, token, row_id, count(*)
+                from tokens
+                group by kind, token, row_id
+                """)
+            rows = db('select distinct kind, token from search_tokens')
+            self.add_trigrams([
+                (kind, trigram, token)
+                for kind, token in rows
+                for trigram in trigrams(token)
+            ])
+
+    def add_trigrams(self, rows):
+        """Add trigram rows that are not already present"""
+        if self.use_trigrams and rows:
+            sqlite = isinstance(self.db, zoom.database.Sqlite3Database)
+            self.db.execute_many(
+                (sqlite and 'insert or ignore' or 'insert ignore') +
+                ' into search_trigrams values (%s, %s, %s)',
+                rows
+            )
+
+    def insert(self, entries):
+        """Insert tokens for a list of (key, values) entries"""
+        rows, grams = [], set()
+        for key, values in entries:
+            for token, count in token_counts(values, self.max_token_len).items():
+                rows.append((self.kind, token, key, count))
+                grams.update((self.kind, t, token) for t in trigrams(token))
+        if rows:
+            self.db.execute_many(
+                'insert into search_tokens values (%s, %s, %s, %s)',
+                rows
+            )
+        self.add_trigrams(sorted(grams))
+
+    def tokens_of(self, keys):
+        """Return the tokens indexed for a list of keys"""
+        result = set()
+        for chunk in chunked(keys, self.chunk_size):
+            result.update(t for t, in self.db(
+                'select distinct token from search_tokens '
+                'where kind=%s and row_id in (%s)' % (
+                    '%s', ','.join(['%s'] * len(chunk))
+                ),
+                self.kind,
+                *chunk
+            ))
+        return result
+
+    def remove(self, keys):
+        """Remove the token rows for a list of keys"""
+        for chunk in chunked(keys, self.chunk_size):
+            self.db(
+                'delete from search_tokens where kind=%s and row_id in (%s)' % (
+                    '%s', ','.join(['%s'] * len(chunk))
+                ),
+                self.kind,
+                *chunk
+            )
+
+    def prune(self, tokens):
+        """Remove the trigrams of tokens that are no longer indexed"""
+        if not self.use_trigrams:
+            return
+        for chunk in chunked(sorted(tokens), self.chunk_size):
+            self.db(
+                'delete from search_trigrams '
+                'where kind=%s and token in (%s) and not exists ('
+                '    select 1 from search_tokens t'
+                '    where t.kind=search_trigrams.kind'
+                '    and t.token=search_trigrams.token'
+                ')' % ('%s', ','.join(['%s'] * len(chunk))),
+                self.kind,
+                *chunk
+            )
+
+    def delete(self, keys):
+        """Delete tokens for a list of keys"""
+        if keys:
+            tokens = self.tokens_of(keys)
+            self.remove(keys)
+            self.prune(tokens)
+
+    def replace(self, entries):
+        """Replace the tokens for a list of (key, values) entries"""
+        keys = [key for key, _ in entries]
+        tokens = self.tokens_of(keys)
+        self.remove(keys)
+        self.insert([(key, values) for key, values in entries if values is not None])
+        self.prune(tokens)
+
+    def keys(self):
+        """Return the set of indexed keys"""
+        cmd = 'select distinct row_id from search_tokens where kind=%s'
+        return set(key for key, in self.db(cmd, self.kind))
+
+    def zap(self):
+        """Delete values for all records"""
+        self.db('delete from search_tokens where kind=%s', self.kind)
+        self.db('delete from search_trigrams where kind=%s', self.kind)
+
+    def term_condition(self, term):
+        """Return the SQL condition and parameters matching a term
+
+        Tokens match if they start with the term or contain it.  Tokens
+        that contain longer terms are found through their trigrams, so
+        the condition never lists the matching tokens themselves.
+        """
+        condition = '(token >= %s and token < %s or {})'
+        params = [term, upper_bound(term)]
+        if self.use_trigrams and len(term) >= 3:
+            grams = sorted(trigrams(term))
+            condition = condition.format(
+                'token in ('
+                '    select token from search_trigrams'
+                '    where kind=%s and trigram in ({})'
+                '    group by token having count(*) = {}'
+                ') and token like %s'.format(
+                    ','.join(['%s'] * len(grams)), len(grams)
+                )
+            )
+            params.extend([self.kind] + grams)
+        else:
+            condition = condition.format('token like %s')
+        params.append('%' + term + '%')
+        return condition, params
+
+    def matching_tokens(self, term):
+        """Return the indexed tokens that contain a term"""
+        condition, params = self.term_condition(term)
+        cmd = 'select distinct token from search_tokens where kind=%s and ' + condition
+        return set(t for t, in self.db(cmd, self.kind, *params))
+
+    def find(self, text, offset=0, limit=None):
+        """Return the ranked keys of records that match search text
+
+        Records are ranked by how often the terms occur in them.
+        Returns the keys of the requested page and the total number of
+        matching records.  Ranking and paging are done by the database.
+        """
+        terms = text and sorted(set(
+            t.lower()[:self.max_token_len] for t in text.split()
+        ))
+        if not terms:
+            return [], 0
+
+        selects, params = [], []
+        for term in terms:
+            condition, term_params = self.term_condition(term)
+            selects.append(
+                'select row_id, sum(frequency) as score from search_tokens '
+                'where kind=%s and ' + condition + ' group by row_id'
+            )
+            params.extend([self.kind] + term_params)
+
+        matches = (
+            'select row_id, sum(score) as score from ({}) scores '
+            'group by row_id having count(*) = {}'
+        ).format(' union all '.join(selects), len(terms))
+
+        total = self.db(
+            'select count(*) from ({}) matches'.format(matches), *params
+        ).first()[0]
+        if not total:
+            return [], 0
+
+        cmd = matches + ' order by score desc, row_id'
+        if limit is not None:
+            cmd += ' limit %s offset %s'
+            params.extend([limit, offset])
+            keys = [key for key, _ in self.db(cmd, *params)]
+        else:
+            keys = [key for key, _ in self.db(cmd, *params)][offset:]
+        return keys, total
+
+
+def apply_index_updates(db, kind, limit=None, batch_size=100):
+    """Apply queued index updates for a kind of record
+
+    Updates are claimed from the queue a batch at a time.  Only the
+    last update for each record in a batch is applied, and the id of the
+    last message applied is recorded as the watermark for the kind.
+    Returns the number of updates applied.
+    """
+    topic = search_index_topic(db, kind)
+    index = TokenIndex(db, kind)
+    count = 0
+    while limit is None or count < limit:
+        size = batch_size if limit is None else min(batch_size, limit - count)
+        claimed = topic.claim(size)
+        if not claimed:
+            break
+        latest = collections.OrderedDict()
+        store_key = None
+        for _, message in claimed:
+            latest.pop(message['key'], None)
+            latest[message['key']] = message.get('values')
+            store_key = message.get('store_key', store_key)
+        try:
+            index.replace(list(latest.items()))
+        except Exception as error:
+            for row_id, _ in claimed:
+                topic.fail(row_id, error)
+            raise
+        for row_id, _ in claimed:
+            topic.ack(row_id)
+        count += len(claimed)
+
+        states = zoom.store.store_of(SearchIndexState, db=db)
+        state = states.first(kind=kind) or SearchIndexState(kind=kind, position=0)
+        state.watermark = claimed[-1][0]
+        state.applied = now()
+        if store_key is not None:
+            state.store_key = store_key
+        states.put(state)
+
+    if count:
+        logger = logging.getLogger(__name__)
+        logger.debug('applied %s queued %s index updates', count, kind)
+    return count
+
+
+def update_search_indexes(db=None, limit=None):
+    """Apply the queued index updates for every kind of record
+
+    Run every minute by the background jobs of the admin app.
+    """
+    db = db or zoom.system.site.db
+    prefix = SEARCH_INDEX_TOPIC + '.'
+    count = 0
+    for name in zoom.queues.Queues(db).topics():
+        if name.startswith(prefix) and not name.endswith(
+                zoom.queues.DEAD_LETTER_SUFFIX):
+            count += apply_index_updates(db, name[len(prefix):], limit)
+    return count
+
+
+def stored_keys(db, kind, key=None):
+    """Return the set of keys of the records of a kind
+
+    Records are read from the table named for the kind using the key
+    column provided, or from the entity attributes when there is no key.
+    """
+    if key is None:
+        cmd = 'select distinct row_id from attributes where kind=%s'
+        return set(row_id for row_id, in db(cmd, kind))
+    cmd = 'select `{}` from `{}`'.format(key, kind)
+    return set(row_id for row_id, in db(cmd))
+
+
+def check_search_indexes(db=None):
+    """Check the index of every kind of record that has one
+
+    Applies queued updates and removes the tokens of records that no
+    longer exist.  Records missing from an index can only be indexed by
+    their collection, which knows their fields, so they are logged to be
+    repaired by the collection's check or reindex.  Kinds are checked
+    once their collection has recorded where its records are stored.  Meant to be run
+    periodically as a background job.  Returns the number of records
+    repaired.
+    """
+    db = db or zoom.system.site.db
+    logger = logging.getLogger(__name__)
+    count = 0
+    for state in zoom.store.store_of(SearchIndexState, db=db):
+        kind = state.kind
+        apply_index_updates(db, kind)
+        key = state.get('store_key', None)
+        if key is None:
+            logger.debug('store of %s index not known yet', kind)
+            continue
+        index = TokenIndex(db, kind)
+        indexed, stored = index.keys(), stored_keys(db, kind, key or None)
+        orphans = sorted(indexed - stored)
+        index.delete(orphans)
+        missing = len(stored - indexed)
+        if orphans or missing:
+            logger.warning(
+                'checked %s index: %s missing, %s orphaned removed',
+                kind, missing, len(orphans)
+            )
+        count += len(orphans)
+    return count
+
+
 class IndexedCollectionSearch(object):
     """Provides token index for fast lookups
 
+    Changes to records are queued and applied to the index in batches
+    by the update_search_indexes background job of the admin app, so
+    saving a record does not have to wait for its tokens to be indexed.
+    Searches apply at most catch_up_limit waiting updates themselves.
+    Set deferred to False to update the index as records are saved
+    instead.
+
     We only provide enough room for tokens up to length 20 only because
     we have to draw the line somewhere.  This may result in some records
     not being found if the search would have mached on characters beyond
@@ -674,111 +1328,197 @@ class IndexedCollectionSearch(object):
     """
 
     max_token_len = 20
+    batch_size = 100
+    deferred = True
+    catch_up_limit = 20
 
     def __init__(self, collection):
         logger = logging.getLogger(__name__)
         self.collection = collection
         self.db = collection.store.db
         self.kind = self.collection.store.kind
+        self.tokens = TokenIndex(self.db, self.kind)
+        self.stale = False
         logger.debug(
             'starting IndexedCollectionSearch for %s collection',
             self.collection.name
         )
 
-        if 'tokens' not in self.db.get_tables():
-            self.db("""
-            create table if not exists tokens (
-                kind varchar(100),
-                row_id int unsigned not null,
-                token char({})
+    @property
+    def topic(self):
+        return search_index_topic(self.db, self.kind)
+
+    def _keys_after(self, position, limit):
+        """Return the next keys in the store after position"""
+        store = self.collection.store
+        if isinstance(store, EntityStore):
+            cmd = (
+                'select distinct row_id from attributes '
+                'where kind=%s and row_id > %s order by row_id limit %s'
             )
-            """.format(self.max_token_len))
+            return [key for key, in self.db(cmd, store.kind, position, limit)]
+        cmd = 'select `{key}` from `{kind}` where `{key}` > %s order by `{key}` limit %s'
+        cmd = cmd.format(key=store.key, kind=store.kind)
+        return [key for key, in self.db(cmd, position, limit)]
+
+    def _store_key(self):
+        """Return the key column of the store, blank for entities"""
+        store = self.collection.store
+        return '' if isinstance(store, EntityStore) else store.key
+
+    def _store_keys(self):
+        """Return the set of keys in the store"""
+        return stored_keys(self.db, self.kind, self._store_key() or None)
+
+    def _searchable(self, records):
+        """Return (key, values) entries for records"""
+        collection = self.collection
+        fields = collection.fields
+        entries = []
+        for record in records:
+            fields.initialize(collection.model(record))
+            entries.append((record._id, fields.as_searchable()))
+        return entries
 
-    def reindex(self):
+    def _states(self):
+        return zoom.store.store_of(SearchIndexState, db=self.db)
+
+    def reindex(self, restart=False, limit=None):
         """Rebuild the collection index
 
-        This method indexes a few records at a time, in batches.  It
-        can be very slow so should be done only by admins or as part
-        of a maintenance cycle in the background.   Once the table is
-        indexed this routine should not be needed.  It's mainly provided
-        to index an already existing table or to replace a damaged
-        index.
+        Records are indexed a batch at a time in key order and the last
+        key indexed is saved after each batch, so a reindex that is
+        interrupted (or stopped after `limit` records) carries on where it
+        left off the next time it runs.  Each batch replaces the tokens
+        of its own records so the index stays usable while it runs.
+        Returns True once the whole collection has been indexed.
         """
 
-        collection = self.collection
-        fields = collection.fields
+        store = self.collection.store
 
         logger = logging.getLogger(__name__)
-        count = 0
-        tick = 100
-        total = len(collection.store)
-
-        block = []
-        cmd = 'insert into tokens values ({!r}, %s, %s)'.format(
-            self.kind
+        states = self._states()
+        state = states.first(kind=self.kind) or SearchIndexState(
+            kind=self.kind,
+            position=0,
         )
+        if restart or state.get('finished', None):
+            state.position = 0
+            state.finished = None
+            state.started = now()
+        state.store_key = self._store_key()
 
-        msg = 'indexed %s of %s records (%0.4s%%)'
+        total = len(store)
+        count = 0
+        msg = 'indexed %s of %s records for %s'
+
+        while limit is None or count < limit:
+            size = self.batch_size
+            if limit is not None:
+                size = min(size, limit - count)
+            keys = self._keys_after(state.position, size)
+            if not keys:
+                orphans = self.tokens.keys() - self._store_keys()
+                self.tokens.delete(sorted(orphans))
+                state.finished = now()
+                states.put(state)
+                logger.debug(msg, total, total, self.kind)
+                return True
+
+            self.tokens.replace(self._searchable(store.get(keys)))
+
+            count += len(keys)
+            state.position = keys[-1]
+            states.put(state)
+            logger.debug(msg, count, total, self.kind)
 
-        self.zap()
-        for record in collection.store:
+        return False
 
-            if not count % tick:
-                if block:
-                    self.db.execute_many(cmd, block)
-                    block.clear()
-                    logger.debug(msg, count, total, 100.0*count/total)
-            count += 1
+    def check(self):
+        """Repair drift between the index and the store
 
-            fields.initialize(collection.model(record))
-            values = as_tokens(fields.as_searchable(), self.max_token_len)
-            block.extend(zip([record._id] * len(values), values))
-
-        if block:
-            self.db.execute_many(cmd, block)
-            block.clear()
-        logger.debug(msg, count, total, 100.0*count/total)
+        Indexes records that are missing from the index and removes
+        tokens for records that no longer exist.  Meant to be run
+        periodically in the background.  Returns the number of records
+        repaired.
+        """
+        self.apply_pending()
+        indexed, stored = self.tokens.keys(), self._store_keys()
+        missing, orphans = sorted(stored - indexed), sorted(indexed - stored)
+        self.tokens.delete(orphans)
+        store = self.collection.store
+        for offset in range(0, len(missing), self.batch_size):
+            keys = missing[offset:offset + self.batch_size]
+            self.tokens.replace(self._searchable(store.get(keys)))
+        if missing or orphans:
+            logger = logging.getLogger(__name__)
+            logger.warning(
+                'repaired %s index: %s missing, %s orphaned',
+                self.kind, len(missing), len(orphans)
+            )
+        return len(missing) + len(orphans)
+
+    def _queue(self, key, values):
+        """Queue or apply an index update"""
+        if values is not None:
+            values = [str(value) for value in values]
+        if self.deferred:
+            self.topic.put(
+                dict(key=key, values=values, store_key=self._store_key())
+            )
+        else:
+            self.tokens.replace([(key, values)])
 
     def add(self, key, values):
         """Add record values to index"""
-        tokens = [(t,) for t in as_tokens(values, self.max_token_len)]
-        cmd = 'insert into tokens values ({!r}, {!r}, %s)'.format(
-            self.kind, key
-        )
-        self.db.execute_many(cmd, tokens)
+        self._queue(key, values)
 
     def delete(self, key):
         """Delete indexed record values"""
-        self.db(
-            'delete from tokens where kind=%s and row_id=%s',
-            self.kind,
-            key
-        )
+        self._queue(key, None)
 
     def update(self, key, values):
         """Update indexed record values"""
-        self.delete(key)
-        self.add(key, values)
+        self._queue(key, values)
 
     def zap(self):
         """Delete values for all records"""
-        self.db('delete from tokens where kind=%s', self.kind)
+        self.topic.clear()
+        self.tokens.zap()
 
-    def search(self, text):
-        """Return records that match search text"""
+    def pending(self):
+        """Return the number of queued updates not yet applied"""
+        return len(self.topic)
 
-        terms = text and [t.lower()[:self.max_token_len] for t in text.split()]
-        cmd = 'select distinct row_id from tokens where kind=%s and token like %s'
+    def apply_pending(self, limit=None):
+        """Apply queued updates to the index"""
+        return apply_index_updates(self.db, self.kind, limit, self.batch_size)
 
-        result = []
-        for term in sorted(terms, key=len, reverse=True):
-            target = '%{}%'.format(term)
-            result.append(
-                set(i for i, in self.db(cmd, self.kind, target))
-            )
+    def staleness(self):
+        """Return the number of pending updates and when updates were last applied"""
+        state = self._states().first(kind=self.kind)
+        return self.pending(), state and state.get('applied', None)
 
-        keys = list(set.intersection(*result))
-        return self.collection.store.get(keys)
+    def find(self, text, offset=0, limit=None):
+        """Return the ranked keys of records that match search text
+
+        Up to catch_up_limit queued updates are applied first, leaving
+        the rest to the background job.  If more than that are waiting
+        the results may be out of date and stale is set.
+        """
+        if self.deferred:
+            self.apply_pending(self.catch_up_limit)
+            self.stale = bool(self.pending())
+        return self.tokens.find(text, offset, limit)
+
+    def search(self, text, offset=0, limit=None):
+        """Return records that match search text"""
+        keys, _ = self.find(text, offset, limit)
+        records = {
+            record._id: record
+            for record in self.collection.store.get(keys)
+        }
+        return [records[key] for key in keys if key in records]
 
 
 class Collection(object):
@@ -849,6 +1589,8 @@ class Collection(object):
         self.route = None
         self.search_engine = get('search_engine', BasicSearch)
         self.many_records = 50
+        self.page_size = get('page_size', None)
+        self.__count = None
         self.sorter = get('sorter', None)
         self.sortable = get('sortable', False)
 
@@ -859,9 +1601,44 @@ class Collection(object):
         """Seach the collection for records matching text"""
         return self.search_engine(self).search(text)
 
+    @property
+    def record_count(self):
+        """The number of records in the store, counted once per request"""
+        if self.__count is None:
+            self.__count = len(self.store)
+        return self.__count
+
     @property
     def has_many_records(self):
-        return len(self.store) >= self.many_records
+        return self.record_count >= self.many_records
+
+    def ordered_keys(self, offset=0, limit=None):
+        """Return the store keys in display order, if the store can sort
+
+        Collections sorted by the default order, by name, backed by an
+        EntityStore, are sorted and paged in the database.  Returns None
+        for other collections, which are sorted in memory.
+        """
+        store = self.store
+        if (
+                type(self).order is not Collection.order or
+                self.sorter or
+                not isinstance(store, EntityStore)
+        ):
+            return None
+        cmd = """
+            select k.row_id
+            from (select distinct row_id from attributes where kind=%s) k
+            left join attributes a
+                on a.kind=%s and a.row_id=k.row_id and a.attribute='name'
+            order by lower(a.value) {0}, k.row_id
+        """.format(self.is_reversed() and 'desc' or 'asc')
+        params = [store.kind, store.kind]
+        if limit is None:
+            return [key for key, in store.db(cmd, *params)][offset:]
+        cmd += ' limit %s offset %s'
+        params.extend([limit, offset])
+        return [key for key, in store.db(cmd, *params)]
 
     def order(self, item):
         """Returns the sort key"""
@@ -898,6 +1675,7 @@ class Collection(object):
         self.user = request.user
         self.request = request
         self.route = route
+        self.__count = None
 
         logger = logging.getLogger(__name__)
         logger.debug('Collection handler called')
@@ -934,6 +1712,7 @@ class Collection(object):
         self.user = request.user
         self.request = request
         self.route = route
+        self.__count = None
 
         logger = logging.getLogger(__name__)
         logger.debug('Collection process called')
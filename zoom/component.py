@@ -21,7 +21,6 @@
 from inspect import getfile, stack
 import logging
 from os.path import abspath, split, join, isfile, realpath, dirname
-import sys
 
 import zoom
 from zoom.utils import OrderedSet, kind
@@ -413,7 +412,7 @@ def handler(request, handler, *rest):
             request.session.system_errors = []
         request.session.system_errors = list(error_alerts)
 
-    stdout = sys.stdout.getvalue() # pylint: disable=no-member
+    stdout = zoom.context.captured_output()
     if stdout:
         renderable = (
             isinstance(result.content, str) and '{*stdout*}' in result.content
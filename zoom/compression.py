@@ -0,0 +1,245 @@
+"""
+    zoom.compression
+
+    Compresses responses for clients that accept it.
+
+    Text-like responses larger than min_size are compressed with brotli,
+    when it is installed and the client accepts it, or gzip.  Streamed
+    responses are compressed a chunk at a time as they are sent.  Media
+    that is already compressed, like images, fonts and video, is left
+    alone.
+
+    The [compression] section of site.ini sets enabled, min_size,
+    gzip_level and brotli_level.  Responses served before the site is
+    loaded, such as static files, use the defaults.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+from zoom.response import Response, PollResponse
+
+DEFAULT_SETTINGS = dict(
+    enabled=True,
+    min_size=1024,
+    gzip_level=6,
+    brotli_level=4,
+)
+
+COMPRESSIBLE_TYPES = (
+    'text',
+    'application/json',
+    'application/javascript',
+    'application/x-javascript',
+    'application/x-ndjson',
+    'application/xml',
+    'image/svg+xml',
+)
+
+NO_BODY_STATUSES = ('204', '304')
+
+LEVEL_SETTINGS = dict(br='brotli_level', gzip='gzip_level')
+
+
+def is_compressible(content_type):
+    """return True if content of content_type is worth compressing
+
+    >>> is_compressible('text/html; charset=utf-8')
+    True
+    >>> is_compressible('application/json;charset=utf-8')
+    True
+    >>> is_compressible('image/png')
+    False
+    >>> is_compressible(None)
+    False
+    """
+    if not content_type:
+        return False
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith('text') or media_type in COMPRESSIBLE_TYPES
+
+
+def available_codings():
+    """return the codings that can be used, most preferred first"""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def negotiate(accept_encoding, codings=('br', 'gzip')):
+    """return the coding to use given an Accept-Encoding header
+
+    >>> negotiate('gzip, deflate, br')
+    'br'
+    >>> negotiate('gzip, deflate')
+    'gzip'
+    >>> negotiate('br;q=0.5, gzip')
+    'gzip'
+    >>> negotiate('*', ('gzip',))
+    'gzip'
+    >>> negotiate('gzip;q=0, identity') is None
+    True
+    >>> negotiate('') is None
+    True
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in codings:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compressor(coding, level):
+    """return compress, flush and finish functions for coding
+
+    Flushing emits everything compressed so far, so it can be
+    decompressed before the rest of the data arrives.
+    """
+    if coding == 'br':
+        engine = brotli.Compressor(quality=level)
+        return engine.process, engine.flush, engine.finish
+    engine = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (
+        engine.compress,
+        lambda: engine.flush(zlib.Z_SYNC_FLUSH),
+        engine.flush,
+    )
+
+
+def compress(data, coding, level):
+    """compress data
+
+    >>> import gzip
+    >>> gzip.decompress(compress(b'zoom' * 100, 'gzip', 6)) == b'zoom' * 100
+    True
+    """
+    process, _, finish = compressor(coding, level)
+    return process(data) + finish()
+
+
+def compress_chunks(chunks, coding, level):
+    """compress an iterable of chunks as it is consumed
+
+    Each chunk is flushed as it is compressed so the client receives it
+    right away, which matters for streamed responses that trickle out.
+
+    >>> import gzip
+    >>> data = b''.join(compress_chunks(iter([b'one', b'two']), 'gzip', 6))
+    >>> gzip.decompress(data)
+    b'onetwo'
+
+    >>> decompressor = zlib.decompressobj(31)
+    >>> chunks = compress_chunks(iter([b'one', b'two']), 'gzip', 6)
+    >>> decompressor.decompress(next(chunks))
+    b'one'
+    """
+    process, flush, finish = compressor(coding, level)
+    try:
+        for chunk in chunks:
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+
+def get_settings(request):
+    """return the compression settings for the request's site"""
+    site = getattr(request, 'site', None)
+    return getattr(site, 'compression', None) or DEFAULT_SETTINGS
+
+
+def compress_response(response, accept_encoding, settings=None):
+    """return a compressed version of response, if it is worth it
+
+    >>> from zoom.response import HTMLResponse
+    >>> response = compress_response(HTMLResponse('x' * 2000), 'gzip')
+    >>> status, headers, doc = response.as_wsgi()
+    >>> headers[3:5]
+    [('Vary', 'Accept-Encoding'), ('Content-Encoding', 'gzip')]
+    >>> import gzip
+    >>> gzip.decompress(doc) == b'x' * 2000
+    True
+
+    >>> response = compress_response(HTMLResponse('small'), 'gzip')
+    >>> response.as_wsgi()[2]
+    b'small'
+    """
+    settings = settings or DEFAULT_SETTINGS
+    headers = response.headers
+    if (
+            not settings.get('enabled', True) or
+            isinstance(response, PollResponse) or
+            not is_compressible(headers.get('Content-type')) or
+            'Content-Encoding' in headers or
+            'no-transform' in headers.get('Cache-Control', '') or
+            str(response.status)[:3] in NO_BODY_STATUSES
+    ):
+        return response
+
+    vary = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        headers['Vary'] = vary + ', Accept-Encoding'
+
+    coding = negotiate(accept_encoding, available_codings())
+    if not coding:
+        return response
+
+    level_setting = LEVEL_SETTINGS[coding]
+    level = settings.get(level_setting, DEFAULT_SETTINGS[level_setting])
+    status, wsgi_headers, doc = response.as_wsgi()
+
+    if isinstance(doc, bytes):
+        if len(doc) < settings.get('min_size', DEFAULT_SETTINGS['min_size']):
+            encoding = None
+        else:
+            doc = compress(doc, coding, level)
+            encoding = coding
+    elif hasattr(doc, 'read'):
+        return response
+    else:
+        doc = compress_chunks(iter(doc), coding, level)
+        encoding = coding
+
+    result = Response(doc, status, [
+        (name, value) for name, value in wsgi_headers
+        if name not in ('Set-Cookie', 'Content-length')
+    ])
+    result.cookie = response.cookie
+    if encoding:
+        result.headers['Content-Encoding'] = encoding
+    return result
+
+
+def handler(request, next_handler, *rest):
+    """compress responses"""
+    response = next_handler(request, *rest)
+    return compress_response(
+        response,
+        request.env.get('HTTP_ACCEPT_ENCODING', ''),
+        get_settings(request),
+    )
@@ -1,13 +1,84 @@
 """
     zoom.context
+
+    Request state that is local to the thread handling the request.
 """
 
+import io
+import sys
 import threading
+from contextlib import contextmanager
+
+
+class Context(threading.local):
+    """request context
+
+    Each thread sees its own values, starting from the defaults here.
+    """
+    request = None
+    site = None
+    user = None
+    response = None
+    app_path = None
+    stdout = None
+    database_debug = False
+
+    def __init__(self):
+        self.providers = []
+        self.database_stats = []
+
+
+context = Context()
+
+
+class ContextStdout(object):
+    """stdout that writes to the current thread's capture buffer
+
+    Output from threads that are not capturing goes to the stream that
+    was stdout when it was installed.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = context.stdout
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if context.stdout is None:
+            self.stream.flush()
+
+    def getvalue(self):
+        """return the output captured so far on this thread"""
+        return captured_output()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def captured_output():
+    """return the output captured so far on this thread"""
+    buffer = context.stdout
+    return buffer.getvalue() if buffer is not None else ''
+
 
+@contextmanager
+def captured_stdout():
+    """capture what this thread prints
 
-context = threading.local()
-context.request = None
-context.site = None
-context.user = None
-context.response = None
-context.providers = []
+    >>> with captured_stdout() as output:
+    ...     print('hey')
+    >>> output.getvalue()
+    'hey\\n'
+    """
+    if not isinstance(sys.stdout, ContextStdout):
+        sys.stdout = ContextStdout(sys.stdout)
+    saved = context.stdout
+    context.stdout = buffer = io.StringIO()
+    try:
+        yield buffer
+    finally:
+        context.stdout = saved
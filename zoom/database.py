@@ -22,6 +22,7 @@ except ImportError:
 from pymysql.err import OperationalError
 
 import zoom
+from zoom.context import context
 
 __all__ = [
     'Database',
@@ -72,19 +73,29 @@ class EmptyDatabaseException(Exception):
 
 
 class Result:
-    """database query result"""
+    """database query result
 
-    def __init__(self, cursor, array_size=ARRAY_SIZE):
+    A result can be given a closing function, which is called once its
+    rows have been read or it stops being iterated.
+    """
+
+    def __init__(self, cursor, array_size=ARRAY_SIZE, closing=None):
         self.cursor = cursor
         self.array_size = array_size
+        self.closing = closing
 
     def __iter__(self):
-        while True:
-            results = self.cursor.fetchmany(self.array_size)
-            if not results:
-                break
-            for result in results:
-                yield result
+        try:
+            while True:
+                results = self.cursor.fetchmany(self.array_size)
+                if not results:
+                    break
+                for result in results:
+                    yield result
+        finally:
+            if self.closing:
+                closing, self.closing = self.closing, None
+                closing()
 
     def __len__(self):
         # deprecate? - not supported by all databases
@@ -169,8 +180,6 @@ class Database(object):
     """
 
     paramstyle = 'pyformat'
-    stats = []  # make this a class attribute to catch across instances
-    debug = False  # make this a class attribute to catch across instances
 
     def __init__(self, factory, *args, **keywords):
         """Initialize with factory method to generate DB connection
@@ -183,6 +192,8 @@ class Database(object):
         self.log = []
         self.rowcount = None
         self.lastrowid = None
+        self._server_version = None
+        self._cache_key = None
 
     def __getattr__(self, name):
         if self.__connection is None:
@@ -288,7 +299,7 @@ class Database(object):
                     args,
                 ))
                 source = format_stack(inspect.stack())
-                type(self).stats.append(
+                context.database_stats.append(
                     (elapsed, repr(command), repr(args), source)
                 )
 
@@ -303,6 +314,24 @@ class Database(object):
         cursor = self.cursor()
         return self._execute(cursor, cursor.execute, command, *args)
 
+    def stream(self, command, *args):
+        """execute a query, reading the rows as the result is iterated
+
+        Meant for results too large to hold in memory, such as those
+        exported with CSVResponse or NDJSONResponse.
+
+        >>> db = database('sqlite3', database=':memory:')
+        >>> db('create table numbers (n integer)')
+        >>> db.execute_many('insert into numbers values (%s)', [(1,), (2,)])
+        >>> list(db.stream('select n from numbers order by n'))
+        [(1,), (2,)]
+        """
+        return self.execute(command, *args)
+
+    def new_connection(self):
+        """open another connection with the parameters of this database"""
+        return self.__factory(*self.__args, **self.__keywords)
+
     def execute_many(self, command, sequence):
         """execute a SQL command with a sequence of parameters"""
         if not sequence:
@@ -407,19 +436,49 @@ class Database(object):
                 '\n'.join(self.log))
         return ''
 
+    @property
+    def debug(self):
+        """True when statements run for the current request are logged
+
+            The setting and the stats are kept in the request context
+            so they are shared by all database instances used by a
+            request but not by requests running in other threads.
+        """
+        return context.database_debug
+
+    @debug.setter
+    def debug(self, value):
+        context.database_debug = value
+
     @classmethod
     def get_stats(cls):
         """Return the stats to the caller, clearing the list of what is returned
 
             We use a classmethod to support inheritance (over staticmethod)
         """
-        result = list(cls.stats)  # get a copy of the list
-        del cls.stats[:len(result)]  # clear the list, but more may have been added
+        stats = context.database_stats
+        result = list(stats)  # get a copy of the list
+        del stats[:len(result)]  # clear the list, but more may have been added
         return result
 
     def get_tables(self):
         """get a list of database tables"""
 
+    def cache_key(self):
+        """Return a key identifying the database for per process caches
+
+        Connections that last as long as the process identify themselves.
+        """
+        return self
+
+    def supports(self, feature):
+        """Return True if the database supports an SQL feature
+
+        Features are 'window_functions' and 'grouping' (the GROUPING()
+        function used with rollups).
+        """
+        return False
+
     @property
     def database(self):
         """Returns an object containing database parameters"""
@@ -497,6 +556,18 @@ class Sqlite3Database(Database):
         cmd = 'select name from sqlite_master where type="table"'
         return [a[0] for a in self(cmd)]
 
+    def supports(self, feature):
+        """Return True if the database supports an SQL feature
+
+        >>> db = database('sqlite3', database=':memory:')
+        >>> db.supports('grouping')
+        False
+        """
+        import sqlite3
+        if feature == 'window_functions':
+            return sqlite3.sqlite_version_info >= (3, 25, 0)
+        return False
+
     def create_site_tables(self, filename=None):
         """Create Sqlite3 version of site tables"""
         logger = logging.getLogger(__name__)
@@ -564,6 +635,62 @@ class MySQLDatabase(Database):
         cmd = 'show tables'
         return [a[0] for a in self(cmd)]
 
+    def stream(self, command, *args):
+        """execute a query, reading the rows as the result is iterated
+
+        The usual cursor reads the whole result into memory before the
+        first row is returned, so the query is run with an unbuffered
+        cursor instead.  That cursor has a connection of its own, so the
+        request can go on using the database while the rows are read,
+        and the connection is closed once they have been.
+        """
+        import pymysql.cursors
+        connection = self.new_connection()
+        try:
+            cursor = connection.cursor(pymysql.cursors.SSCursor)
+            result = self._execute(cursor, cursor.execute, command, *args)
+        except BaseException:
+            connection.close()
+            raise
+        if isinstance(result, Result):
+            result.closing = connection.close
+        else:
+            connection.close()
+        return result
+
+    @property
+    def server_version(self):
+        """Return the server name and version"""
+        if self._server_version is None:
+            self._server_version = parse_server_version(self.get_server_info())
+        return self._server_version
+
+    def cache_key(self):
+        """Return a key identifying the database for per process caches
+
+        MySQL connections are opened for each request, so they are
+        identified by server and selected database rather than by
+        object.  The database may have been selected with a use
+        statement after connecting, so it is asked for if it wasn't
+        part of the connection parameters.
+        """
+        if self._cache_key is None:
+            server = self.database
+            name = server.name or self('select database()').first()[0]
+            self._cache_key = (server.host, server.port, name)
+        return self._cache_key
+
+    def supports(self, feature):
+        """Return True if the database supports an SQL feature"""
+        name, version = self.server_version
+        if feature == 'window_functions':
+            if name == 'mariadb':
+                return version >= (10, 2)
+            return version >= (8, 0)
+        if feature == 'grouping':
+            return name == 'mysql' and version >= (8, 0, 1)
+        return False
+
     def get_databases(self):
         """return database names"""
         cmd = 'show databases'
@@ -638,6 +765,27 @@ class MySQLDatabase(Database):
             pass
 
 
+def parse_server_version(info):
+    """Return the server name and version from a MySQL version string
+
+    >>> parse_server_version('8.0.35')
+    ('mysql', (8, 0, 35))
+    >>> parse_server_version('5.5.5-10.11.6-MariaDB-log')
+    ('mariadb', (10, 11, 6))
+    """
+    if isinstance(info, bytes):
+        info = info.decode('utf8')
+    name = 'mariadb' if 'mariadb' in info.lower() else 'mysql'
+    if name == 'mariadb' and info.startswith('5.5.5-'):
+        # older clients see MariaDB versions behind this prefix
+        info = info[len('5.5.5-'):]
+    numbers = []
+    for part in info.split('-')[0].split('.'):
+        digits = ''.join(c for c in part if c.isdigit())
+        numbers.append(int(digits or 0))
+    return name, tuple(numbers)
+
+
 def database(engine, *args, **kwargs):
     """create a database object"""
 
@@ -742,7 +890,8 @@ def handler(request, next_handler, *rest):
     )
     if database_name:
         site.db = connect_database(site.config)
-        Database.debug = site.monitor_system_database
+        context.database_debug = site.monitor_system_database
+        context.database_stats = []
 
         if site.db.get_tables() == []:
             raise EmptyDatabaseException('Database is empty')
@@ -45,3 +45,11 @@ class SiteMissingException(Exception):
 class ThemeTemplateMissingException(Exception):
     """Theme template missing"""
     pass
+
+class RequestTooLargeException(Exception):
+    """Request body exceeds the configured limits"""
+    pass
+
+class BadRequestException(Exception):
+    """Request is malformed"""
+    pass
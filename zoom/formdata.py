@@ -0,0 +1,406 @@
+"""
+    zoom.formdata
+
+    Parses form submissions as they stream in.
+
+    Urlencoded and multipart request bodies are read a chunk at a time
+    rather than all at once.  Uploaded files are spooled to a temporary
+    file once they grow past spool_size, and their contents are only
+    read back into memory if the app asks for them, so large uploads
+    don't have to fit in memory.
+
+    The size of each field, each file and the body as a whole can be
+    limited.  A request that goes over a limit raises
+    RequestTooLargeException, which is displayed as a 413 response.
+    A malformed body raises BadRequestException, displayed as a 400
+    response.
+"""
+
+import email.message
+import email.parser
+import shutil
+import tempfile
+import urllib.parse
+
+from zoom.exceptions import BadRequestException, RequestTooLargeException
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+
+DEFAULT_LIMITS = dict(
+    max_body_size=None,
+    max_field_size=4 * 1024 * 1024,
+    max_file_size=None,
+    spool_size=1024 * 1024,
+)
+
+FORM_TYPES = (
+    'application/x-www-form-urlencoded',
+    'multipart/form-data',
+)
+
+
+class FileUpload(object):
+    """an uploaded file
+
+    Provides the attributes apps used from cgi.FieldStorage file
+    items.  The content stays in the spooled file until value is
+    accessed.
+
+    >>> upload = FileUpload('photo', 'me.png', 'image/png', {})
+    >>> upload.write(b'not really a png')
+    >>> upload.size
+    16
+    >>> upload.value
+    b'not really a png'
+    >>> upload.file.read(3)
+    b'not'
+    >>> upload
+    <FileUpload 'photo' 'me.png' (16 bytes)>
+    """
+
+    def __init__(self, name, filename, content_type, headers, spool_size=None):
+        self.name = name
+        self.filename = filename
+        self.type = content_type
+        self.headers = headers
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=spool_size or DEFAULT_LIMITS['spool_size']
+        )
+
+    def write(self, data):
+        """append data to the file"""
+        self.file.write(data)
+        self.size += len(data)
+
+    @property
+    def value(self):
+        """the content of the file"""
+        self.file.seek(0)
+        try:
+            return self.file.read()
+        finally:
+            self.file.seek(0)
+
+    def save(self, pathname):
+        """copy the file to pathname without reading it all into memory"""
+        self.file.seek(0)
+        with open(pathname, 'wb') as writer:
+            shutil.copyfileobj(self.file, writer, CHUNK_SIZE)
+        self.file.seek(0)
+
+    def close(self):
+        """discard the file"""
+        self.file.close()
+
+    def __repr__(self):
+        return '<FileUpload %r %r (%s bytes)>' % (
+            self.name, self.filename, self.size
+        )
+
+
+class BodyReader(object):
+    """reads a request body a chunk at a time
+
+    Reads no more than length bytes, or to the end of the stream if
+    the length isn't known, and enforces the body size limit.
+    """
+
+    def __init__(self, stream, length=None, limit=None):
+        if length is not None and limit is not None and length > limit:
+            raise RequestTooLargeException(
+                'request body of %s bytes exceeds limit of %s' % (length, limit)
+            )
+        self.stream = stream
+        self.remaining = length
+        self.limit = limit
+        self.total = 0
+
+    def read(self, size=CHUNK_SIZE):
+        """return the next chunk of the body, or b'' at the end"""
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+            if size <= 0:
+                return b''
+        data = self.stream.read(size) or b''
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        self.total += len(data)
+        if self.limit is not None and self.total > self.limit:
+            raise RequestTooLargeException(
+                'request body exceeds limit of %s' % self.limit
+            )
+        return data
+
+
+class LimitedBuffer(object):
+    """collects the value of a form field up to a size limit"""
+
+    def __init__(self, name, limit=None):
+        self.name = name
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise RequestTooLargeException(
+                'field %r exceeds limit of %s' % (self.name, self.limit)
+            )
+        self.chunks.append(data)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def parse_header(value):
+    """parse a header value into its main value and parameters
+
+    >>> parse_header('multipart/form-data; boundary="--xyz"')
+    ('multipart/form-data', {'boundary': '--xyz'})
+    >>> parse_header('')
+    ('', {})
+    """
+    message = email.message.Message()
+    message['content-type'] = value
+    params = message.get_params() or [('', '')]
+    return params[0][0].lower(), {k.lower(): v for k, v in params[1:]}
+
+
+def decode_pair(pair, charset='utf-8'):
+    """decode a urlencoded name=value pair
+
+    >>> decode_pair(b'name=Joe+Smith%21')
+    ('name', 'Joe Smith!')
+    >>> decode_pair(b'flag')
+    ('flag', '')
+    """
+    name, _, value = pair.partition(b'=')
+
+    def unquote(data):
+        return urllib.parse.unquote_to_bytes(
+            data.replace(b'+', b' ')
+        ).decode(charset, 'replace')
+
+    return unquote(name), unquote(value)
+
+
+def parse_urlencoded(reader, max_field_size=None, charset='utf-8', **_):
+    """yield the name, value pairs of a urlencoded body as it is read
+
+    >>> import io
+    >>> body = io.BytesIO(b'name=joe&age=40&')
+    >>> list(parse_urlencoded(BodyReader(body)))
+    [('name', 'joe'), ('age', '40')]
+    """
+    buffer = b''
+    while True:
+        chunk = reader.read()
+        buffer += chunk
+        pairs = buffer.split(b'&')
+        buffer = pairs.pop() if chunk else b''
+        for pair in pairs:
+            if max_field_size is not None and len(pair) > max_field_size:
+                raise RequestTooLargeException(
+                    'field exceeds limit of %s' % max_field_size
+                )
+            if pair:
+                yield decode_pair(pair, charset)
+        if not chunk:
+            return
+        if max_field_size is not None and len(buffer) > max_field_size:
+            raise RequestTooLargeException(
+                'field exceeds limit of %s' % max_field_size
+            )
+
+
+def read_until(reader, buffer, marker, write):
+    """pass data to write until marker is found
+
+    Returns the data that follows the marker, or None if the body
+    ends first.
+    """
+    keep = len(marker) - 1
+    while True:
+        index = buffer.find(marker)
+        if index >= 0:
+            write(buffer[:index])
+            return buffer[index + len(marker):]
+        if len(buffer) > keep:
+            write(buffer[:-keep])
+            buffer = buffer[-keep:]
+        chunk = reader.read()
+        if not chunk:
+            return None
+        buffer += chunk
+
+
+def discard(_):
+    """ignore data"""
+
+
+def parse_multipart(reader, boundary, max_field_size=None,
+                    max_file_size=None, spool_size=None, charset='utf-8', **_):
+    """yield the name, value pairs of a multipart body as it is read
+
+    Values are strings for ordinary fields and FileUploads for files.
+
+    >>> import io
+    >>> body = io.BytesIO(
+    ...     b'--xyz\\r\\n'
+    ...     b'Content-Disposition: form-data; name="name"\\r\\n\\r\\n'
+    ...     b'joe\\r\\n'
+    ...     b'--xyz\\r\\n'
+    ...     b'Content-Disposition: form-data; name="photo"; filename="me.png"\\r\\n'
+    ...     b'Content-Type: image/png\\r\\n\\r\\n'
+    ...     b'\\x89PNG\\r\\n'
+    ...     b'--xyz--\\r\\n'
+    ... )
+    >>> (name, value), (_, upload) = parse_multipart(BodyReader(body), b'xyz')
+    >>> name, value
+    ('name', 'joe')
+    >>> upload.filename, upload.type, upload.value
+    ('me.png', 'image/png', b'\\x89PNG')
+    """
+    delimiter = b'\r\n--' + boundary
+
+    # the first delimiter isn't preceded by a line break
+    buffer = read_until(reader, b'\r\n', delimiter, discard)
+
+    while buffer is not None:
+
+        while len(buffer) < 2:
+            chunk = reader.read()
+            if not chunk:
+                return
+            buffer += chunk
+        if buffer.startswith(b'--'):
+            return
+
+        buffer = read_until(reader, buffer, b'\r\n', discard)
+        if buffer is None:
+            return
+
+        header = LimitedBuffer('headers', MAX_HEADER_SIZE)
+        buffer = read_until(reader, b'\r\n' + buffer, b'\r\n\r\n', header.write)
+        if buffer is None:
+            return
+        headers = email.parser.HeaderParser().parsestr(
+            header.getvalue().decode('utf-8', 'replace').strip()
+        )
+        name = headers.get_param('name', header='content-disposition')
+        filename = headers.get_filename()
+
+        if name is None:
+            sink = None
+            write = discard
+        elif filename:
+            sink = FileUpload(
+                name, filename, headers.get_content_type(), headers, spool_size
+            )
+            limit = LimitedBuffer(name, max_file_size)
+
+            def write(data, sink=sink, limit=limit):
+                limit.size += len(data)
+                if limit.limit is not None and limit.size > limit.limit:
+                    raise RequestTooLargeException(
+                        'file %r exceeds limit of %s' % (limit.name, limit.limit)
+                    )
+                sink.write(data)
+        else:
+            sink = LimitedBuffer(name, max_field_size)
+            write = sink.write
+
+        buffer = read_until(reader, buffer, delimiter, write)
+        if buffer is None:
+            return
+
+        if isinstance(sink, FileUpload):
+            sink.file.seek(0)
+            yield name, sink
+        elif sink is not None:
+            value = sink.getvalue()
+            if filename is None:
+                value = value.decode(
+                    headers.get_content_charset() or charset, 'replace'
+                )
+            yield name, value
+
+
+def to_dict(pairs):
+    """collect name, value pairs into a dict
+
+    Repeated names collect their values in a list, as do names with an
+    index (myfield[0]), which some libraries use for repeated values.
+
+    >>> to_dict([('a', '1'), ('b', '2'), ('b', '3')])
+    {'a': '1', 'b': ['2', '3']}
+    >>> to_dict([('c[1]', 'x'), ('c[2]', 'y')])
+    {'c': ['x', 'y']}
+    """
+    grouped = {}
+    for name, value in pairs:
+        grouped.setdefault(name, []).append(value)
+
+    items = {}
+    for key, values in grouped.items():
+        value = values[0] if len(values) == 1 else values
+        if '[' in key and key.endswith(']'):
+            items.setdefault(key[:key.find('[')], []).append(value)
+        else:
+            items[key] = value
+    return items
+
+
+def parse(env, stream, limits=None):
+    """parse the query string and form body of a request
+
+    Bodies of types other than urlencoded or multipart are left unread.
+
+    >>> import io
+    >>> env = {
+    ...     'REQUEST_METHOD': 'POST',
+    ...     'QUERY_STRING': 'page=2',
+    ...     'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+    ...     'CONTENT_LENGTH': '8',
+    ... }
+    >>> parse(env, io.BytesIO(b'name=joe&ignored')) == {'name': 'joe', 'page': '2'}
+    True
+
+    >>> parse(env, io.BytesIO(b'name=joe'), dict(max_body_size=4))
+    Traceback (most recent call last):
+    ...
+    zoom.exceptions.RequestTooLargeException: request body of 8 bytes exceeds limit of 4
+    """
+    settings = dict(DEFAULT_LIMITS, **(limits or {}))
+    query = urllib.parse.parse_qsl(
+        env.get('QUERY_STRING', ''), keep_blank_values=True
+    )
+
+    if env.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+        return to_dict(query)
+
+    content_type, params = parse_header(
+        env.get('CONTENT_TYPE') or FORM_TYPES[0]
+    )
+    if content_type not in FORM_TYPES:
+        return to_dict(query)
+
+    try:
+        length = int(env.get('CONTENT_LENGTH'))
+    except (TypeError, ValueError):
+        length = None
+
+    reader = BodyReader(stream, length, settings['max_body_size'])
+    settings['charset'] = params.get('charset') or 'utf-8'
+
+    if content_type == 'multipart/form-data':
+        boundary = params.get('boundary', '')
+        if not boundary:
+            raise BadRequestException('multipart body missing boundary')
+        body = parse_multipart(reader, boundary.encode('latin-1'), **settings)
+        return to_dict(query + list(body))
+
+    return to_dict(list(parse_urlencoded(reader, **settings)) + query)
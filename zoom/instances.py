@@ -144,8 +144,10 @@ class Instance(object):
 
     def run_background_jobs(self):
         """Run background jobs for all sites in an instance"""
+        pool = zoom.background.JobPool()
         for site in self.get_sites(skip_fails=True).values():
-            site.run_background_jobs()
+            site.run_background_jobs(pool)
+        pool.drain()
 
     def __str__(self):  # pragma: nocover
         return 'Instance %r contains %s sites:\n%s' % (
@@ -4,13 +4,32 @@
     zoom.jsonz
 
     JSON with extra converters
+
+    Dates, datetimes, decimals and bytes are tagged with a __type__ so
+    they come back as the same type.  When orjson is installed it is used
+    to decode, and to encode when compact separators=(',', ':') are asked
+    for, which is the only layout it writes.  Otherwise the standard json
+    module is used, so the text written doesn't depend on whether orjson
+    is installed.  Both produce the same tagged values so either can read
+    what the other wrote.
 """
 
 import json
+import re
 import datetime
 from decimal import Decimal
 from datetime import datetime, date
 from sys import version_info
+from timeit import default_timer as timer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+CHUNK_SIZE = 64 * 1024
+COMPACT = (',', ':')
 
 
 def _decode_datetime(text):
@@ -24,27 +43,118 @@ def _decode_datetime_pre_37(text):
 
 decode_datetime = _decode_datetime if version_info[:2] >= (3, 7) else _decode_datetime_pre_37
 
+
+def dhandler(obj):
+    """handles extra converters"""
+    # pylint: disable=invalid-name
+    if '__type__' in obj:
+        t = obj['__type__']
+        if t == 'datetime':
+            return decode_datetime(obj['value'])
+        elif t == 'date':
+            return datetime.strptime(obj['value'], '%Y-%m-%d').date()
+        elif t == 'decimal':
+            return Decimal(str(obj['value']))
+        elif t == 'bytes':
+            return obj['value'].encode("utf-8")
+    return obj
+
+
+def handler(obj):
+    """handles extra converters"""
+    if isinstance(obj, datetime):
+        return dict(__type__='datetime', value=obj.isoformat())
+    elif isinstance(obj, date):
+        return dict(__type__='date', value=obj.isoformat())
+    elif isinstance(obj, Decimal):
+        return dict(__type__='decimal', value=str(obj))
+    elif isinstance(obj, (bytes, bytearray)):
+        return dict(__type__='bytes', value=obj.decode("utf-8"))
+    else:
+        msg = 'Object of type %s with value %s is not JSON serializable.'
+        raise TypeError(msg % (type(obj), repr(obj)))
+
+
+def _loads_fast(text):
+    # tagged values need the object hook, which json calls from C as it
+    # builds each object; that is quicker than walking an orjson result
+    if isinstance(text, str):
+        tagged = '"__type__"' in text
+    else:
+        tagged = b'"__type__"' in text
+    if not tagged:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # NaN, Infinity and oversized integers are only handled by json
+            pass
+    return json.loads(text, object_hook=dhandler)
+
+
 def loads(text):
-    """load JSON from a string"""
-
-    def dhandler(obj):
-        """handles extra converters"""
-        # pylint: disable=invalid-name
-        if '__type__' in obj:
-            t = obj['__type__']
-            if t == 'datetime':
-                return decode_datetime(obj['value'])
-            elif t == 'date':
-                return datetime.strptime(obj['value'], '%Y-%m-%d').date()
-            elif t == 'decimal':
-                return Decimal(str(obj['value']))
-            elif t == 'bytes':
-                return obj['value'].encode("utf-8")
-        return obj
+    """load JSON from a string
 
+    >>> loads('{"n": {"__type__": "decimal", "value": "1.50"}}')
+    {'n': Decimal('1.50')}
+    """
+    if orjson is not None:
+        return _loads_fast(text)
     return json.loads(text, object_hook=dhandler)
 
 
+def _escape(match):
+    code = ord(match.group(0))
+    if code < 0x10000:
+        return '\\u%04x' % code
+    code -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+
+_escape_ascii = re.compile(r'[^\x00-\x7f]').sub
+
+
+def fast_options(kwargs):
+    """return the orjson options equivalent to json.dumps kwargs
+
+    Returns None when the kwargs ask for something only the standard
+    json module can do, including its default separators, which orjson
+    doesn't write.
+
+    >>> fast_options(dict(sort_keys=True)) is None
+    True
+    >>> compact = dict(separators=(',', ':'), sort_keys=True)
+    >>> fast_options(compact) is not None or orjson is None
+    True
+    """
+    if orjson is None or tuple(kwargs.get('separators', ())) != COMPACT:
+        return None
+    option = (
+        orjson.OPT_PASSTHROUGH_DATETIME |
+        orjson.OPT_PASSTHROUGH_DATACLASS |
+        orjson.OPT_NON_STR_KEYS
+    )
+    for key, value in kwargs.items():
+        if key == 'sort_keys':
+            if value:
+                option |= orjson.OPT_SORT_KEYS
+        elif key == 'indent':
+            if value is not None:
+                return None
+        elif key not in ('ensure_ascii', 'separators'):
+            return None
+    return option
+
+
+def _dumps_fast(data, option, ensure_ascii=True):
+    text = orjson.dumps(data, default=handler, option=option).decode('utf-8')
+    if ensure_ascii and not text.isascii():
+        text = _escape_ascii(_escape, text)
+    return text
+
+
+def _dumps_json(data, *a, **k):
+    return json.dumps(data, default=handler, *a, **k)
+
+
 def dumps(data, *a, **k):
     """Convert to json with support for date and decimal types
 
@@ -59,20 +169,138 @@ def dumps(data, *a, **k):
 
     >>> loads(dumps(Decimal('20.40')))
     Decimal('20.40')
+
+    >>> dumps('caf\\xe9 \\U0001f600')
+    '"caf\\\\u00e9 \\\\ud83d\\\\ude00"'
+
+    >>> dumps(dict(a=[1, float('nan')]), separators=(',', ':'))
+    '{"a":[1,NaN]}'
     """
+    option = None if a else fast_options(k)
+    if option is not None:
+        try:
+            text = _dumps_fast(data, option, k.get('ensure_ascii', True))
+        except orjson.JSONEncodeError:
+            # unsupported types get the standard error from json below
+            text = None
+        # orjson writes NaN and Infinity as null, which json keeps
+        if text is not None and 'null' not in text:
+            return text
+    return _dumps_json(data, *a, **k)
+
+
+def _chunked(parts, size=CHUNK_SIZE):
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
 
-    def handler(obj):
-        """handles extra converters"""
-        if isinstance(obj, datetime):
-            return dict(__type__='datetime', value=obj.isoformat())
-        elif isinstance(obj, date):
-            return dict(__type__='date', value=obj.isoformat())
-        elif isinstance(obj, Decimal):
-            return dict(__type__='decimal', value=str(obj))
-        elif isinstance(obj, (bytes, bytearray)):
-            return dict(__type__='bytes', value=obj.decode("utf-8"))
+def _iterparts(data, batch_size, **k):
+    if isinstance(data, (str, bytes, bytearray, dict)) or (
+            not hasattr(data, '__iter__')):
+        if fast_options(k) is None:
+            yield from json.JSONEncoder(default=handler, **k).iterencode(data)
         else:
-            msg = 'Object of type %s with value %s is not JSON serializable.'
-            raise TypeError(msg % (type(obj), repr(obj)))
+            yield dumps(data, **k)
+        return
 
-    return json.dumps(data, default=handler, *a, **k)
+    # arrays are encoded a batch of items at a time so that only one
+    # batch is ever held as text
+    indent = k.get('indent')
+    item_separator = (k.get('separators') or (', ', ': '))[0]
+    opening, separator, closing = (
+        ('[\n', ',\n', '\n]') if indent is not None
+        else ('[', item_separator, ']')
+    )
+    prefix = opening
+    batch = []
+    for item in data:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield prefix + _strip_array(dumps(batch, **k), indent)
+            prefix = separator
+            batch = []
+    if batch:
+        yield prefix + _strip_array(dumps(batch, **k), indent)
+        prefix = separator
+    yield '[]' if prefix == opening else closing
+
+
+def _strip_array(text, indent):
+    """remove the brackets from an encoded array, leaving the items"""
+    text = text[1:-1]
+    if indent is not None:
+        text = text.strip('\n')
+    return text
+
+
+def iterencode(data, batch_size=1000, **k):
+    """Encode data as a sequence of UTF-8 encoded byte chunks
+
+    Accepts the same keyword arguments as dumps.  Lists, tuples and
+    other iterables such as generators and database results are written
+    as arrays, a batch of items at a time, so large arrays are never
+    held in memory as a single string.
+
+    >>> loads(b''.join(iterencode(dict(a=[1, 2]), sort_keys=True)))
+    {'a': [1, 2]}
+
+    >>> rows = ((n, Decimal(n)) for n in range(3))
+    >>> text = b''.join(iterencode(rows, batch_size=2))
+    >>> loads(text)
+    [[0, Decimal('0')], [1, Decimal('1')], [2, Decimal('2')]]
+    """
+    return _chunked(_iterparts(data, batch_size, **k))
+
+
+def benchmark(data=None, number=10):
+    """compare the time taken by the codec paths
+
+    Returns the seconds taken to encode and decode data number times
+    with the standard json module, with the fast codec (when installed)
+    and with iterencode.
+
+    >>> sorted(benchmark([1, 2], number=1))[:2]
+    ['dumps', 'iterencode']
+    """
+    if data is None:
+        data = [
+            dict(
+                id=n,
+                name='name %s' % n,
+                created=datetime(2020, 1, 1, 12, 30, n % 60),
+                amount=Decimal('%d.25' % n),
+                tags=['a', 'b', 'c'],
+            )
+            for n in range(10000)
+        ]
+
+    def timed(function, *args, **kwargs):
+        start = timer()
+        for _ in range(number):
+            result = function(*args, **kwargs)
+        return timer() - start, result
+
+    results = {}
+    results['json.dumps'], text = timed(_dumps_json, data)
+    results['json.loads'] = timed(
+        json.loads, text, object_hook=dhandler
+    )[0]
+    results['dumps'], text = timed(dumps, data, separators=COMPACT)
+    results['loads'] = timed(loads, text)[0]
+    results['iterencode'] = timed(
+        lambda: b''.join(iterencode(data))
+    )[0]
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    print('fast codec: {}'.format(orjson and 'orjson' or 'not installed'))
+    for name, elapsed in sorted(benchmark().items()):
+        print('{:<12} {:8.3f}s'.format(name, elapsed))
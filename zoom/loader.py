@@ -0,0 +1,153 @@
+"""
+    zoom.loader
+
+    Loads app modules without changing the working directory or sys.path.
+
+    Each app module is loaded under a name unique to the directory it
+    lives in, so apps with modules of the same name (model.py, views.py)
+    don't collide in sys.modules and several threads can run different
+    apps at once.  Plain imports within those modules (import model) look
+    in the app directory first and then fall back to the usual import
+    system.
+"""
+
+import builtins
+import hashlib
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+
+from zoom.context import context
+
+_lock = threading.RLock()
+_builtins = {}
+
+# Turned off by servers whose processes keep the modules they have loaded,
+# such as the workers of the pre-forking server.
+reload_modules = True
+
+
+class app_context:
+    """App Context Manager
+
+    Makes path the current app directory for this thread, which is
+    what relative pathnames passed to zoom are resolved against.
+
+    >>> with app_context('/work/apps/hello'):
+    ...     resolve('about.md')
+    '/work/apps/hello/about.md'
+    >>> resolve('about.md')
+    'about.md'
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.saved = None
+
+    def __enter__(self):
+        self.saved = context.app_path
+        context.app_path = self.path
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        context.app_path = self.saved
+
+
+def resolve(pathname):
+    """Return pathname relative to the current app directory"""
+    if context.app_path is None or os.path.isabs(pathname):
+        return pathname
+    return os.path.join(context.app_path, pathname)
+
+
+def module_name(path, name):
+    """Return the name an app module is loaded under
+
+    >>> module_name('/work/apps/hello', 'model')
+    '_zoom_app_8ba0f447e6f1_model'
+    """
+    digest = hashlib.md5(path.encode('utf8')).hexdigest()[:12]
+    return '_zoom_app_{}_{}'.format(digest, name)
+
+
+def find_source(path, name):
+    """Return the file providing module name in path, if there is one"""
+    pathname = os.path.join(path, name + '.py')
+    if os.path.isfile(pathname):
+        return pathname, False
+    pathname = os.path.join(path, name, '__init__.py')
+    if os.path.isfile(pathname):
+        return pathname, True
+    return None, False
+
+
+def get_builtins(path):
+    """Return builtins with an __import__ that looks in path first"""
+
+    def app_import(name, globals=None, locals=None, fromlist=(), level=0):
+        # pylint: disable=redefined-builtin
+        if level == 0:
+            top = name.partition('.')[0]
+            module = sys.modules.get(module_name(path, top))
+            if module is None:
+                pathname, package = find_source(path, top)
+                if pathname:
+                    module = load(path, top, pathname, package, reload=False)
+            if module is not None:
+                if name == top:
+                    return module
+                submodule = importlib.import_module(
+                    module.__name__ + name[len(top):]
+                )
+                return submodule if fromlist else module
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    result = _builtins.get(path)
+    if result is None:
+        result = dict(builtins.__dict__, __import__=app_import)
+        _builtins[path] = result
+    return result
+
+
+def load(path, name, pathname, package=False, reload=True):
+    """Load the module name of the app in path from pathname"""
+    qualified_name = module_name(path, name)
+    with _lock:
+        if not reload and qualified_name in sys.modules:
+            return sys.modules[qualified_name]
+        spec = importlib.util.spec_from_file_location(
+            qualified_name,
+            pathname,
+            submodule_search_locations=(
+                [os.path.dirname(pathname)] if package else None
+            ),
+        )
+        module = importlib.util.module_from_spec(spec)
+        module.__builtins__ = get_builtins(path)
+        sys.modules[qualified_name] = module
+        try:
+            with app_context(path):
+                spec.loader.exec_module(module)
+        except BaseException:
+            sys.modules.pop(qualified_name, None)
+            raise
+    return module
+
+
+def load_module(module, filename):
+    """Dynamically load a module
+
+    The module is loaded afresh each time so changes to the file are
+    picked up, unless reload_modules has been turned off, in which case
+    it is loaded once.  The other modules it imports from the app
+    directory are loaded once.
+    """
+    pathname = os.path.realpath(filename)
+    if os.path.exists(pathname):
+        return load(
+            os.path.dirname(pathname), module, pathname,
+            reload=reload_modules,
+        )
+    return None
@@ -14,9 +14,11 @@
 # case it's what we want.
 
 
-import io
+import functools
+import inspect
 import os
 import sys
+import timeit
 import traceback
 import logging
 
@@ -42,15 +44,19 @@ import zoom.context
 import zoom.cookies
 import zoom.html as html
 import zoom.logging
+import zoom.outputcache
 import zoom.session
+import zoom.site
 import zoom.sites
 import zoom.templates
 import zoom.users
 import zoom.component
+import zoom.compression
 import zoom.request
 import zoom.profiler
 from zoom.page import page
 from zoom.helpers import tag_for
+from zoom.loader import resolve
 from zoom.tools import websafe
 from zoom.utils import create_csrf_token
 import zoom.components.flags
@@ -179,7 +185,7 @@ def serve_response(*path):
     exists = os.path.exists
     isfile = os.path.isfile
     t = os.path.join(*path)
-    pathname = os.path.realpath(t)
+    pathname = os.path.realpath(resolve(t))
 
     logger = logging.getLogger(__name__)
     logger.debug('attempting to serve up file %r', pathname)
@@ -471,6 +477,89 @@ def serve_html(request, handler, *rest):
         return handler(request, *rest)
 
 
+FAST_ROUTES = (
+    ('/static/', 'static'),
+    ('/favicon.ico', 'static'),
+    ('/themes/', 'theme'),
+    ('/ping', 'health'),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def classify(path, routes=FAST_ROUTES):
+    """Classify a request path using a route table
+
+    Routes are matched by prefix, in order.  A prefix that does not end
+    with a slash only matches the exact path or paths below it.
+
+    >>> classify('/static/zoom/zoom.js')
+    'static'
+    >>> classify('/favicon.ico')
+    'static'
+    >>> classify('/themes/default/css/style.css')
+    'theme'
+    >>> classify('/ping')
+    'health'
+    >>> classify('/pingpong')
+    'app'
+    >>> classify('/content/index.html')
+    'app'
+    """
+    for prefix, kind in routes:
+        if prefix.endswith('/'):
+            if path.startswith(prefix):
+                return kind
+        elif path == prefix or path.startswith(prefix + '/'):
+            return kind
+    return 'app'
+
+
+def serve_fast_routes(request, handler, *rest):
+    """Serve static, theme and health check requests directly
+
+    Requests for static files, theme assets and health checks don't
+    need a site database, a session or a user, so they are answered
+    here, without going through the rest of the middleware stack.  That
+    keeps load balancer probes from opening database connections,
+    creating sessions and writing log entries.
+
+    Theme assets are located using the site configuration, which is
+    read without connecting to the site database.
+
+    >>> request = zoom.request.build('http://localhost/ping')
+    >>> response = serve_fast_routes(request, lambda a: False)
+    >>> response.status, zoom.jsonz.loads(response.content)
+    ('200 OK', {'status': 'OK'})
+
+    >>> request = zoom.request.build('http://localhost/static/zoom/zoom.js')
+    >>> result = serve_fast_routes(request, lambda a: False)
+    >>> isinstance(result, JavascriptResponse)
+    True
+
+    >>> request = zoom.request.build('http://localhost/home')
+    >>> serve_fast_routes(request, lambda a: False)
+    False
+    """
+    kind = request.route_kind = classify(request.path)
+
+    if kind == 'static':
+        return serve_favicon(request, serve_static, handler, *rest)
+
+    elif kind == 'health':
+        if not os.path.isdir(request.site_path):
+            return zoom.response.SiteNotFoundResponse(request)
+        return JSONResponse(dict(status='OK'))
+
+    elif kind == 'theme':
+        try:
+            request.site = zoom.site.BasicSite(request)
+        except zoom.exceptions.SiteMissingException:
+            return zoom.response.SiteNotFoundResponse(request)
+        return serve_themes(request, handler, *rest)
+
+    return handler(request, *rest)
+
+
 def get_csrf_token(session):
     """generate a csrf token
 
@@ -577,18 +666,15 @@ def capture_stdout(request, handler, *rest):
     >>> response.content
     'I said hey\\n'
     """
-    real_stdout = sys.stdout
-    sys.stdout = io.StringIO()
-    try:
-        result = handler(request, *rest)
-    finally:
-        printed_output = sys.stdout.getvalue()
-        sys.stdout.close()
-        sys.stdout = real_stdout
-        content = 'result' in locals() and getattr(result, 'content', None)
-        if isinstance(content, str) and '{*stdout*}' in result.content:
-            result.content = result.content.replace(
-                '{*stdout*}', websafe(printed_output))
+    with zoom.context.captured_stdout() as output:
+        try:
+            result = handler(request, *rest)
+        finally:
+            printed_output = output.getvalue()
+            content = 'result' in locals() and getattr(result, 'content', None)
+            if isinstance(content, str) and '{*stdout*}' in result.content:
+                result.content = result.content.replace(
+                    '{*stdout*}', websafe(printed_output))
     logger = logging.getLogger(__name__)
     logger.debug('captured stdout')
     return result
@@ -648,6 +734,30 @@ def display_errors(request, handler, *rest):
             zoom.templates.template_missing
         )
 
+    except zoom.exceptions.RequestTooLargeException as e:
+        logger = logging.getLogger(__name__)
+        logger.warning('rejecting request for %r: %s', request.path, e)
+        error_status = '413 Payload Too Large'
+        if request.env.get('HTTP_ACCEPT', '') == 'application/json':
+            return JSONResponse(dict(status=error_status), status=error_status)
+        return page(
+            'The information submitted was too large to accept.',
+            title='Request Too Large',
+            status=error_status
+        ).render(request)
+
+    except zoom.exceptions.BadRequestException as e:
+        logger = logging.getLogger(__name__)
+        logger.warning('rejecting request for %r: %s', request.path, e)
+        error_status = '400 Bad Request'
+        if request.env.get('HTTP_ACCEPT', '') == 'application/json':
+            return JSONResponse(dict(status=error_status), status=error_status)
+        return page(
+            'The information submitted could not be read.',
+            title='Bad Request',
+            status=error_status
+        ).render(request)
+
     except zoom.exceptions.UnauthorizedException:
         return page(
             'Your account privileges are not sufficient to access the requested resource.'
@@ -704,7 +814,9 @@ def reset_modules(request, handler, *rest):
 
     Memorizes the modules in use on the first round.  Then
     on every subsequent round, it removes any extra modules
-    before passing the request on.
+    before passing the request on.  Requests with reload_modules
+    turned off, as served by the pre-forking server, are passed
+    straight on.
 
     >>> def loader(request):
     ...     import zoom.audit
@@ -733,7 +845,9 @@ def reset_modules(request, handler, *rest):
         return (module in init_modules) or any(filter(module.startswith, sigs))
 
     global init_modules
-    if 'init_modules' in globals():
+    if not getattr(request, 'reload_modules', True):
+        pass
+    elif 'init_modules' in globals():
         removable = [x for x in list(sys.modules) if not keeper(x)]
         for module in removable:
             del sys.modules[module]
@@ -742,9 +856,153 @@ def reset_modules(request, handler, *rest):
     return handler(request, *rest)
 
 
-def _handle(request, handler, *rest):  # pragma: no cover
-    """invoke the next handler"""
-    return handler(request, *rest)
+layer_hooks = []
+
+
+def layer_name(handler):
+    """Return a readable name for a middleware handler
+
+    >>> layer_name(serve_static)
+    'zoom.middleware.serve_static'
+    """
+    module = getattr(handler, '__module__', None)
+    name = getattr(handler, '__qualname__', None) or repr(handler)
+    return module and '.'.join([module, name]) or name
+
+
+def accepts(handler, count):
+    """Return True if handler can be called with count positional args
+
+    >>> accepts(serve_static, 2)
+    True
+    >>> accepts(not_found, 2)
+    False
+    >>> accepts(len, 1)
+    True
+    """
+    try:
+        signature = inspect.signature(handler)
+    except (TypeError, ValueError):
+        return True
+    try:
+        signature.bind(*range(count))
+    except TypeError:
+        return False
+    return True
+
+
+def validate_handlers(handlers):
+    """Check that handlers can be assembled into a middleware chain
+
+    Every handler except the last is a layer, called with the request
+    and the next handler.  The last handler is called with the request
+    alone.
+
+    >>> validate_handlers([trap_errors, not_found])
+    >>> validate_handlers([])
+    Traceback (most recent call last):
+    ...
+    ValueError: no middleware handlers
+    >>> validate_handlers([not_found, trap_errors])
+    Traceback (most recent call last):
+    ...
+    TypeError: middleware handler zoom.middleware.not_found does not accept (request, next_handler)
+    """
+    if not handlers:
+        raise ValueError('no middleware handlers')
+    for position, handler in enumerate(handlers):
+        if not callable(handler):
+            raise TypeError('middleware handler {!r} is not callable'.format(handler))
+        last = position == len(handlers) - 1
+        if not accepts(handler, 1 if last else 2):
+            raise TypeError('middleware handler {} does not accept {}'.format(
+                layer_name(handler),
+                '(request)' if last else '(request, next_handler)',
+            ))
+
+
+def timed(handler, name, hooks):
+    """Wrap a handler so hooks are told how long it took"""
+    timer = timeit.default_timer
+
+    def timed_handler(request, *rest):
+        start = timer()
+        try:
+            return handler(request, *rest)
+        finally:
+            elapsed = timer() - start
+            for hook in hooks:
+                hook(request, name, elapsed)
+
+    return timed_handler
+
+
+def bind(handler, next_handler):
+    """Bind a layer to the handler that follows it"""
+
+    def layer(request, *rest):
+        return handler(request, next_handler, *rest)
+
+    return layer
+
+
+def compile_handlers(handlers, hooks=()):
+    """Compile a list of middleware handlers into a single callable
+
+    The chain is assembled once, from the innermost handler out, so
+    handling a request is a series of direct calls rather than passing
+    the remaining handlers along to each layer.  Layers keep the usual
+    handler(request, next_handler, *rest) signature.
+
+    Hooks are called as hook(request, name, elapsed) as each layer
+    returns, where elapsed is the time in seconds spent in that layer
+    and the layers below it.
+
+    >>> def greet(request, next_handler):
+    ...     return 'hello ' + next_handler(request)
+    >>> def name(request):
+    ...     return request
+    >>> timings = []
+    >>> chain = compile_handlers([greet, name], [
+    ...     lambda request, name, elapsed: timings.append(name)
+    ... ])
+    >>> chain('world')
+    'hello world'
+    >>> [name.split('.')[-1] for name in timings]
+    ['name', 'greet']
+    """
+    handlers = tuple(handlers)
+    validate_handlers(handlers)
+    hooks = tuple(hooks)
+
+    chain = handlers[-1]
+    if hooks:
+        chain = timed(chain, layer_name(chain), hooks)
+    for handler in reversed(handlers[:-1]):
+        chain = bind(handler, chain)
+        if hooks:
+            chain = timed(chain, layer_name(handler), hooks)
+    return chain
+
+
+@functools.lru_cache(maxsize=32)
+def compiled(handlers, hooks=()):
+    """Return the compiled chain for handlers, compiling it once"""
+    return compile_handlers(handlers, hooks)
+
+
+def record_layer_times(request, name, elapsed):
+    """Layer hook that keeps the time spent in each layer on the request
+
+    >>> request = zoom.utils.Bunch()
+    >>> record_layer_times(request, 'zoom.middleware.serve_static', 0.0012)
+    >>> request.layer_times
+    [('zoom.middleware.serve_static', Decimal('1.200'))]
+    """
+    times = getattr(request, 'layer_times', None)
+    if times is None:
+        times = request.layer_times = []
+    times.append((name, zoom.profiler.round(elapsed * 1000)))
 
 
 def handle(request, handlers=None):  # pragma: no cover
@@ -752,7 +1010,9 @@ def handle(request, handlers=None):  # pragma: no cover
     default_handlers = (
         trap_errors,
         zoom.profiler.handler,
+        zoom.compression.handler,
         zoom.request.handler,
+        serve_fast_routes,
         serve_redirects,
         serve_favicon,
         serve_static,
@@ -767,6 +1027,7 @@ def handle(request, handlers=None):  # pragma: no cover
         zoom.impersonation.handler,
         zoom.component.handler,
         zoom.users.handler,
+        zoom.outputcache.handler,
         zoom.render.handler,
         display_errors,
         check_csrf,
@@ -776,7 +1037,8 @@ def handle(request, handlers=None):  # pragma: no cover
         zoom.apps.handler,
         not_found,
     )
-    return _handle(request, *(handlers or default_handlers))
+    chain = compiled(tuple(handlers or default_handlers), tuple(layer_hooks))
+    return chain(request)
 
 
 DEBUGGING_HANDLERS = (
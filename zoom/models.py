@@ -11,7 +11,7 @@ import zoom
 from zoom.helpers import link_to, url_for_item, url_for
 from zoom.utils import Record
 from zoom.records import RecordStore
-from zoom.users import Users
+from zoom.users import Users, groups_changed
 from zoom.audit import audit
 
 
@@ -356,6 +356,7 @@ class Group(Record):
             )
         """
         db(cmd, self.group_id, subgroup.group_id)
+        groups_changed(db)
         audit(
             'add subgroup',
             self.name,
@@ -371,6 +372,7 @@ class Group(Record):
                 subgroup_id=%s
         """
         db(cmd, self.group_id, subgroup.group_id)
+        groups_changed(db)
         audit(
             'remove subgroup',
             self.name,
@@ -434,6 +436,8 @@ class Group(Record):
                         )
                     )
 
+            groups_changed(db)
+
         else:
             debug('subgroups unchanged')
 
@@ -496,6 +500,8 @@ class Group(Record):
                         self.name
                     )
 
+            groups_changed(db)
+
         else:
             debug('%s unchanged', kind)
 
@@ -651,6 +657,7 @@ class Groups(RecordStore):
         group_id = record['_id']
         debug = logging.getLogger(__name__).debug
         debug('created new group %r (%r)', name, group_id)
+        groups_changed(self.db)
         audit('create group', name)
 
     def after_update(self, record):
@@ -658,6 +665,7 @@ class Groups(RecordStore):
         group_id = record['_id']
         debug = logging.getLogger(__name__).debug
         debug('updated group %r (%r)', name, group_id)
+        groups_changed(self.db)
         audit('update group', name)
 
     def after_delete(self, record):
@@ -667,6 +675,7 @@ class Groups(RecordStore):
         """
         debug = logging.getLogger(__name__).debug
         debug('deleted group %r (%r)', record['name'], record['group_id'])
+        groups_changed(self.db)
         audit('delete group', record['name'])
 
     def add_app(self, name):
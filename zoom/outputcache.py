@@ -0,0 +1,482 @@
+"""
+    zoom.outputcache
+
+    Caches rendered pages and page fragments.
+
+    Sites turn on page caching with pages=1 in the [caching] section of
+    site.ini.  The page cache handler then keeps the fully rendered
+    response to each GET request made by an anonymous visitor, keyed by
+    site, path, query and theme, and serves it to the next anonymous
+    visitor without running the app, the templates or the helper fill.
+    Pages that carry something particular to a session, like a form
+    with its CSRF token or an alert, are not kept.
+
+    Functions that produce fragments can be cached with the cached_output
+    decorator, which keys results by the function, its arguments, the
+    site, the theme and whether the user is anonymous or authenticated.
+
+    Entries expire after their ttl.  Entries can also be tagged with the
+    kinds of stored data they depend on, and are discarded when a store
+    of that kind is changed.  A page that uses cached fragments depends
+    on the tags of those fragments, and apps can add tags to the current
+    page with depends_on.
+
+    Entries are kept in memory, per process, or on disk, where they are
+    shared by all the processes serving the site.  Select the backend
+    with backend=memory or backend=disk in [caching].  Either backend
+    keeps at most max_entries entries.
+
+    Invalidation of memory entries only reaches the process where the
+    store was changed.  Other processes, such as the other workers of
+    the pre-forking server, go on serving their copies until the ttl
+    runs out, so sites served by several processes that depend on tags
+    to refresh pages should use the disk backend.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import zoom.store
+from zoom.context import context, captured_output
+from zoom.response import Response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = dict(
+    pages=False,
+    page_ttl=60,
+    backend='memory',
+    path=None,
+    max_entries=1000,
+)
+
+
+def digest(value):
+    """return a digest of a value suitable for a file name
+
+    >>> digest(('localhost', '/about'))
+    'd0b49a870ac202dc7e5a8009dfe5bcc30ef7d0f8'
+    """
+    return hashlib.sha1(repr(value).encode('utf8')).hexdigest()
+
+
+class MemoryBackend(object):
+    """keeps entries in memory, discarding the least recently used
+
+    Entries and tag versions belong to the process, so invalidating a
+    tag only discards the entries of the process that invalidated it.
+
+    >>> cache = MemoryBackend(max_entries=2)
+    >>> cache.set('a', 1, 60)
+    >>> cache.set('b', 2, 60, tags=['page_collection'])
+    >>> cache.get('a'), cache.get('b')
+    (1, 2)
+    >>> cache.invalidate('page_collection')
+    >>> cache.get('b') is None
+    True
+    >>> cache.set('c', 3, 60)
+    >>> cache.set('d', 4, 60)
+    >>> cache.get('a') is None
+    True
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def tag_versions(self, tags):
+        return {tag: self.tags.get(tag, 0) for tag in tags}
+
+    def get(self, key):
+        """return the value saved for key, if it is still current"""
+        key = digest(key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, versions, value = entry
+            if expires < time.time() or versions != self.tag_versions(versions):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        """save value for key for ttl seconds"""
+        key = digest(key)
+        with self.lock:
+            for tag in tags:
+                self.tags.setdefault(tag, 0)
+            self.entries[key] = (
+                time.time() + ttl, self.tag_versions(tags), value
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tag):
+        """discard the entries tagged with tag"""
+        with self.lock:
+            if tag in self.tags:
+                self.tags[tag] += 1
+
+    def clear(self):
+        """discard all entries"""
+        with self.lock:
+            self.entries.clear()
+
+
+class DiskBackend(object):
+    """keeps entries in files so processes can share them
+
+    Each entry file has its expiry time as its modification time.  Every
+    sweep_interval saves, expired entries are removed, along with those
+    due to expire soonest if there are still more than max_entries.
+
+    Each tag has a file whose modification time is its version.  The
+    file is made when an entry is first saved with the tag, so changes
+    to kinds of data that no entry depends on cost nothing.
+
+    >>> path = tempfile.mkdtemp()
+    >>> cache = DiskBackend(path)
+    >>> cache.set('a', 'fragment', 60, tags=['page_collection'])
+    >>> DiskBackend(path).get('a')
+    'fragment'
+    >>> DiskBackend(path).invalidate('page_collection')
+    >>> cache.get('a') is None
+    True
+
+    >>> cache = DiskBackend(tempfile.mkdtemp(), max_entries=2, sweep_interval=1)
+    >>> for n, key in enumerate('abc'):
+    ...     cache.set(key, n, 60 + n)
+    >>> cache.get('a') is None, cache.get('b'), cache.get('c')
+    (True, 1, 2)
+    """
+
+    def __init__(self, path, max_entries=1000, sweep_interval=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.saves = 0
+        os.makedirs(os.path.join(path, 'tags'), exist_ok=True)
+
+    def tag_versions(self, tags):
+        result = {}
+        for tag in tags:
+            try:
+                result[tag] = os.stat(self.tag_file(tag)).st_mtime_ns
+            except FileNotFoundError:
+                result[tag] = 0
+        return result
+
+    def tag_file(self, tag):
+        return os.path.join(self.path, 'tags', digest(tag))
+
+    def entry_file(self, key):
+        return os.path.join(self.path, digest(key))
+
+    def get(self, key):
+        """return the value saved for key, if it is still current"""
+        pathname = self.entry_file(key)
+        try:
+            with open(pathname, 'rb') as reader:
+                expires, versions, value = pickle.load(reader)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time() or versions != self.tag_versions(versions):
+            try:
+                os.remove(pathname)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl, tags=()):
+        """save value for key for ttl seconds"""
+        for tag in tags:
+            pathname = self.tag_file(tag)
+            if not os.path.exists(pathname):
+                with open(pathname, 'a'):
+                    pass
+        expires = time.time() + ttl
+        entry = (expires, self.tag_versions(tags), value)
+        handle, temp = tempfile.mkstemp(dir=self.path, prefix='.')
+        with os.fdopen(handle, 'wb') as writer:
+            pickle.dump(entry, writer)
+        os.utime(temp, (expires, expires))
+        os.replace(temp, self.entry_file(key))
+        self.saves += 1
+        if self.saves % self.sweep_interval == 0:
+            self.sweep()
+
+    def sweep(self):
+        """remove expired entries and keep at most max_entries"""
+        now = time.time()
+        entries = []
+        with os.scandir(self.path) as items:
+            for item in items:
+                if not item.is_file():
+                    continue
+                try:
+                    modified = item.stat().st_mtime
+                    if not item.name.startswith('.'):
+                        entries.append((modified, item.path))
+                    elif modified < now - 3600:
+                        # left behind by a save that didn't finish
+                        os.remove(item.path)
+                except OSError:
+                    continue
+        entries.sort()
+        excess = len(entries) - self.max_entries
+        for n, (expires, pathname) in enumerate(entries):
+            if expires >= now and n >= excess:
+                break
+            try:
+                os.remove(pathname)
+            except OSError:
+                pass
+
+    def invalidate(self, tag):
+        """discard the entries tagged with tag"""
+        pathname = self.tag_file(tag)
+        try:
+            stat = os.stat(pathname)
+        except FileNotFoundError:
+            return
+        # make sure the version moves on even within the timer resolution
+        os.utime(pathname, ns=(stat.st_atime_ns, max(
+            time.time_ns(), stat.st_mtime_ns + 1
+        )))
+
+    def clear(self):
+        """discard all entries"""
+        for name in os.listdir(self.path):
+            pathname = os.path.join(self.path, name)
+            if os.path.isfile(pathname):
+                os.remove(pathname)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_settings(site):
+    """return the caching settings of site"""
+    return getattr(site, 'output_cache', None) or DEFAULT_SETTINGS
+
+
+def get_backend(site=None):
+    """return the cache backend for site"""
+    settings = get_settings(site)
+    if settings.get('backend') == 'disk':
+        path = settings.get('path') or os.path.join(
+            getattr(site, 'data_path', tempfile.gettempdir()), 'cache'
+        )
+        key = ('disk', path)
+    else:
+        key = ('memory', None)
+
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if key[0] == 'disk':
+                backend = DiskBackend(
+                    key[1], settings.get('max_entries', 1000)
+                )
+            else:
+                backend = MemoryBackend(settings.get('max_entries', 1000))
+            _backends[key] = backend
+    return backend
+
+
+def invalidate(*tags):
+    """discard cached output tagged with any of tags
+
+    The backend configured for the current site is always told, even if
+    this process hasn't cached anything yet, so a change made by one
+    process reaches the disk entries that other processes are serving.
+    """
+    site = context.site
+    if site is not None:
+        get_backend(site)
+    with _backends_lock:
+        backends = list(_backends.values())
+    for backend in backends:
+        for tag in tags:
+            backend.invalidate(tag)
+
+
+zoom.store.change_listeners.append(invalidate)
+
+
+def clear():
+    """discard all cached output"""
+    with _backends_lock:
+        backends = list(_backends.values())
+    for backend in backends:
+        backend.clear()
+
+
+def user_class(request):
+    """return the class of user making the request"""
+    user = getattr(request, 'user', None)
+    if user is not None and getattr(user, 'is_authenticated', False):
+        return 'authenticated'
+    return 'anonymous'
+
+
+def depends_on(*tags):
+    """note that the current page depends on data tagged with tags"""
+    request = context.request
+    if request is not None:
+        request.cache_tags = getattr(request, 'cache_tags', set()) | set(tags)
+
+
+def cached_output(ttl=300, tags=(), anonymous_only=False):
+    """decorator that caches the output of a function
+
+    anonymous_only limits caching to requests made by anonymous users,
+    for output that is particular to the user when they are signed in.
+
+    >>> calls = []
+    >>> @cached_output(ttl=60, tags=['things'])
+    ... def fragment(name):
+    ...     calls.append(name)
+    ...     return '<b>%s</b>' % name
+    >>> fragment('one'), fragment('one'), fragment('two')
+    ('<b>one</b>', '<b>one</b>', '<b>two</b>')
+    >>> calls
+    ['one', 'two']
+    >>> invalidate('things')
+    >>> fragment('one')
+    '<b>one</b>'
+    >>> calls
+    ['one', 'two', 'one']
+    """
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            request = context.request
+            site = context.site
+            users = user_class(request)
+            if anonymous_only and users != 'anonymous':
+                return function(*args, **kwargs)
+
+            depends_on(*tags)
+            key = (
+                'fragment',
+                getattr(site, 'name', None),
+                getattr(site, 'theme', None),
+                users,
+                function.__module__,
+                function.__qualname__,
+                args,
+                sorted(kwargs.items()),
+            )
+            backend = get_backend(site)
+            result = backend.get(key)
+            if result is None:
+                result = function(*args, **kwargs)
+                if result is not None:
+                    backend.set(key, result, ttl, tags)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def page_key(request):
+    """return the cache key for a page request"""
+    site = request.site
+    return (
+        'page',
+        site.name,
+        getattr(site, 'theme', None),
+        user_class(request),
+        request.path,
+        request.query or '',
+    )
+
+
+def pending_alerts():
+    """return True if there are alerts waiting to be shown"""
+    parts = getattr(getattr(context, 'parts', None), 'parts', {})
+    return any(parts.get(name) for name in ('success', 'warning', 'error'))
+
+
+def cacheable(request, response):
+    """return the body of response if it can be shared"""
+    headers = response.headers
+    cache_control = headers.get('Cache-Control', '')
+    if (
+            not str(response.status).startswith('200') or
+            response.cookie or
+            'no-store' in cache_control or
+            'Content-Encoding' in headers or
+            pending_alerts() or
+            captured_output()
+    ):
+        return None
+
+    content = response.render_doc()
+    if not isinstance(content, bytes):
+        return None
+
+    # pages holding a CSRF token belong to the session they were made for
+    token = getattr(getattr(request, 'session', None), 'csrf_token', None)
+    if token and token.encode('utf8') in content:
+        return None
+
+    return content
+
+
+def handler(request, next_handler, *rest):
+    """serve pages for anonymous visitors from the cache"""
+
+    settings = get_settings(request.site)
+    if (
+            not settings.get('pages') or
+            request.method != 'GET' or
+            user_class(request) != 'anonymous' or
+            pending_alerts()
+    ):
+        return next_handler(request, *rest)
+
+    backend = get_backend(request.site)
+    key = page_key(request)
+    cached = backend.get(key)
+    if cached is not None:
+        status, headers, content = cached
+        logger.debug('page cache hit for %r', request.path)
+        request.profiler.add('page served from cache')
+        return Response(content, status, headers)
+
+    request.cache_tags = set()
+    response = next_handler(request, *rest)
+
+    content = cacheable(request, response)
+    if content is not None:
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name not in ('Content-length', 'Set-Cookie')
+        ]
+        backend.set(
+            key,
+            (response.status, headers, content),
+            settings.get('page_ttl', DEFAULT_SETTINGS['page_ttl']),
+            request.cache_tags,
+        )
+
+    return response
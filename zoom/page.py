@@ -2,9 +2,7 @@
     zoom.page
 """
 
-import io
 import logging
-import sys
 
 import zoom
 from zoom.component import render
@@ -155,10 +153,10 @@ class Page(object):
             return self.content
 
         def get_stdout():
-            stdout = sys.stdout.getvalue()
+            stdout = zoom.context.captured_output()
             if stdout:
-                sys.stdout.close()
-                sys.stdout = io.StringIO()
+                zoom.system.stdout.seek(0)
+                zoom.system.stdout.truncate()
             value = ''.join(
                 list(zoom.system.parts.parts.get('stdout', [])) +
                 [stdout]
@@ -3,13 +3,12 @@
 """
 
 from decimal import Decimal
-import io
 import timeit
 import logging
 import cProfile
 import os
-import sys
 
+import zoom.context
 from zoom.utils import ItemList
 from zoom.response import HTMLResponse
 
@@ -87,14 +86,9 @@ def get_profile_data(profiler):
     >>> get_profile_data(Profiler())
     'the stats!\\n'
     """
-    save_stdout = sys.stdout
-    try:
-        sys.stdout = io.StringIO()
+    with zoom.context.captured_stdout() as output:
         profiler.print_stats()
-        result = sys.stdout.getvalue()
-    finally:
-        sys.stdout = save_stdout
-    return result
+    return output.getvalue()
 
 
 def profiled(request, next_handler, *rest):
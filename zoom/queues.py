@@ -26,6 +26,12 @@ __all__ = [
 
 DEFAULT_DELAY = 0.1
 DEFAULT_TIMEOUT = 15
+DEFAULT_VISIBILITY_TIMEOUT = 60
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 1
+MAX_BACKOFF = 3600
+DEAD_LETTER_SUFFIX = '.dead'
+NEVER_LEASED = '1900-01-01 00:00:00'
 
 now = datetime.datetime.now
 
@@ -62,6 +68,45 @@ def response_topic_name(topic, id):
     return '%s.response.%s' % (topic, id)
 
 
+def dead_letter_topic_name(topic):
+    """calculate the name of the dead letter topic for a topic
+
+    >>> dead_letter_topic_name('mail')
+    'mail.dead'
+    """
+    return topic + DEAD_LETTER_SUFFIX
+
+
+def stamp(value):
+    """format a datetime the way the entity store saves it
+
+    Lease times are compared as strings in the attributes table so they
+    must be formatted exactly as EntityStore formats datetime values.
+
+    >>> stamp(datetime.datetime(2020, 1, 2, 3, 4, 5))
+    '2020-01-02 03:04:05'
+    """
+    return '%04d-%02d-%02d %02d:%02d:%02d' % (
+        value.year,
+        value.month,
+        value.day,
+        value.hour,
+        value.minute,
+        value.second,
+    )
+
+
+def backoff_delay(attempts, backoff=DEFAULT_BACKOFF):
+    """calculate the exponential backoff delay in seconds for a retry
+
+    >>> [backoff_delay(n) for n in range(1, 6)]
+    [1, 2, 4, 8, 16]
+    >>> backoff_delay(50)
+    3600
+    """
+    return min(backoff * 2 ** (max(attempts, 1) - 1), MAX_BACKOFF)
+
+
 def setup_test():
     from zoom.database import setup_test
     db = setup_test()
@@ -90,11 +135,22 @@ class Topic(object):
     message topic
     """
 
-    def __init__(self, name, newest=None, db=None):
+    def __init__(
+            self,
+            name,
+            newest=None,
+            db=None,
+            visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            backoff=DEFAULT_BACKOFF,
+        ):
         self.name = name
         self.db = db
         self.messages = EntityStore(db, Message)
         self.newest = newest is not None and newest or self.last() or -1
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
 
     def last(self):
         """get row_id of the last (newest) message in the topic"""
@@ -115,12 +171,15 @@ class Topic(object):
 
     def put(self, message):
         """put a message in the topic"""
+        timestamp = now()
         return self.messages.put(
             Message(
                 topic=self.name,
-                timestamp=now(),
+                timestamp=timestamp,
                 node=platform.node(),
                 body=json.dumps(message),
+                visible_after=timestamp,
+                attempts=0,
             )
         )
 
@@ -258,18 +317,266 @@ class Topic(object):
         return self._poll(newest)[2]
 
     def _pop(self):
-        r = self._peek()
-        row_id = r[0]
-        self.messages.delete(row_id)
+        row_id, topic, message = self._claim()
+        self.ack(row_id)
         if self.messages.db.rowcount > 0:
-            self.newest = row_id
-            return r
+            self.newest = max(self.newest, row_id)
+            return row_id, topic, message
         else:
             # If we were unable to delete it then soneone else
             # has already deleted it between the time that
-            # we saw it and the time we attempted to delete it.
+            # we claimed it and the time we attempted to delete it.
             raise EmptyException
 
+    def _set(self, row_id, **values):
+        """replace lease attributes of a message we hold"""
+        for attribute, value in values.items():
+            if isinstance(value, datetime.datetime):
+                datatype, value = 'datetime.datetime', stamp(value)
+            else:
+                datatype = type(value).__name__
+            self.db(
+                'delete from attributes where row_id=%s and attribute=%s',
+                row_id, attribute
+            )
+            self.db(
+                'insert into attributes ('
+                '    kind, row_id, attribute, datatype, value'
+                ') values (%s,%s,%s,%s,%s)',
+                self.messages.kind, row_id, attribute, datatype, value
+            )
+
+    def _candidate(self):
+        """find the oldest message that is visible now"""
+        cmd = """
+            select t.row_id, v.value
+            from attributes t
+            left join attributes v
+                on v.row_id=t.row_id and v.attribute="visible_after"
+            where
+                t.kind=%s and
+                t.attribute="topic" and
+                {}
+                (v.value is null or v.value <= %s)
+            order by t.row_id
+            limit 1
+            """
+        if self.name:
+            rec = self.db(
+                cmd.format('t.value=%s and'),
+                self.messages.kind, self.name, stamp(now())
+            )
+        else:
+            rec = self.db(cmd.format(''), self.messages.kind, stamp(now()))
+        if type(rec) == int or rec is None:
+            return None
+        return rec.first()
+
+    def _claim(self):
+        """claim the next visible message for the visibility timeout
+
+        Claiming a message makes it invisible to other consumers until
+        the lease expires, at which point it is delivered again unless it
+        has been acknowledged with ack() or released with fail().
+        Messages that have been delivered more than max_attempts times
+        are moved to the dead letter topic.
+
+            >>> messages = setup_test()
+            >>> t = messages.get('test_topic')
+            >>> t.put('hey!')
+            1
+            >>> t.put('you!')
+            2
+            >>> t._claim()
+            (1, 'test_topic', 'hey!')
+            >>> t._claim()
+            (2, 'test_topic', 'you!')
+            >>> raised = False
+            >>> try:
+            ...     t._claim()
+            ... except EmptyException:
+            ...     raised = True
+            >>> raised
+            True
+            >>> t.len()
+            2
+        """
+        def decoded(value):
+            if type(value) is bytes:
+                return value.decode('utf8')
+            return value
+
+        while True:
+            candidate = self._candidate()
+            if not candidate:
+                raise EmptyException
+
+            row_id, lease = candidate
+            message = self.messages.get(row_id)
+            if not (message and message.body is not None and message.topic is not None):
+                # see _peek for why incomplete messages are ignored
+                raise EmptyException
+
+            if lease is None:
+                # message written before leases existed; only add the lease
+                # if no other consumer has added one in the meantime
+                lease = NEVER_LEASED
+                self.db(
+                    'insert into attributes ('
+                    '    kind, row_id, attribute, datatype, value'
+                    ') select t.kind, t.row_id, "visible_after", '
+                    '    "datetime.datetime", %s '
+                    'from attributes t '
+                    'where t.row_id=%s and t.attribute="topic" and not exists ('
+                    '    select 1 from attributes v '
+                    '    where v.row_id=t.row_id and v.attribute="visible_after"'
+                    ')',
+                    lease, row_id
+                )
+
+            # leases are stored to the second so they must move forward by at
+            # least one second for the compare and set below to register
+            lease_time = max(self.visibility_timeout, 1)
+            expires = now() + datetime.timedelta(seconds=lease_time)
+            self.db(
+                'update attributes set value=%s '
+                'where row_id=%s and attribute="visible_after" and value=%s',
+                stamp(expires), row_id, decoded(lease)
+            )
+            if not self.db.rowcount:
+                # another consumer claimed it first
+                continue
+
+            attempts = (message.get('attempts') or 0) + 1
+            if attempts > self.max_attempts:
+                self.bury(row_id, message.get('error'))
+                continue
+
+            self._set(row_id, attempts=attempts, state='claimed')
+            return row_id, decoded(message.topic), json.loads(decoded(message.body))
+
+    def claim(self, limit=1):
+        """claim up to limit visible messages
+
+        Returns a list of (row_id, message) pairs.  Each message should
+        be acknowledged with ack() once it has been handled, or released
+        with fail(), before its visibility timeout runs out.
+
+            >>> messages = setup_test()
+            >>> t = messages.get('test_topic')
+            >>> t.send('hey!', 'you!', 'there!')
+            [1, 2, 3]
+            >>> t.claim(2)
+            [(1, 'hey!'), (2, 'you!')]
+            >>> t.claim(2)
+            [(3, 'there!')]
+            >>> t.claim(2)
+            []
+        """
+        claimed = []
+        while len(claimed) < limit:
+            try:
+                row_id, _, message = self._claim()
+            except EmptyException:
+                break
+            claimed.append((row_id, message))
+        return claimed
+
+    def ack(self, row_id):
+        """acknowledge a claimed message, removing it from the topic"""
+        self.messages.delete(row_id)
+
+    def release(self, row_id):
+        """return a claimed message to the topic without using an attempt
+
+        Used when handling was interrupted rather than failed, so the
+        message is delivered again right away.
+
+            >>> messages = setup_test()
+            >>> t = messages.get('test_topic')
+            >>> t.put('hey!')
+            1
+            >>> row_id, _, _ = t._claim()
+            >>> t.release(row_id)
+            >>> t.claim()
+            [(1, 'hey!')]
+            >>> t.messages.get(row_id).attempts
+            1
+        """
+        message = self.messages.get(row_id)
+        if not message:
+            return
+        attempts = max((message.get('attempts') or 0) - 1, 0)
+        self._set(
+            row_id,
+            visible_after=now(),
+            state='pending',
+            attempts=attempts,
+        )
+
+    def fail(self, row_id, error=None):
+        """release a claimed message for a later retry
+
+        The message becomes visible again after an exponential backoff
+        delay, or is moved to the dead letter topic if it has used up
+        its attempts.
+
+            >>> messages = setup_test()
+            >>> t = messages.get('test_topic', max_attempts=1)
+            >>> t.put('hey!')
+            1
+            >>> row_id, _, _ = t._claim()
+            >>> t.fail(row_id, 'oops')
+            >>> t.len()
+            0
+            >>> dead = messages.get('test_topic.dead')
+            >>> dead.pop()
+            'hey!'
+        """
+        message = self.messages.get(row_id)
+        if not message:
+            return
+        attempts = message.get('attempts') or 0
+        if attempts >= self.max_attempts:
+            self.bury(row_id, error)
+        else:
+            delay = backoff_delay(attempts, self.backoff)
+            self._set(
+                row_id,
+                visible_after=now() + datetime.timedelta(seconds=delay),
+                state='retrying',
+                error=str(error),
+            )
+
+    def bury(self, row_id, error=None):
+        """move a message to the dead letter topic"""
+        message = self.messages.get(row_id)
+        if not message:
+            return
+        topic = message.topic
+        if type(topic) is bytes:
+            topic = topic.decode('utf8')
+        timestamp = now()
+        self.messages.put(
+            Message(
+                topic=dead_letter_topic_name(topic),
+                timestamp=timestamp,
+                node=platform.node(),
+                body=message.body,
+                visible_after=timestamp,
+                attempts=0,
+                origin=row_id,
+                failures=message.get('attempts') or 0,
+                error=str(error),
+            )
+        )
+        self.ack(row_id)
+        logger = logging.getLogger(__name__)
+        logger.warning(
+            'message %s moved to %s: %s',
+            row_id, dead_letter_topic_name(topic), error
+        )
+
     def pop(self):
         """
         read next message and remove it from the topic
@@ -498,18 +805,33 @@ class Topic(object):
                     more_to_do = True
                     while more_to_do:
                         try:
-                            row, topic, message = self._pop()
-                            result = f(message)
-                            t = Topic(
-                                response_topic_name(topic, row),
-                                None,
-                                self.db
-                            )
-                            t.send(result)
-                            deadline = timeout and time.time() + timeout
-                            n += 1
+                            row, topic, message = self._claim()
                         except EmptyException:
                             more_to_do = False
+                        else:
+                            try:
+                                result = f(message)
+                            except StopHandling:
+                                self.ack(row)
+                                raise
+                            except KeyboardInterrupt:
+                                # interrupted, not handled, so deliver it again
+                                self.release(row)
+                                raise
+                            except Exception as error:
+                                logger = logging.getLogger(__name__)
+                                logger.exception('error handling message %s', row)
+                                self.fail(row, error)
+                            else:
+                                t = Topic(
+                                    response_topic_name(topic, row),
+                                    None,
+                                    self.db
+                                )
+                                t.send(result)
+                                self.ack(row)
+                                n += 1
+                            deadline = timeout and time.time() + timeout
                         time.sleep(0)
                 except StopHandling:
                     done = True
@@ -546,19 +868,27 @@ class Topic(object):
         more_to_do = True
         while more_to_do:
             try:
-                row, topic, message = self._pop()
+                row, topic, message = self._claim()
+            except EmptyException:
+                break
+            try:
                 if message is None:
                     result = f()
                 else:
                     result = f(message)
+            except StopProcessing:
+                self.ack(row)
+                more_to_do = False
+            except Exception as error:
+                logger = logging.getLogger(__name__)
+                logger.exception('error processing message %s', row)
+                self.fail(row, error)
+            else:
                 response_topic = response_topic_name(topic, row)
                 t = Topic(response_topic, None, self.db)
                 t.put(result)
+                self.ack(row)
                 n += 1
-            except StopProcessing:
-                more_to_do = False
-            except EmptyException:
-                more_to_do = False
             time.sleep(0)
         return n
 
@@ -583,18 +913,22 @@ class Topic(object):
             False
         """
         try:
-            row, topic, message = self._pop()
+            row, topic, message = self._claim()
+        except EmptyException:
+            return False
+        try:
             if message is None:
                 result = task(*args, **kwargs)
             else:
                 result = task(message, *args, **kwargs)
-            response_topic = response_topic_name(topic, row)
-            response_queue = Topic(response_topic, None, self.db)
-            response_queue.put(result)
-        except EmptyException:
-            return False
-        else:
-            return True
+        except Exception as error:
+            self.fail(row, error)
+            raise
+        response_topic = response_topic_name(topic, row)
+        response_queue = Topic(response_topic, None, self.db)
+        response_queue.put(result)
+        self.ack(row)
+        return True
 
 
 class Queues(object):
@@ -613,11 +947,11 @@ class Queues(object):
     def __init__(self, db=None):
         self.db = db
 
-    def get(self, name, newest=None):
-        return Topic(name, newest, self.db)
+    def get(self, name, newest=None, **options):
+        return Topic(name, newest, self.db, **options)
 
-    def topic(self, name, newest=None):
-        return Topic(name, newest, self.db)
+    def topic(self, name, newest=None, **options):
+        return Topic(name, newest, self.db, **options)
 
     def topics(self):
         cmd = """
@@ -630,14 +964,45 @@ class Queues(object):
         return [a for a, in self.db(cmd, kind)]
 
     def stats(self):
+        """report message counts by topic
+
+        Along with the total count, reports the number of messages
+        currently claimed by a consumer (in_flight), waiting for a retry
+        (retrying) and sitting in a dead letter topic (dead).
+
+            >>> messages = setup_test()
+            >>> t = messages.get('test_topic', max_attempts=1)
+            >>> t.send('hey!', 'you!', 'there!')
+            [1, 2, 3]
+            >>> row_id, _, _ = t._claim()
+            >>> t.fail(row_id, 'oops')
+            >>> row_id, _, _ = t._claim()
+            >>> print(messages.stats())
+            topic           count in_flight retrying dead
+            --------------- ----- --------- -------- ----
+            test_topic          2         1        0    0
+            test_topic.dead     1         0        0    1
+        """
         cmd = """
-            select value, count(*) as count
-            from attributes
-            where kind=%s and attribute="topic"
-            group by value
+            select
+                t.value as topic,
+                count(*) as count,
+                sum(case
+                    when s.value='claimed' and v.value > %s then 1 else 0
+                end) as in_flight,
+                sum(case when s.value='retrying' then 1 else 0 end) as retrying,
+                sum(case when t.value like %s then 1 else 0 end) as dead
+            from attributes t
+            left join attributes s
+                on s.row_id=t.row_id and s.attribute='state'
+            left join attributes v
+                on v.row_id=t.row_id and v.attribute='visible_after'
+            where t.kind=%s and t.attribute='topic'
+            group by t.value
+            order by t.value
         """
         kind = EntityStore(self.db, Message).kind
-        return self.db(cmd, kind)
+        return self.db(cmd, stamp(now()), '%' + DEAD_LETTER_SUFFIX, kind)
 
     def clear(self):
         return EntityStore(self.db, Message).zap()
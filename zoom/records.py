@@ -276,6 +276,7 @@ class RecordStore(Store):
             self.after_update(record)
         else:
             self.after_insert(record)
+        self.changed()
 
         return _id
 
@@ -383,6 +384,7 @@ class RecordStore(Store):
 
             for rec in affected:
                 self.after_delete(rec)
+            self.changed()
 
             return ids
 
@@ -519,6 +521,7 @@ class RecordStore(Store):
         """
         cmd = 'delete from `%s`' % (self.kind)
         self.db(cmd)
+        self.changed()
 
     def __len__(self):
         """
@@ -6,10 +6,88 @@
 
 
 import logging
+from hashlib import md5
 
 import zoom
 import zoom.fill
 import zoom.helpers
+from zoom.response import NotModifiedResponse
+
+
+class Lazy:
+    """a helper value that is only computed if a template uses it
+
+    The value is computed the first time the helper is used and the
+    result is reused after that, so expensive helpers such as menus
+    cost nothing unless they appear in the page.
+
+    >>> calls = []
+    >>> def menu():
+    ...     calls.append(1)
+    ...     return '<ul></ul>'
+    >>> helper = lazy(menu)
+    >>> calls
+    []
+    >>> helper(), helper()
+    ('<ul></ul>', '<ul></ul>')
+    >>> calls
+    [1]
+    """
+
+    def __init__(self, thunk):
+        self.thunk = thunk
+        self.computed = False
+        self.value = None
+
+    def __call__(self, *args, **kwargs):
+        if not self.computed:
+            self.value = self.thunk()
+            self.computed = True
+        return self.value
+
+
+lazy = Lazy
+
+
+class HelperRegistry:
+    """looks up helpers in a list of providers
+
+    Providers are searched from last to first so later providers
+    override earlier ones, just as if they had been merged in order, but
+    without building a merged dict for every fill.  Providers can be
+    dicts or callables that return dicts.  A callable provider is only
+    called when a name is not found in the providers that follow it.
+
+    >>> calls = []
+    >>> def provider():
+    ...     calls.append(1)
+    ...     return dict(name='Joe', age=10)
+    >>> helpers = HelperRegistry([provider, dict(name='Sally')])
+    >>> helpers.get('name')
+    'Sally'
+    >>> calls
+    []
+    >>> helpers.get('age'), helpers.get('age')
+    (10, 10)
+    >>> calls
+    [1]
+    >>> helpers.get('missing') is None
+    True
+    """
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+
+    def get(self, name, default=None):
+        """return the helper for a name"""
+        providers = self.providers
+        for index in range(len(providers) - 1, -1, -1):
+            provider = providers[index]
+            if callable(provider):
+                provider = providers[index] = provider()
+            if name in provider:
+                return provider[name]
+        return default
 
 
 def apply_helpers(template, obj, providers):
@@ -76,13 +154,7 @@ def apply_helpers(template, obj, providers):
 
     logger = logging.getLogger(__name__)
 
-    helpers = {}
-    for provider in providers:
-        if callable(provider):
-            helpers.update(provider())
-        else:
-            helpers.update(provider)
-    return fill(template, filler(helpers))
+    return fill(template, filler(HelperRegistry(providers)))
 
 
 def add_helpers(*providers):
@@ -121,15 +193,132 @@ def render(template, *providers, **helpers):
     )
 
 
+def etag_matches(etag, if_none_match):
+    """Return True if etag is one of those in an If-None-Match header
+
+    Tags are compared weakly, ignoring any W/ prefix.
+
+    >>> etag_matches('W/"abc"', '"xyz", W/"abc"')
+    True
+    >>> etag_matches('W/"abc"', '*')
+    True
+    >>> etag_matches('W/"abc"', '"xyz"')
+    False
+    >>> etag_matches('W/"abc"', None)
+    False
+    """
+    if not if_none_match:
+        return False
+
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    tags = [opaque(tag) for tag in if_none_match.split(',')]
+    return '*' in tags or opaque(etag) in tags
+
+
+def etags_enabled(request):
+    """Return True if the site or app has opted in to ETags"""
+    app = getattr(request, 'app', None)
+    return bool(
+        getattr(request.site, 'etags', False) or
+        getattr(app, 'etags', False)
+    )
+
+
+def has_alerts():
+    """Return True if there are alerts waiting to be shown"""
+    parts = getattr(zoom.system, 'parts', None)
+    parts = getattr(parts, 'parts', {})
+    return any(parts.get(name) for name in ('success', 'warning', 'error'))
+
+
+def version_etag(request, version):
+    """Return the ETag for a version of the current page
+
+    Besides the version, the tag depends on the page address, the user,
+    the session and the app version, any of which can change what the
+    page looks like.
+    """
+    key = repr((
+        version,
+        request.path,
+        request.query,
+        getattr(getattr(request, 'user', None), 'username', None),
+        getattr(getattr(request, 'session', None), 'csrf_token', None),
+        getattr(getattr(request, 'app', None), 'version', None),
+        getattr(request.site, 'theme', None),
+    ))
+    return 'W/"v%s"' % md5(key.encode('utf8')).hexdigest()
+
+
+def not_modified(*version):
+    """Return a 304 response if the client's copy of the page is current
+
+    version is one or more values that change whenever the content of
+    the page would, such as when the data it shows was last updated.
+    Call this before doing the work of building the page; if the client
+    already has this version of it a NotModifiedResponse is returned,
+    otherwise None is returned and the page is sent with an ETag for
+    this version.
+
+        def index(self):
+            updated = db('select max(updated) from tickets').value
+            return not_modified(updated) or page(build_dashboard())
+
+    """
+    request = zoom.system.request
+    if request.method not in ('GET', 'HEAD') or has_alerts():
+        return None
+    etag = version_etag(request, version)
+    request.version_etag = etag
+    if etag_matches(etag, request.env.get('HTTP_IF_NONE_MATCH')):
+        return NotModifiedResponse(etag)
+    return None
+
+
+def add_etag(request, response):
+    """Add an ETag to a response, or reply Not Modified if it matches
+
+    Uses the tag for the version given to not_modified, if there was
+    one, and otherwise a hash of the rendered content when the site or
+    app has ETags turned on.
+    """
+    if (
+            request.method not in ('GET', 'HEAD') or
+            not str(response.status).startswith('200') or
+            isinstance(response, NotModifiedResponse)
+    ):
+        return response
+
+    etag = getattr(request, 'version_etag', None)
+    if etag is None:
+        if not etags_enabled(request):
+            return response
+        content = response.content
+        if isinstance(content, str):
+            content = content.encode('utf8')
+        if not isinstance(content, bytes):
+            return response
+        etag = 'W/"%s"' % md5(content).hexdigest()
+        if etag_matches(etag, request.env.get('HTTP_IF_NONE_MATCH')):
+            return NotModifiedResponse(etag)
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 def handler(request, handle, *rest):
     """Render handler"""
 
     logger = logging.getLogger(__name__)
     zoom.system.providers = [
         zoom.helpers.__dict__,
-        request.helpers(),
-        request.site.helpers(),
-        request.user.helpers(),
+        request.helpers,
+        request.site.helpers,
+        request.user.helpers,
     ] + zoom.system.providers
 
     response = handle(request, *rest)
@@ -138,6 +327,8 @@ def handler(request, handle, *rest):
     if response.content and isinstance(response.content, str):
         response.content = zoom.tools.restore_helpers(apply_helpers(response.content, None, providers))
 
+    response = add_etag(request, response)
+
     logger.debug('render handler called')
     request.profiler.add('response rendered')
 
@@ -8,7 +8,6 @@
 
 import os
 import sys
-import cgi
 import json
 import logging
 import platform
@@ -20,6 +19,7 @@ import zoom
 import zoom.utils
 import zoom.cookies
 import zoom.exceptions
+import zoom.formdata
 
 from zoom.context import context
 from zoom.profiler import SystemTimer
@@ -33,37 +33,7 @@ def make_request_id():
     return uuid.uuid4().hex
 
 
-def cgi_to_dict(cgi_fields):
-
-    items = {}
-    for key in cgi_fields.keys():
-
-        save = items.__setitem__
-
-        if isinstance(cgi_fields[key], list):
-            if cgi_fields[key] and cgi_fields[key][0].filename:
-                value = (key, cgi_fields[key])
-            else:
-                value = (key, [item.value for item in cgi_fields[key]])
-        elif cgi_fields[key].filename:
-            value = (key, cgi_fields[key])
-        else:
-            value = (key, cgi_fields[key].value)
-
-        if '[' in key and key.endswith(']'):
-            # some libs append an index myfield[0], we choose to put them
-            # in a list
-            param = key[:key.find('[')]
-            items.setdefault(param, [])
-            save = items[param].append
-            value = value[1:]
-
-        save(*value)
-
-    return items
-
-
-def get_web_vars(env):
+def get_web_vars(env, limits=None):
     """return web parameters as a dict"""
 
     get = env.get
@@ -74,23 +44,12 @@ def get_web_vars(env):
         logger.warning('ignoring unsupported HTTP method %r', method)
         return {}
 
-    if method in ('GET', 'HEAD'):
-        cgi_fields = cgi.FieldStorage(environ=env, keep_blank_values=1)
-
+    if module == 'wsgi':
+        body_stream = get('wsgi.input')
     else:
-        post_env = env.copy()
-        if module == 'wsgi':
-            body_stream = get('wsgi.input')
-        else:
-            body_stream = sys.stdin
-
-        cgi_fields = cgi.FieldStorage(
-            fp=body_stream,
-            environ=post_env,
-            keep_blank_values=True
-        )
+        body_stream = getattr(sys.stdin, 'buffer', sys.stdin)
 
-    return cgi_to_dict(cgi_fields)
+    return zoom.formdata.parse(env, body_stream, limits)
 
 
 def get_parent_dir():
@@ -266,6 +225,7 @@ class Request(object):
         self.method = get('REQUEST_METHOD')
         self.module = get('wsgi.version', None) and 'wsgi' or 'cgi'
         self.data_values = {}
+        self.form_limits = {}
 
         self.path = get('PATH_INFO', get('REQUEST_URI', '').split('?')[0])
         self.route = self.path != '/' and self.path.split('/')[1:] or []
@@ -325,7 +285,7 @@ class Request(object):
         """access the body as data"""
         if not self.body_consumed:
             self.body_consumed = True
-            self.data_values.update(get_web_vars(self.env))
+            self.data_values.update(get_web_vars(self.env, self.form_limits))
             return self.data_values
         else:
             return self.data_values
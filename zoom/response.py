@@ -14,13 +14,77 @@
     special case in the cookie module.
 """
 
+import csv
+import io
+import os
+import time
 from hashlib import md5
 from collections import OrderedDict
 
 import zoom
 import zoom.templates
 import zoom.components.instances
-from zoom.jsonz import dumps
+from zoom.jsonz import dumps, iterencode
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_file(file, chunk_size=CHUNK_SIZE):
+    """yield the content of a file a chunk at a time, then close it
+
+    >>> list(iter_file(io.BytesIO(b'abcde'), 2))
+    [b'ab', b'cd', b'e']
+    """
+    try:
+        while True:
+            data = file.read(chunk_size)
+            if not data:
+                return
+            yield data
+    finally:
+        file.close()
+
+
+def file_size(file):
+    """return the number of bytes left to read in file, if known
+
+    >>> file_size(io.BytesIO(b'abc')) is None
+    True
+    """
+    try:
+        return os.fstat(file.fileno()).st_size - file.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def encoded(parts, encoding='utf8', size=CHUNK_SIZE):
+    """join text parts into encoded chunks of about size bytes
+
+    >>> list(encoded(['one', 'two', 'three'], size=6))
+    [b'onetwo', b'three']
+    """
+    buffer, length = [], 0
+    for part in parts:
+        if isinstance(part, bytes):
+            part = part.decode(encoding)
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer).encode(encoding)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode(encoding)
+
+
+def get_labels(rows):
+    """return the column names of a database result, if rows is one"""
+    labels = getattr(rows, 'labels', None)
+    if labels:
+        return list(labels)
+    description = getattr(getattr(rows, 'cursor', None), 'description', None)
+    if description:
+        return [column[0] for column in description]
+    return None
 
 
 class Response(object):
@@ -31,6 +95,16 @@ class Response(object):
     b'Status: 200 OK\\nContent-length: 10\\n\\nthis is it'
     >>> response.as_wsgi()
     ('200 OK', [('Content-length', '10')], b'this is it')
+
+    The content can also be an iterable of bytes or a file object, which
+    are sent as they are read.  The length of a file is sent if it is
+    known, the length of other iterables isn't.
+
+    >>> response = Response(iter([b'this ', b'is it']))
+    >>> response.as_wsgi()[1]
+    []
+    >>> response.render()
+    b'Status: 200 OK\\n\\nthis is it'
     """
 
     def __init__(self, content=b'', status='200 OK', headers=None):
@@ -47,6 +121,10 @@ class Response(object):
         """Renders the entire response"""
 
         status, headers, doc = self.as_wsgi()
+        if hasattr(doc, 'read'):
+            doc = b''.join(iter_file(doc))
+        elif not isinstance(doc, bytes):
+            doc = b''.join(doc)
         start = (
             ''.join(
                 '{}: {}\n'.format(k, v) for k, v in
@@ -63,7 +141,12 @@ class Response(object):
         headers.extend(('Set-Cookie', morsel.OutputString())
                 for morsel
                 in self.cookie.values())
-        headers.append(('Content-length', '%s' % len(doc)))
+        if isinstance(doc, bytes):
+            headers.append(('Content-length', '%s' % len(doc)))
+        elif hasattr(doc, 'read'):
+            size = file_size(doc)
+            if size is not None:
+                headers.append(('Content-length', '%s' % size))
         return (
             self.status,
             headers,
@@ -309,7 +392,9 @@ class TextResponse(Response):
 
     def render_doc(self):
         """Renders the payload"""
-        return self.content.encode('utf8')
+        if isinstance(self.content, str):
+            return self.content.encode('utf8')
+        return encoded(self.content)
 
 
 class HTMLResponse(TextResponse):
@@ -408,6 +493,18 @@ class JSONResponse(TextResponse):
     ... )
     >>> response.render() == expected
     True
+
+    With stream set the content is encoded as it is sent, so large
+    arrays, generators and database results are never held in memory
+    as one string.  The length isn't known in advance so no
+    Content-length is sent.
+
+    >>> response = JSONResponse((n for n in range(3)), stream=True)
+    >>> status, headers, doc = response.as_wsgi()
+    >>> headers
+    [('Content-type', 'application/json;charset=utf-8'), ('Cache-Control', 'no-cache')]
+    >>> b''.join(doc)
+    b'[\\n    0,\\n    1,\\n    2\\n]'
     """
 
     def __init__(
@@ -417,9 +514,11 @@ class JSONResponse(TextResponse):
             sort_keys=True,
             ensure_ascii=False,
             status='200 OK',
+            stream=False,
             **kwargs
     ):
-        content = dumps(
+        encode = iterencode if stream else dumps
+        content = encode(
             content,
             indent=indent,
             sort_keys=sort_keys,
@@ -428,6 +527,86 @@ class JSONResponse(TextResponse):
         )
         TextResponse.__init__(self, content, status=status)
         self.headers['Content-type'] = 'application/json;charset=utf-8'
+        self.stream = stream
+
+    def render_doc(self):
+        """Renders the payload"""
+        if self.stream:
+            return self.content
+        return TextResponse.render_doc(self)
+
+
+class PollResponse(Response):
+    """Long poll response
+
+    Calls poll every delay seconds until it returns something other
+    than None, for up to timeout seconds, and then responds with
+    respond(value), a JSONResponse by default.  If nothing turns up the
+    response is a 204 No Content.
+
+    Served by zoom.asgi the waiting is done by the event loop, so a
+    worker thread is only used while poll runs.  Served by WSGI the
+    worker does the waiting.
+
+    >>> values = iter([None, None, 'hey'])
+    >>> response = PollResponse(lambda: next(values), delay=0)
+    >>> response.as_wsgi()
+    ('200 OK', [('Content-type', 'application/json;charset=utf-8'), ('Cache-Control', 'no-cache'), ('Content-length', '5')], b'"hey"')
+
+    >>> PollResponse(lambda: None, timeout=0).as_wsgi()
+    ('204 No Content', [('Content-length', '0')], b'')
+    """
+
+    def __init__(self, poll, timeout=15, delay=0.5, respond=None):
+        Response.__init__(self)
+        self.poll = poll
+        self.timeout = timeout
+        self.delay = delay
+        self.respond = respond or JSONResponse
+
+    def result(self, value):
+        """Return the response for a polled value"""
+        if value is None:
+            response = Response(status='204 No Content')
+        else:
+            response = self.respond(value)
+        for key, header in self.headers.items():
+            response.headers.setdefault(key, header)
+        response.cookie.update(self.cookie)
+        return response
+
+    def wait(self):
+        """Poll until there is a value or the time is up"""
+        deadline = time.time() + self.timeout
+        while True:
+            value = self.poll()
+            if value is not None or time.time() >= deadline:
+                return self.result(value)
+            time.sleep(self.delay)
+
+    def as_wsgi(self):
+        return self.wait().as_wsgi()
+
+
+class NotModifiedResponse(Response):
+    """Not Modified response
+
+    Tells the client the copy of the page it has, identified by etag,
+    is still current.
+
+    >>> NotModifiedResponse('W/"abc"').as_wsgi()
+    ('304 Not Modified', [('ETag', 'W/"abc"'), ('Cache-Control', 'private, no-cache')], b'')
+    """
+
+    def __init__(self, etag):
+        Response.__init__(self, b'', '304 Not Modified')
+        self.headers['ETag'] = etag
+        self.headers['Cache-Control'] = 'private, no-cache'
+
+    def as_wsgi(self):
+        status, headers, doc = Response.as_wsgi(self)
+        headers = [h for h in headers if h[0] != 'Content-length']
+        return status, headers, doc
 
 
 class CSSResponse(Response):
@@ -481,6 +660,17 @@ class FileResponse(Response):
     ... )
     >>> response.render() == expected
     True
+
+    Without content the file is opened and sent as it is read rather
+    than read into memory first.
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile(suffix='.txt') as f:
+    ...     _ = f.write(b'filedata')
+    ...     f.flush()
+    ...     status, headers, doc = FileResponse(f.name).as_wsgi()
+    >>> headers[-1], doc.read()
+    (('Content-length', '8'), b'filedata')
     """
 
     def __init__(self, filename, content=None):
@@ -488,8 +678,7 @@ class FileResponse(Response):
         if content:
             self.content = content
         else:
-            self.content = open(filename, 'rb').read()
-        import os
+            self.content = open(filename, 'rb')
         _, fileonly = os.path.split(filename)
         self.headers['Content-type'] = 'application/octet-stream'
         self.headers['Content-Disposition'] = \
@@ -517,6 +706,96 @@ class PDFResponse(FileResponse):
         del self.headers['Content-Disposition']
 
 
+class CSVResponse(Response):
+    """CSV download response
+
+    Rows are written as they are produced.  Pass the result of
+    db.stream for large queries so the database driver doesn't hold
+    the whole result in memory either.  The column names are taken
+    from the Result when labels aren't given.
+
+    >>> rows = [(1, 'one'), (2, 'two, too')]
+    >>> response = CSVResponse(rows, labels=['n', 'name'], filename='n.csv')
+    >>> response.render() == (
+    ...     b'Status: 200 OK\\n'
+    ...     b'Content-type: text/csv;charset=utf-8\\n'
+    ...     b'Cache-Control: no-cache\\n'
+    ...     b'Content-Disposition: attachment; filename="n.csv"\\n\\n'
+    ...     b'n,name\\r\\n1,one\\r\\n2,"two, too"\\r\\n'
+    ... )
+    True
+    """
+
+    def __init__(self, rows, labels=None, filename=None, status='200 OK'):
+        Response.__init__(self, status=status)
+        self.content = self.lines(rows, labels or get_labels(rows))
+        self.headers['Content-type'] = 'text/csv;charset=utf-8'
+        self.headers['Cache-Control'] = 'no-cache'
+        if filename:
+            self.headers['Content-Disposition'] = \
+                'attachment; filename="%s"' % filename
+
+    @staticmethod
+    def lines(rows, labels):
+        """yield the rows as lines of CSV"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(row):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            return buffer.getvalue()
+
+        if labels:
+            yield line(labels)
+        for row in rows:
+            if isinstance(row, dict):
+                row = [row.get(label) for label in labels or row]
+            yield line(row)
+
+    def render_doc(self):
+        """Renders the payload"""
+        return encoded(self.content)
+
+
+class NDJSONResponse(Response):
+    """Newline delimited JSON response
+
+    Each row is sent as a JSON document on its own line as it is
+    produced.  Rows from a database Result are sent as objects keyed by
+    column name.  As with CSVResponse, pass the result of db.stream for
+    large queries.
+
+    >>> rows = [(1, 'one'), (2, 'two')]
+    >>> response = NDJSONResponse(rows, labels=['n', 'name'])
+    >>> status, headers, doc = response.as_wsgi()
+    >>> headers
+    [('Content-type', 'application/x-ndjson;charset=utf-8'), ('Cache-Control', 'no-cache')]
+    >>> from zoom.jsonz import loads
+    >>> [loads(line) for line in b''.join(doc).splitlines()]
+    [{'n': 1, 'name': 'one'}, {'n': 2, 'name': 'two'}]
+    """
+
+    def __init__(self, rows, labels=None, status='200 OK'):
+        Response.__init__(self, status=status)
+        self.content = self.lines(rows, labels or get_labels(rows))
+        self.headers['Content-type'] = 'application/x-ndjson;charset=utf-8'
+        self.headers['Cache-Control'] = 'no-cache'
+
+    @staticmethod
+    def lines(rows, labels):
+        """yield the rows as lines of JSON"""
+        for row in rows:
+            if labels and not isinstance(row, dict):
+                row = dict(zip(labels, row))
+            yield dumps(row, ensure_ascii=False) + '\n'
+
+    def render_doc(self):
+        """Renders the payload"""
+        return encoded(self.content)
+
+
 class SiteNotFoundResponse(HTMLResponse):
     """Site 404 Not Found response
 
@@ -10,14 +10,26 @@
 
 import os
 import logging
+import signal
 import sys
-from wsgiref.simple_server import make_server, WSGIRequestHandler
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+from wsgiref.util import FileWrapper
 from timeit import default_timer as timer
 
 from zoom.request import Request
+from zoom.response import CHUNK_SIZE
+import zoom.instances
+import zoom.loader
 import zoom.middleware as middleware
+import zoom.sites
 import zoom.utils
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_REQUESTS = 1000
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
 
 class ZoomWSGIRequestHandler(WSGIRequestHandler):
 
@@ -64,21 +76,31 @@ class WSGIApplication(object):
     """a WSGI Application wrapper
     """
     # pylint: disable=too-few-public-methods
-    def __init__(self, instance='.', handlers=None, username=None):
+    def __init__(self, instance='.', handlers=None, username=None,
+                 reload=True):
         self.handlers = handlers
         self.instance = instance
         self.username = username
+        self.reload = reload
 
     def __call__(self, environ, start_response):
-        reset_modules()
+        if self.reload:
+            reset_modules()
         start_time = timer()
         request = Request(environ, self.instance, start_time, self.username)
+        request.reload_modules = self.reload
         response = middleware.handle(request, self.handlers)
         status, headers, content = response.as_wsgi()
         if request.method == 'HEAD':
+            close = getattr(content, 'close', None)
+            if close:
+                close()
             content = b''
         start_response(status, headers)
-        return [content]
+        if hasattr(content, 'read'):
+            wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+            return wrapper(content, CHUNK_SIZE)
+        return [content] if isinstance(content, bytes) else content
 
 
 def run(port=80, instance=None, handlers=None, username=None):  # pragma: no cover
@@ -103,6 +125,233 @@ def run(port=80, instance=None, handlers=None, username=None):  # pragma: no cov
         pass
 
 
+class StopWorker(Exception):
+    """raised to stop an idle worker"""
+
+
+class PreforkWSGIServer(WSGIServer):
+    """WSGI server run by each pre-forked worker"""
+
+    request_queue_size = 128
+    requests_handled = 0
+    busy = False
+
+    def get_request(self):
+        result = WSGIServer.get_request(self)
+        self.busy = True
+        return result
+
+    def process_request(self, request, client_address):
+        self.requests_handled += 1
+        WSGIServer.process_request(self, request, client_address)
+
+
+class PreforkServer(object):
+    """a pre-forking multi-process server
+
+    The master process binds the listening socket, runs warm to load
+    whatever the workers can share and then forks the workers, which all
+    accept connections from the same socket.  Workers are replaced when
+    they have served max_requests requests or when they die.
+
+    Sending the master SIGHUP warms it again and replaces the workers
+    with new ones, letting the old ones finish the requests they are
+    serving.  SIGTERM or SIGINT stops the workers and the master.
+    """
+
+    def __init__(self, app, port=80, workers=None, max_requests=None,
+                 host='', warm=None, timeout=DEFAULT_GRACEFUL_TIMEOUT):
+        if not hasattr(os, 'fork'):
+            raise Exception('pre-forking requires os.fork')
+        self.workers = workers or os.cpu_count() or 1
+        self.max_requests = (
+            DEFAULT_MAX_REQUESTS if max_requests is None else max_requests
+        )
+        self.warm = warm
+        self.timeout = timeout
+        self.server = make_server(
+            host, int(port), app,
+            server_class=PreforkWSGIServer,
+            handler_class=ZoomWSGIRequestHandler,
+        )
+        self.children = {}
+        self.generation = 0
+        self.stopping = False
+        self.reloading = False
+
+    @property
+    def port(self):
+        """the port the server is listening on"""
+        return self.server.server_port
+
+    def current(self):
+        """the workers of the current generation"""
+        return [
+            pid for pid, generation in self.children.items()
+            if generation == self.generation
+        ]
+
+    def spawn(self):
+        """fork a worker"""
+        pid = os.fork()
+        if pid:
+            self.children[pid] = self.generation
+            return pid
+        status = 0
+        try:
+            self.work()
+        except BaseException:
+            logger.exception('worker %s failed', os.getpid())
+            status = 1
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+    def work(self):
+        """serve requests until stopped or retired"""
+        server = self.server
+        stopping = []
+
+        def stop(*_):
+            # an idle worker stops waiting for a connection right away,
+            # a busy one finishes the request first
+            stopping.append(True)
+            if not server.busy:
+                raise StopWorker()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server.timeout = 1
+        logger.debug('worker %s started', os.getpid())
+        try:
+            while not stopping:
+                if self.max_requests and server.requests_handled >= self.max_requests:
+                    logger.debug('worker %s retiring', os.getpid())
+                    break
+                server.handle_request()
+                server.busy = False
+        except StopWorker:
+            pass
+        server.server_close()
+
+    def reap(self):
+        """collect the workers that have exited"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if not pid:
+                break
+            if self.children.pop(pid, None) is not None and status:
+                if not self.stopping:
+                    logger.warning('worker %s died (status %s)', pid, status)
+
+    def signal(self, pids, signum):
+        """send a signal to workers"""
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reload(self):
+        """replace the workers with freshly warmed ones"""
+        self.reloading = False
+        logger.info('reloading')
+        old = list(self.children)
+        self.generation += 1
+        if self.warm:
+            self.warm()
+        while len(self.current()) < self.workers:
+            self.spawn()
+        self.signal(old, signal.SIGTERM)
+
+    def stop(self):
+        """stop the workers, waiting for them to finish their requests"""
+        self.signal(list(self.children), signal.SIGTERM)
+        deadline = time.time() + self.timeout
+        while self.children and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.signal(list(self.children), signal.SIGKILL)
+        self.reap()
+        self.server.server_close()
+
+    def run(self):
+        """run the master process until stopped"""
+
+        def stop(*_):
+            self.stopping = True
+
+        def reload(*_):
+            self.reloading = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+
+        if self.warm:
+            self.warm()
+        try:
+            while not self.stopping:
+                if self.reloading:
+                    self.reload()
+                self.reap()
+                while len(self.current()) < self.workers and not self.stopping:
+                    self.spawn()
+                time.sleep(0.1)
+        finally:
+            self.stop()
+
+
+def warm(instance):
+    """load what pre-forked workers can share
+
+    Reads the configuration of each site of the instance and loads the
+    app.py modules of their apps, which the workers keep using rather
+    than reloading them for each request.  Any database connections
+    opened along the way are closed so the workers don't share them.
+    """
+    for name in [m for m in sys.modules if m.startswith('_zoom_app_')]:
+        del sys.modules[name]
+    sites = zoom.instances.Instance(instance).get_sites(skip_fails=True)
+    for site in sites.values():
+        try:
+            site.activate()
+            for app in site.apps:
+                try:
+                    app.method  # pylint: disable=pointless-statement
+                except Exception:
+                    logger.warning('unable to load app %s', app.name)
+        finally:
+            site.db.close()
+    zoom.system.site = None
+
+
+def run_prefork(port=80, instance=None, handlers=None, username=None,
+                workers=None, max_requests=None):  # pragma: no cover
+    """run using a pre-forking multi-process server"""
+    the_application = WSGIApplication(
+        instance, handlers, username, reload=False
+    )
+    zoom.loader.reload_modules = False
+    zoom.sites.site_cache = {}
+    server = PreforkServer(
+        the_application, port, workers, max_requests,
+        warm=lambda: warm(instance),
+    )
+    print(zoom.utils.trim("""
+     * running on http://localhost{} with {} workers {}(press Ctrl+C to quit)
+    """).format(
+        port != 80 and ':{}'.format(port) or '',
+        server.workers,
+        username and 'as {} '.format(username) or '',
+    ))
+    server.run()
+
+
 def application(environ, start_response):
     """run Zoom using external WSGI Server
 
@@ -115,16 +364,15 @@ def application(environ, start_response):
     choosing.
 
     >>> save_dir = os.getcwd()
-    >>> try:
-    ...     env = dict(DOCUMENT_ROOT=zoom.tools.zoompath('zoom', '_assets', 'web', 'www'))
-    ...     response = application(env, lambda a, b: None)
-    ... finally:
-    ...     os.chdir(save_dir)
+    >>> env = dict(DOCUMENT_ROOT=zoom.tools.zoompath('zoom', '_assets', 'web', 'www'))
+    >>> response = application(env, lambda a, b: None)
     >>> len(response)
     1
+    >>> os.getcwd() == save_dir
+    True
     """
-    os.chdir(environ.get('DOCUMENT_ROOT'))
-    return WSGIApplication(instance='..')(environ, start_response)
+    instance = os.path.join(environ.get('DOCUMENT_ROOT'), '..')
+    return WSGIApplication(instance=instance)(environ, start_response)
 
 
 def debug(environ, start_response):
@@ -5,7 +5,6 @@
 """
 
 import logging
-import os
 import shlex
 import subprocess
 
@@ -21,24 +20,20 @@ def run(command, returncode=False, location=None):
 
     """
     logger = logging.getLogger(__name__)
-    save_dir = os.getcwd()
-    try:
-        logger.debug('running shell command: %r', command)
-        if location:
-            os.chdir(location)
-
-        if returncode:
-            process = subprocess.Popen(
-                shlex.split(command),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = process.communicate()
-            return process.returncode, stdout.decode('utf8'), stderr.decode('utf8')
-        else:
-            return subprocess.Popen(
-                shlex.split(command),
-                stdout=subprocess.PIPE
-            ).communicate()[0].decode('utf-8')
-    finally:
-        os.chdir(save_dir)
+    logger.debug('running shell command: %r', command)
+
+    if returncode:
+        process = subprocess.Popen(
+            shlex.split(command),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=location or None,
+        )
+        stdout, stderr = process.communicate()
+        return process.returncode, stdout.decode('utf8'), stderr.decode('utf8')
+    else:
+        return subprocess.Popen(
+            shlex.split(command),
+            stdout=subprocess.PIPE,
+            cwd=location or None,
+        ).communicate()[0].decode('utf-8')
@@ -8,6 +8,7 @@ import os
 import zoom
 import zoom.apps
 import zoom.config
+import zoom.formdata
 from zoom.context import context
 import zoom.helpers
 from zoom.helpers import link_to, mail_to
@@ -304,6 +305,28 @@ class BasicSite:
             self.monitor_app_database = get('monitoring', 'app_database', False) in positive
             self.monitor_system_database = get('monitoring', 'system_database', False) in positive
 
+            self.etags = get('caching', 'etags', False) in positive
+            self.output_cache = dict(
+                pages=get('caching', 'pages', False) in positive,
+                page_ttl=int(get('caching', 'page_ttl', 60)),
+                backend=get('caching', 'backend', 'memory'),
+                path=get('caching', 'path', join(self.data_path, 'cache')),
+                max_entries=int(get('caching', 'max_entries', 1000)),
+            )
+
+            self.compression = dict(
+                enabled=get('compression', 'enabled', True) in positive,
+                min_size=int(get('compression', 'min_size', 1024)),
+                gzip_level=int(get('compression', 'gzip_level', 6)),
+                brotli_level=int(get('compression', 'brotli_level', 4)),
+            )
+
+            self.form_limits = {}
+            for key in zoom.formdata.DEFAULT_LIMITS:
+                value = get('uploads', key, '')
+                if value:
+                    self.form_limits[key] = int(value) or None
+
             logger.debug('instance path: %r', instance)
             logger.debug('site path: %r', site_path)
             logger.debug('site themes path: %r', self.themes_path)
@@ -313,6 +336,16 @@ class BasicSite:
             logger.error('Site directory missing: %r', site_path)
             raise zoom.exceptions.SiteMissingException('site {!r} does not exist'.format(site_path))
 
+    def reset(self):
+        """forget what was worked out for the last request
+
+        Sites kept from one request to the next, as they are by the
+        workers of the pre-forking server, work out their apps, which
+        depend on the user, and their settings afresh for each request.
+        """
+        self.__apps = None
+        self.__settings = None
+
     @property
     def settings(self):
         if not self.__settings:
@@ -13,7 +13,7 @@ from os.path import dirname
 
 import zoom
 from zoom.site import BasicSite
-from zoom.background import run_background_jobs
+from zoom.background import run_background_jobs, JobPool
 from zoom.context import context
 from zoom.exceptions import SiteMissingException
 
@@ -22,6 +22,10 @@ from zoom.exceptions import SiteMissingException
 # to modify the environment first.
 default_site_path = os.environ.get('ZOOM_DEFAULT_SITE')
 
+# Sites kept by this process, keyed by site path, when they are not to be
+# built afresh for each request.
+site_cache = None
+
 logger = logging.getLogger(__name__)
 
 class Site(BasicSite):
@@ -89,11 +93,20 @@ class Site(BasicSite):
             result.extend(app.background_jobs)
         return result
 
-    def run_background_jobs(self):
-        """Run background jobs for a site"""
-        self.activate()
+    def run_background_jobs(self, pool=None):
+        """Run background jobs for a site
+
+        Due jobs are submitted to the pool if one is provided, otherwise
+        they are run to completion before returning.
+        """
+        draining = pool is None
+        if draining:
+            pool = JobPool()
         for app in self.apps:
-            run_background_jobs(app)
+            self.activate()
+            run_background_jobs(app, pool)
+        if draining:
+            pool.drain()
 
     def activate(self):
         """Activate this site in Zoom's thread-local context."""
@@ -135,10 +148,29 @@ def db(*args, **kwargs):
     return get_db()(*args, **kwargs)
 
 
+def get_request_site(request):
+    """Return the site for a request
+
+    A site is built for each request so changes to its configuration
+    are picked up, unless site_cache has been set to a dict, as it is
+    for the workers of the pre-forking server, in which case each site
+    is built once per process and reset for each request.
+    """
+    if site_cache is None:
+        return Site(request.site_path)
+    site = site_cache.get(request.site_path)
+    if site is None:
+        site = site_cache[request.site_path] = Site(request.site_path)
+    else:
+        site.reset()
+    return site
+
+
 def handler(request, next_handler, *rest):
     """install site object"""
     try:
-        request.site = context.site = Site(request.site_path)
+        request.site = context.site = get_request_site(request)
+        request.form_limits = request.site.form_limits
         request.profiler.add('site initialized')
         return next_handler(request, *rest)
     except SiteMissingException:
@@ -221,7 +221,7 @@ def setup_test():
     return db
 
 
-def summarize(table, dimensions, metrics=None):
+def summarize(table, dimensions, metrics=None, rollup=False):
     """
     summarize data
 
@@ -290,9 +290,21 @@ def summarize(table, dimensions, metrics=None):
     *   4    1  80,000
     *   *    5 290,000
 
+    >>> print(summarize('person', ['age', 'kids'], ['salary'], rollup=True))
+    select if(grouping(age), "*", age) age, if(grouping(kids), "*", kids) kids, count(*) n, sum(salary) salary from person group by age, kids with rollup
+
     >>> people.zap()
     >>> print(people)
     Empty list
+
+    Each statement in the union scans the table, so for more than a
+    couple of dimensions use summary, which scans it once.  A rollup
+    has the database compute the subtotals in one statement but needs
+    GROUPING(), which only MySQL 8.0.1 and later provide, so use
+    summary(..., rollup=True), which falls back to a single scan when
+    the database does not support it.  Note that a rollup only includes
+    the subtotals for each leading set of dimensions (age and kids, age,
+    and the grand total above) rather than every combination.
     """
     # pylint: disable=invalid-name
     # pylint: disable=unused-variable
@@ -301,6 +313,20 @@ def summarize(table, dimensions, metrics=None):
 
     metrics = metrics or []
 
+    if rollup:
+        return 'select {dims}, {calcs} from {table} group by {cols} with rollup'.format(
+            dims=', '.join(
+                'if(grouping({0}), "*", {0}) {1}'.format(
+                    i.split()[:1][0], i.split()[-1:][0]
+                ) for i in dimensions
+            ),
+            calcs=', '.join(
+                ['count(*) n'] + ['sum({}) {}'.format(m, m) for m in metrics]
+            ),
+            table=table,
+            cols=', '.join(i.split()[:1][0] for i in dimensions),
+        )
+
     statement_tpl = 'select {dims}, {calcs} from {table} group by {cols}'
     d = [i.split()[:1][0] for i in dimensions]
     c = [i.split()[-1:][0] for i in dimensions]
@@ -320,3 +346,115 @@ def summarize(table, dimensions, metrics=None):
         lst.append(statement_tpl.format(**locals()))
 
     return '\nunion '.join(lst)
+
+
+def row_order(row):
+    """sort key that orders nulls, then numbers, then text, then bytes"""
+    def rank(value):
+        if value is None:
+            return (0, 0)
+        if isinstance(value, (int, float, decimal.Decimal)):
+            return (1, value)
+        if isinstance(value, bytes):
+            return (3, value)
+        return (2, str(value))
+    return [rank(value) for value in row]
+
+
+def summary(db, table, dimensions, metrics=None, rollup=False):
+    """
+    summarize data with a single scan of the table
+
+    Returns the same rows as summarize, with "*" marking the dimensions
+    that have been totalled over, but reads the table with one group by
+    of every dimension and works out the subtotals for each combination
+    of dimensions from that.  With rollup only the subtotals for each
+    leading set of dimensions are returned, computed by the database
+    where it supports GROUPING().
+
+    >>> from zoom.records import Record, RecordStore
+    >>> from decimal import Decimal
+    >>> db = setup_test()
+    >>> class Person(Record): pass
+    >>> class People(RecordStore): pass
+    >>> people = People(db, Person)
+    >>> put = people.put
+    >>> id = put(Person(name='Sam', age=25, kids=1, salary=Decimal('40000')))
+    >>> id = put(Person(name='Sally', age=55, kids=4, salary=Decimal('80000')))
+    >>> id = put(Person(name='Bob', age=25, kids=2, salary=Decimal('70000')))
+    >>> id = put(Person(name='Jane', age=25, kids=2, salary=Decimal('50000')))
+    >>> id = put(Person(name='Alex', age=25, kids=3, salary=Decimal('50000')))
+
+    >>> print(summary(db, 'person', ['age','kids'], ['salary']))
+    age kids n salary
+    --- ---- - -------
+    25  1    1  40,000
+    25  2    2 120,000
+    25  3    1  50,000
+    25  *    4 210,000
+    55  4    1  80,000
+    55  *    1  80,000
+    *   1    1  40,000
+    *   2    2 120,000
+    *   3    1  50,000
+    *   4    1  80,000
+    *   *    5 290,000
+
+    >>> list(summary(db, 'person', ['age'])) == list(db(summarize('person', ['age'])))
+    True
+
+    >>> print(summary(db, 'person', ['age','kids'], ['salary'], rollup=True))
+    age kids n salary
+    --- ---- - -------
+    25  1    1  40,000
+    25  2    2 120,000
+    25  3    1  50,000
+    25  *    4 210,000
+    55  4    1  80,000
+    55  *    1  80,000
+    *   *    5 290,000
+
+    >>> people.zap()
+    """
+    metrics = metrics or []
+
+    if rollup and db.supports('grouping'):
+        cmd = summarize(table, dimensions, metrics, rollup=True)
+        labels = [i.split()[-1:][0] for i in dimensions] + ['n'] + metrics
+        return zoom.utils.ItemList(list(db(cmd)), labels=labels)
+
+    d = [i.split()[:1][0] for i in dimensions]
+    c = [i.split()[-1:][0] for i in dimensions]
+    n = len(dimensions)
+
+    cmd = 'select {dims}, {calcs} from {table} group by {cols}'.format(
+        dims=', '.join(a + ' ' + b for a, b in zip(d, c)),
+        calcs=', '.join(
+            ['count(*) n'] + ['sum({}) {}'.format(m, m) for m in metrics]
+        ),
+        table=table,
+        cols=', '.join(str(i + 1) for i in range(n)),
+    )
+
+    if rollup:
+        masks = [(1,) * i + (0,) * (n - i) for i in range(n + 1)]
+    else:
+        masks = list(itertools.product([0, 1], repeat=n))
+    cells = {}
+    for row in db(cmd):
+        keys, totals = row[:n], row[n:]
+        for mask in masks:
+            key = tuple(k if m else '*' for k, m in zip(keys, mask))
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = list(totals)
+                continue
+            for i, value in enumerate(totals):
+                if value is not None:
+                    cell[i] = value if cell[i] is None else cell[i] + value
+
+    rows = sorted(
+        (key + tuple(cell) for key, cell in cells.items()),
+        key=row_order
+    )
+    return zoom.utils.ItemList(rows, labels=c + ['n'] + metrics)
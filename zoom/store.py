@@ -90,8 +90,18 @@ def entify(rs, storage):
     return EntityList(entities.values())
 
 
+# functions called with the kind of a store whenever its data changes,
+# used to discard cached output that depends on it
+change_listeners = []
+
+
 class Store(object):
 
+    def changed(self):
+        """let the change listeners know this store has changed"""
+        for listener in change_listeners:
+            listener(self.kind)
+
     def before_update(self, record):
         pass
 
@@ -330,6 +340,7 @@ class EntityStore(Store):
             self.after_update(entity)
         else:
             self.after_insert(entity)
+        self.changed()
 
         return id
 
@@ -447,6 +458,7 @@ class EntityStore(Store):
 
             for rec in affected:
                 self.after_delete(rec)
+            self.changed()
 
             return ids
 
@@ -581,6 +593,7 @@ class EntityStore(Store):
         self.db(cmd, self.kind)
         cmd = 'delete from entities where kind=%s'
         self.db(cmd, self.kind)
+        self.changed()
 
     def __len__(self):
         """
@@ -0,0 +1,426 @@
+"""
+    zoom.tables
+
+    Server side paging, sorting and filtering for browse and tabulator
+    tables.
+
+    In server side mode a table renders only its shell and fetches its
+    rows from an app route.  The route answers with serve_table, which
+    parses the paging, sorting and filtering parameters sent by Tabulator
+    or DataTables and pushes them down into the query for the data.
+
+        >>> db = zoom.database.database('sqlite3', database=':memory:')
+        >>> db('create table tables_test (id int, name text, amount int)')
+        >>> ids = [
+        ...     db('insert into tables_test values (%s, %s, %s)', n, 'name %s' % n, n * 10)
+        ...     for n in range(1, 26)
+        ... ]
+
+        >>> source = SqlSource(db, 'select * from tables_test')
+        >>> query = parse_query({
+        ...     'page': '2', 'size': '10',
+        ...     'sort[0][field]': 'amount', 'sort[0][dir]': 'desc',
+        ... })
+        >>> rows, total, filtered = source.fetch(query, ['id', 'name', 'amount'])
+        >>> [row['id'] for row in rows]
+        [15, 14, 13, 12, 11, 10, 9, 8, 7, 6]
+        >>> total, filtered
+        (25, 25)
+
+        >>> query = parse_query({
+        ...     'filter[0][field]': 'name',
+        ...     'filter[0][type]': 'like',
+        ...     'filter[0][value]': 'name 2',
+        ... })
+        >>> rows, total, filtered = source.fetch(query, ['id', 'name', 'amount'])
+        >>> sorted(row['id'] for row in rows)
+        [2, 20, 21, 22, 23, 24, 25]
+        >>> filtered
+        7
+"""
+
+import json
+import logging
+import re
+
+import zoom
+import zoom.records
+from zoom.browse import calculate_styling, value_formatter, getcol
+from zoom.utils import Record
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 1000
+
+OPERATORS = {
+    '=': '=',
+    '!=': '<>',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+    'like': 'like',
+    'starts': 'like',
+    'ends': 'like',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class TableQuery(Record):
+    """a request for a page of table rows"""
+
+
+def as_int(value, default):
+    """convert a request parameter to an int"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def indexed_params(data, name):
+    """collect params like sort[0][field] into a list of dicts
+
+    >>> indexed_params({
+    ...     'sort[1][field]': 'b', 'sort[0][field]': 'a',
+    ...     'sort[0][dir]': 'desc', 'page': '1',
+    ... }, 'sort')
+    [{'field': 'a', 'dir': 'desc'}, {'field': 'b'}]
+    """
+    pattern = re.compile(r'^%s\[(\d+)\]\[(\w+)\]$' % re.escape(name))
+    found = {}
+    for key, value in data.items():
+        match = pattern.match(key)
+        if match:
+            index, part = match.groups()
+            found.setdefault(int(index), {})[part] = value
+    return [found[index] for index in sorted(found)]
+
+
+def parse_query(data):
+    """parse the table request sent by Tabulator or DataTables
+
+    Tabulator sends page, size, sort[n][...] and filter[n][...] while
+    DataTables sends draw, start, length, order[n][...] and search[value].
+
+    >>> query = parse_query({'page': '3', 'size': '20'})
+    >>> query.offset, query.limit, query.style
+    (40, 20, 'tabulator')
+
+    >>> query = parse_query({
+    ...     'draw': '4', 'start': '50', 'length': '25',
+    ...     'columns[2][data]': '2',
+    ...     'order[0][column]': '2', 'order[0][dir]': 'asc',
+    ...     'search[value]': 'pat',
+    ... })
+    >>> query.offset, query.limit, query.style, query.draw
+    (50, 25, 'datatables', 4)
+    >>> query.sort, query.search
+    ([(2, 'asc')], 'pat')
+    """
+    if 'draw' in data:
+        limit = as_int(data.get('length'), DEFAULT_PAGE_SIZE)
+        if limit < 0:
+            limit = MAX_PAGE_SIZE
+        sort = [
+            (as_int(order.get('column'), 0), order.get('dir', 'asc'))
+            for order in indexed_params(data, 'order')
+        ]
+        return TableQuery(
+            style='datatables',
+            draw=as_int(data.get('draw'), 0),
+            offset=max(as_int(data.get('start'), 0), 0),
+            limit=min(max(limit, 1), MAX_PAGE_SIZE),
+            sort=sort,
+            filters=[],
+            search=data.get('search[value]') or None,
+        )
+
+    size = min(max(as_int(data.get('size'), DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    page = max(as_int(data.get('page'), 1), 1)
+    return TableQuery(
+        style='tabulator',
+        draw=None,
+        offset=(page - 1) * size,
+        limit=size,
+        sort=[
+            (sort.get('field'), sort.get('dir', 'asc'))
+            for sort in indexed_params(data, 'sort')
+        ],
+        filters=[
+            (f.get('field'), f.get('type', 'like'), f.get('value'))
+            for f in indexed_params(data, 'filter')
+        ],
+        search=None,
+    )
+
+
+def resolve(column, columns):
+    """return the column name for a name or position, if valid"""
+    if isinstance(column, int):
+        return columns[column] if 0 <= column < len(columns) else None
+    return column if column in columns else None
+
+
+def like_pattern(operator, value):
+    """return the like pattern for a filter"""
+    value = str(value)
+    if operator == 'starts':
+        return value + '%'
+    if operator == 'ends':
+        return '%' + value
+    return '%' + value + '%'
+
+
+class SqlSource(object):
+    """table rows from an SQL query
+
+    The query is wrapped as a sub-query so sorting, filtering, counting
+    and paging all happen in the database.
+    """
+
+    def __init__(self, db, sql, *args):
+        self.db = db
+        self.sql = sql
+        self.args = args
+
+    def columns(self):
+        """return the column names of the query"""
+        result = self.db(
+            'select * from (%s) q where 1=0' % self.sql, *self.args
+        )
+        return [c[0] for c in result.cursor.description]
+
+    def where(self, query, columns):
+        """return the where clause and parameters for a query"""
+        clauses, params = [], []
+        for column, operator, value in query.filters:
+            name = resolve(column, columns)
+            if name is None or operator not in OPERATORS or value in (None, ''):
+                continue
+            if OPERATORS[operator] == 'like':
+                value = like_pattern(operator, value)
+            clauses.append('`%s` %s %%s' % (name, OPERATORS[operator]))
+            params.append(value)
+        if query.search:
+            clauses.append('(%s)' % ' or '.join(
+                '`%s` like %%s' % name for name in columns
+            ))
+            params.extend(['%' + query.search + '%'] * len(columns))
+        return clauses and ' where ' + ' and '.join(clauses) or '', params
+
+    def order_by(self, query, columns):
+        """return the order by clause for a query"""
+        terms = []
+        for column, direction in query.sort:
+            name = resolve(column, columns)
+            if name is not None:
+                terms.append('`%s` %s' % (
+                    name, direction == 'desc' and 'desc' or 'asc'
+                ))
+        return terms and ' order by ' + ', '.join(terms) or ''
+
+    def count(self, where='', params=()):
+        """return the number of rows matching a where clause"""
+        cmd = 'select count(*) from (%s) q%s' % (self.sql, where)
+        return int(self.db(cmd, *(list(self.args) + list(params))).first()[0])
+
+    def fetch(self, query, columns):
+        """return a page of rows, the total and the filtered count"""
+        where, params = self.where(query, columns)
+        total = self.count()
+        filtered = self.count(where, params) if where else total
+        cmd = 'select * from (%s) q%s%s limit %d offset %d' % (
+            self.sql, where, self.order_by(query, columns),
+            query.limit, query.offset,
+        )
+        result = self.db(cmd, *(list(self.args) + list(params)))
+        names = [c[0] for c in result.cursor.description]
+        rows = [dict(zip(names, row)) for row in result]
+        return rows, total, filtered
+
+
+class RecordSource(SqlSource):
+    """table rows from a RecordStore
+
+    The store table is sorted, filtered and paged in the database and
+    only the records on the requested page are loaded.
+    """
+
+    def __init__(self, store):
+        SqlSource.__init__(self, store.db, 'select * from `%s`' % store.kind)
+        self.store = store
+
+    def fetch(self, query, columns):
+        rows, total, filtered = SqlSource.fetch(self, query, columns)
+        keys = [row[self.store.key] for row in rows]
+        records = {
+            record._id: record
+            for record in (self.store.get(keys) if keys else [])
+            if record is not None
+        }
+        return [records[key] for key in keys if key in records], total, filtered
+
+
+class ListSource(object):
+    """table rows from any iterable
+
+    Used for sources that can not be queried, such as lists and entity
+    stores, so sorting, filtering and paging happen in Python.
+
+    >>> source = ListSource([dict(name='b', n=2), dict(name='a', n=1)])
+    >>> query = parse_query({'sort[0][field]': 'name'})
+    >>> source.fetch(query, ['name', 'n'])
+    ([{'name': 'a', 'n': 1}, {'name': 'b', 'n': 2}], 2, 2)
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def columns(self):
+        return []
+
+    def fetch(self, query, columns):
+        items = list(self.items)
+        total = len(items)
+
+        def matches(item):
+            for column, operator, value in query.filters:
+                name = resolve(column, columns)
+                if name is None or value in (None, ''):
+                    continue
+                actual = getcol(item, name)
+                if OPERATORS.get(operator) == 'like':
+                    text, value = str(actual).lower(), str(value).lower()
+                    if operator == 'starts' and not text.startswith(value):
+                        return False
+                    if operator == 'ends' and not text.endswith(value):
+                        return False
+                    if operator == 'like' and value not in text:
+                        return False
+                elif operator in OPERATORS:
+                    try:
+                        if not compare(actual, operator, type(actual)(value)):
+                            return False
+                    except (TypeError, ValueError):
+                        return False
+            if query.search:
+                term = query.search.lower()
+                return any(
+                    term in str(getcol(item, name)).lower()
+                    for name in columns
+                )
+            return True
+
+        if query.filters or query.search:
+            items = list(filter(matches, items))
+
+        for column, direction in reversed(query.sort):
+            name = resolve(column, columns)
+            if name is not None:
+                items.sort(
+                    key=lambda item: sort_key(getcol(item, name)),
+                    reverse=direction == 'desc',
+                )
+
+        page = items[query.offset:query.offset + query.limit]
+        return page, total, len(items)
+
+
+def compare(a, operator, b):
+    """compare two values with a filter operator"""
+    return {
+        '=': lambda: a == b,
+        '!=': lambda: a != b,
+        '<': lambda: a < b,
+        '<=': lambda: a <= b,
+        '>': lambda: a > b,
+        '>=': lambda: a >= b,
+    }[operator]()
+
+
+def sort_key(value):
+    """sort key that puts None first and never compares mixed types"""
+    return (value is not None, type(value).__name__, value)
+
+
+def source_for(data):
+    """return a table source for data
+
+    >>> isinstance(source_for([]), ListSource)
+    True
+    """
+    if isinstance(data, (SqlSource, ListSource)):
+        return data
+    if isinstance(data, zoom.records.RecordStore):
+        return RecordSource(data)
+    return ListSource(data)
+
+
+def format_rows(rows, columns, labels=None):
+    """format row values for display, as browse does"""
+    values = [[getcol(row, col) for col in columns] for row in rows]
+    styling = calculate_styling(columns, labels or columns, values)
+    formatters = [value_formatter(fmt) for fmt, _ in styling]
+    return [
+        [formatted(value) for formatted, value in zip(formatters, row)]
+        for row in values
+    ]
+
+
+def row_id(item):
+    """return the id of a row, if it has one"""
+    if isinstance(item, dict):
+        return item.get('id')
+    return getattr(item, 'id', None)
+
+
+def serve_table(request, data, columns=None, labels=None):
+    """answer a table data request
+
+    Returns a JSON response with one page of rows for a Tabulator table
+    in remote pagination mode or a DataTables table in server side mode.
+    The response carries a Content-Range header of the form
+    "items start-end/total" as well.
+
+    >>> rows = [dict(id=n, amount=n * 1000) for n in range(1, 60)]
+    >>> request = zoom.utils.Bunch(data={'page': '2', 'size': '5'})
+    >>> response = serve_table(request, rows, ['amount'])
+    >>> response.headers['Content-Range']
+    'items 5-9/59'
+    >>> json.loads(response.content)['data'][0]
+    {'amount': '6,000', 'id': 6}
+    """
+    source = source_for(data)
+    columns = list(columns or source.columns())
+    query = parse_query(request.data)
+    rows, total, filtered = source.fetch(query, columns)
+    formatted = format_rows(rows, columns, labels)
+
+    if query.style == 'datatables':
+        content = dict(
+            draw=query.draw,
+            recordsTotal=total,
+            recordsFiltered=filtered,
+            data=formatted,
+        )
+    else:
+        last_page = max((filtered + query.limit - 1) // query.limit, 1)
+        content = dict(
+            last_page=last_page,
+            last_row=filtered,
+            data=[
+                dict(zip(columns, row), id=row_id(item))
+                for item, row in zip(rows, formatted)
+            ],
+        )
+
+    response = zoom.response.JSONResponse(content, indent=None)
+    end = query.offset + len(rows) - 1 if rows else query.offset
+    response.headers['Content-Range'] = 'items %d-%d/%d' % (
+        query.offset, end, filtered
+    )
+    logger.debug(
+        'served %d of %d rows (%d total)', len(rows), filtered, total
+    )
+    return response
@@ -8,6 +8,8 @@ import json
 import uuid
 
 import zoom
+import zoom.tables
+from zoom.browse import is_homogeneous
 from zoom.components import as_actions
 from zoom.utils import (
     name_for, sorted_column_names, Record,
@@ -30,20 +32,6 @@ class Tabulator(zoom.DynamicComponent):
         return zoom.DynamicComponent.format(self, *args, **kwargs)
 
 
-def is_homogeneous(values):
-    """Return True if values have the same type"""
-    if len(values) <= 1:
-        return True
-    for n, value in enumerate(values):
-        if value is not None:
-            rest = values[n:]
-            col_type = type(value)
-            for other in rest:
-                if other and not isinstance(other, col_type):
-                    return False
-    return True
-
-
 def get_format(label, values):
     """Return a suitable format string and alignment for columns"""
     alignment = 'left'
@@ -89,8 +77,31 @@ def getcol(item, index):
         return getattr(item, index)
 
 
+def remote_options(url, page_size=None):
+    """Return the Tabulator options for loading rows from a url
+
+    The url is expected to answer with zoom.tables.serve_table.
+
+    >>> remote_options('/app/rows')['paginationMode']
+    'remote'
+    """
+    return dict(
+        ajaxURL=url,
+        pagination=True,
+        paginationMode='remote',
+        paginationSize=page_size or zoom.tables.DEFAULT_PAGE_SIZE,
+        sortMode='remote',
+        filterMode='remote',
+    )
+
+
 def tabulated(data, *args, **kwargs):
-    """Returns Tabulated Data"""
+    """Returns Tabulated Data
+
+    If a url is given only the table shell is rendered and the rows are
+    fetched from the url a page at a time, sorted and filtered on the
+    server.  The labels or columns have to be given in that case.
+    """
 
     labels = kwargs.get('labels')
     fields = kwargs.get('fields')
@@ -102,8 +113,10 @@ def tabulated(data, *args, **kwargs):
     selectable = kwargs.get('selectable')
     table_id = kwargs.get('table_id', 't'+uuid.uuid4().hex)
     before = kwargs.get('before', False)
+    url = kwargs.get('url')
+    page_size = kwargs.get('page_size')
 
-    items = list(data)
+    items = [] if url else list(data)
 
     if labels:
         if not columns:
@@ -269,8 +282,13 @@ def tabulated(data, *args, **kwargs):
     has_row_actions = items and bool(item.actions)
     selectable = selectable or has_row_actions
 
+    if url:
+        data_options = remote_options(url, page_size)
+    else:
+        data_options = dict(data=rows)
+
     return tabulator.format(
-        data=json.dumps(rows),
+        data_options=json.dumps(data_options),
         table_id=table_id,
         controller=controller,
         column_options=column_options,
@@ -1,5 +1,5 @@
 
-const tabledata = $(( data ));
+const dataoptions = $(( data_options ));
 
 const columndata = $(( column_options ));
 
@@ -23,12 +23,11 @@ const selectRows = function(data, rows){
   }
 }
 
-var table = new Tabulator("#$(( table_id ))", {
-  data: tabledata,
+var table = new Tabulator("#$(( table_id ))", Object.assign({
   printAsHtml: true,
   resizableColumns: false,
   layout: "fitColumns",
   columns: [].concat(selector, columndata),
   rowSelectionChanged: selectRows
-});
+}, dataoptions));
 
@@ -25,6 +25,7 @@ except ImportError:
 from zoom.response import RedirectResponse
 import zoom.helpers
 from zoom.helpers import abs_url_for, url_for_page, url_for
+from zoom.loader import resolve
 from zoom.utils import trim, dedup
 from zoom.render import apply_helpers
 
@@ -551,7 +552,7 @@ def load(pathname, encoding='utf-8'):
 
     logger = logging.getLogger(__name__)
     #logger.debug('load %r', pathname)
-    with open(pathname, encoding=encoding) as reader:
+    with open(resolve(pathname), encoding=encoding) as reader:
         return reader.read()
 
 def safe_format(__content, *args, **kwargs):
@@ -615,6 +616,7 @@ def load_content(pathname, *args, **kwargs):
     `zoom.tools.apply_helpers_and_format()` for behaviour.
     """
     isfile = os.path.isfile
+    pathname = resolve(pathname)
 
     if not isfile(pathname):
         for extension in ['html', 'md', 'txt', 'pug']:
@@ -800,7 +802,7 @@ def sass(text):
 
     """
     if text.endswith('.sass'):
-        out = libsass.compile(filename=text)
+        out = libsass.compile(filename=resolve(text))
     else:
         out = libsass.compile(string=text, indented=True)
     return out
@@ -4,6 +4,8 @@
 
 import logging
 import string
+import uuid
+import weakref
 
 import zoom
 from zoom.auditing import audit
@@ -115,37 +117,127 @@ def get_groups(db, user):
     True
     """
 
-    def get_memberships(group, memberships, depth=0):
-        """get group memberships"""
-        result = {group}
-        if depth < 10:
-            for grp, sgrp in memberships:
-                if group == sgrp and grp not in result and grp in all_groups:
-                    result |= get_memberships(grp, memberships, depth+1)
-        return result
-
-    all_groups = dict(db('select id, name from `groups`'))
-
+    closure = get_group_closure(db)
     my_groups = [
         rec[0]
         for rec in db(
             'SELECT group_id FROM members WHERE user_id=%s',
             user._id
         )
-        if rec[0] in all_groups
     ]
+    return closure.groups_of(my_groups)
+
+
+GROUPS_VERSION_KIND = 'system_groups_version'
+
+
+class GroupClosure:
+    """Transitive closure of group memberships
+
+    Holds the group names and subgroup relationships of a site so that
+    the groups a group belongs to, directly or through any number of
+    other groups, can be resolved without going back to the database.
+    Closures are calculated on demand and memoized.
+
+    >>> from zoom.database import setup_test
+    >>> closure = GroupClosure(setup_test())
+    >>> sorted(closure.names[g] for g in closure.closure(4))
+    ['a_content', 'everyone']
+    >>> closure.groups_of([3])
+    ['a_content', 'a_forgot', 'a_login', 'a_passreset', 'a_signup', 'everyone', 'guests']
+    """
+
+    def __init__(self, db):
+        self.names = dict(db('select id, name from `groups`'))
+        self.parents = {}
+        for group_id, subgroup_id in db(
+                'select group_id, subgroup_id from subgroups'
+            ):
+            if group_id in self.names:
+                self.parents.setdefault(subgroup_id, set()).add(group_id)
+        self.closures = {}
+
+    def closure(self, group_id):
+        """Return the ids of the groups a group belongs to, including itself"""
+        result = self.closures.get(group_id)
+        if result is None:
+            result = {group_id}
+            todo = [group_id]
+            while todo:
+                for parent in self.parents.get(todo.pop(), ()):
+                    if parent not in result:
+                        result.add(parent)
+                        todo.append(parent)
+            result = self.closures[group_id] = frozenset(result)
+        return result
+
+    def groups_of(self, group_ids):
+        """Return the sorted names of all groups the groups belong to"""
+        result = set()
+        for group_id in group_ids:
+            if group_id in self.names:
+                result |= self.closure(group_id)
+        return sorted(self.names[g] for g in result)
+
+
+_closures = {}
+_local_closures = weakref.WeakKeyDictionary()
+
+
+def get_groups_version(db):
+    """Return a value that changes when groups or subgroups change
 
-    subgroups = list(db(
-        'SELECT group_id, subgroup_id FROM subgroups ORDER BY subgroup_id'
-    ))
+    Combines the version recorded by groups_changed, which every change
+    made through the Groups store and the subgroup methods records, with
+    the sizes of the groups and subgroups tables.  Changes made directly
+    in the database are noticed only if they change those sizes; call
+    groups_changed after making any others.
+    """
+    cmd = """
+        select
+            (select count(*) from `groups`),
+            (select max(id) from `groups`),
+            (select count(*) from subgroups),
+            (select max(value) from attributes where kind=%s)
+    """
+    return tuple(db(cmd, GROUPS_VERSION_KIND).first())
 
-    groups = set()
-    for group in my_groups:
-        groups |= get_memberships(group, subgroups)
 
-    named_groups = sorted(all_groups[g] for g in set(groups))
+def get_group_closure(db):
+    """Return the group closure for a database
 
-    return named_groups
+    Closures are cached per process, by the database cache key, and
+    rebuilt only when the groups version changes.
+    """
+    version = get_groups_version(db)
+    key = db.cache_key()
+    cache = _local_closures if key is db else _closures
+    cached = cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    closure = GroupClosure(db)
+    cache[key] = version, closure
+    return closure
+
+
+def groups_changed(db):
+    """Record that groups or subgroups have changed
+
+    Invalidates the cached group closures in this and every other
+    process using the database.
+    """
+    token = uuid.uuid4().hex
+    db(
+        'update attributes set value=%s where kind=%s and attribute=%s',
+        token, GROUPS_VERSION_KIND, 'version'
+    )
+    if not db.rowcount:
+        db(
+            'insert into attributes ('
+            '    kind, row_id, attribute, datatype, value'
+            ') values (%s,%s,%s,%s,%s)',
+            GROUPS_VERSION_KIND, 0, 'version', 'str', token
+        )
 
 
 class User(Record):
@@ -4,9 +4,10 @@
 
 import re
 import imghdr
-import cgi
 import datetime
 
+from zoom.formdata import FileUpload
+
 PHONE_RE = r'^\(?([2-9][0-8][0-9])\)?[-. ]?([2-9][0-9]{2})[-. ]?([0-9]{4})$'
 USERNAME_RE = r'^[a-zA-Z0-9.@\\]+$'
 
@@ -428,8 +429,8 @@ def image_mime_type_valid(data):
     """
     accept = ['gif', 'jpeg', 'png', 'xbm', 'bmp']
     if (
-            isinstance(data, cgi.FieldStorage) and
-            data.file and imghdr.what('a', data.file.read()) in accept
+            isinstance(data, FileUpload) and
+            imghdr.what('a', data.value) in accept
     ):
         return True
     if (